@@ -0,0 +1,125 @@
+# app_logging.py
+import os
+import re
+import sys
+import glob
+import atexit
+import queue
+import logging
+import logging.handlers
+from datetime import date, timedelta
+
+import config
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+_DAY_RE = re.compile(r"_(\d{8})\.log(\.\d+)?$")
+
+_listener = None
+
+
+class DailyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    One file per day (<prefix>_YYYYMMDD.log), switched at midnight even if the
+    process keeps running. A file that grows past max_bytes within the day is
+    rolled to .1, .2, ...; day files older than retention_days are deleted.
+    """
+    def __init__(self, log_dir, prefix, max_bytes=config.APP_LOG_MAX_BYTES,
+                 backup_count=config.APP_LOG_BACKUP_COUNT, retention_days=config.APP_LOG_RETENTION_DAYS):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.retention_days = retention_days
+        self._day = date.today()
+        os.makedirs(log_dir, exist_ok=True)
+        super().__init__(self._path_for(self._day), maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self._remove_expired()
+
+    def _path_for(self, day):
+        return os.path.join(self.log_dir, f"{self.prefix}_{day.strftime('%Y%m%d')}.log")
+
+    def shouldRollover(self, record):
+        # Only a newer day switches files; a record queued just before midnight stays in the old day's check
+        if date.fromtimestamp(record.created) > self._day:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        today = date.today()
+        if today <= self._day:
+            super().doRollover()
+            return
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self._day = today
+        self.baseFilename = self._path_for(today)
+        self._remove_expired()
+        if not self.delay:
+            self.stream = self._open()
+
+    def _remove_expired(self):
+        if not self.retention_days:
+            return
+        cutoff = (self._day - timedelta(days=self.retention_days)).strftime('%Y%m%d')
+        for filepath in glob.glob(os.path.join(self.log_dir, f"{self.prefix}_*.log*")):
+            match = _DAY_RE.search(filepath)
+            if match and match.group(1) < cutoff:
+                try:
+                    os.remove(filepath)
+                except OSError:
+                    pass
+
+
+class _PassThroughQueueHandler(logging.handlers.QueueHandler):
+    """Queues the record as is: the stock prepare() formats the message on the logging thread."""
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(log_dir, prefix, level=logging.INFO, stream=None, module_levels=None):
+    """
+    Routes all logging through a queue: loggers only put records on it, and a
+    background listener thread formats them and writes the console and the
+    rotating day file. Returns the listener; it is stopped at interpreter exit.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    formatter = logging.Formatter(LOG_FORMAT)
+    console_handler = logging.StreamHandler(stream or sys.stderr)
+    console_handler.setFormatter(formatter)
+    file_handler = DailyRotatingFileHandler(log_dir, prefix)
+    file_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_PassThroughQueueHandler(log_queue))
+    root.setLevel(level)
+    configure_levels(config.DEFAULT_LOG_LEVELS)
+    configure_levels(module_levels)
+
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def configure_levels(module_levels):
+    """Sets per-logger levels from {"logger name": "DEBUG"/"INFO"/... or number}; bad entries are skipped."""
+    for name, level in (module_levels or {}).items():
+        value = level if isinstance(level, int) else logging.getLevelName(str(level).upper())
+        if not isinstance(value, int):
+            logger.warning(f"Ignoring unknown log level '{level}' for logger '{name}'.")
+            continue
+        logging.getLogger(name).setLevel(value)
+
+
+def stop_logging():
+    """Flushes the queue and stops the writer thread (safe to call more than once)."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
@@ -1,59 +1,171 @@
 # attendance_manager.py
-from datetime import datetime, timedelta, time
+from datetime import datetime, date, timedelta, time
 import config
 import logging
+from report_engine import split_log_rows, log_month_of
+from pending_registrations import PendingRegistrations
+from daily_state import DailyAttendanceBuckets, RecentSwipes
+from work_scheduler import WorkScheduler
+import swipe_event_store as decisions
 
 logger = logging.getLogger(__name__)
 
+def _clock_time(value):
+    """datetime.time of a log/journal 'HH:MM:SS' value, None when empty or unparseable."""
+    if isinstance(value, time):
+        return value
+    try:
+        return datetime.strptime(str(value).strip(), "%H:%M:%S").time()
+    except ValueError:
+        return None
+
 class AttendanceManager:
-    def __init__(self, settings_manager, employee_manager, ot_log_manager, ui_update_callback):
+    def __init__(self, settings_manager, employee_manager, ot_log_manager, ui_update_callback, pending_registrations=None, event_store=None, work_scheduler=None):
         self.settings_manager = settings_manager
         self.employee_manager = employee_manager
         self.ot_log_manager = ot_log_manager
         self.ui_update_callback = ui_update_callback # Function to update GUI
+        # Unknown cards are parked here until registered, instead of blocking the gate
+        self.pending_registrations = pending_registrations if pending_registrations is not None else PendingRegistrations()
+        self.event_store = event_store # Optional SwipeEventStore: every raw swipe and its decision
+        # Shift window per employee and day; without a schedule the general shift applies to everyone
+        self.work_scheduler = work_scheduler if work_scheduler is not None else WorkScheduler(settings_manager)
 
         # In-memory state
-        self.last_swipe_times = {} # {card_id: datetime}
-        self.todays_attendance = {} # {card_id: {'in': datetime, 'out': datetime, 'date': date}}
+        self.last_swipe_times = RecentSwipes() # {card_id: datetime}, expired past the swipe delay
+        self.daily_state = DailyAttendanceBuckets() # Per-date buckets of the two dicts below
+        self.todays_attendance = {} # {card_id: {'in': datetime, 'out': datetime, 'date': date, 'shift': ShiftWindow}} of the current swipe's date
         self.processed_today = set() # {card_id} - To prevent reprocessing 'out' if app restarts mid-day
-    
-    def process_swipe(self,card_id):
-        self._reset_daily_state_if_needed()
-        now=datetime.now()
+        self._state_day = None # Date todays_attendance/processed_today belong to
+        if ot_log_manager.shared is not None:
+            # Other stations' in/out arrive with the periodic sync_shared pull; swipes only read memory
+            self._seed_shared_attendance()
+            ot_log_manager.shared.entries_listener = self._on_shared_entries
+
+    def _switch_to_day(self, today):
+        """Points the daily state at the bucket of `today` (the date of the swipe being processed)."""
+        if today != self._state_day:
+            self.todays_attendance, self.processed_today = self.daily_state.for_day(today)
+            self._state_day = today
+
+    def _overnight_shift_before(self, emp_id, today):
+        """Yesterday's shift of emp_id if it runs past midnight into today, else None."""
+        previous = self.work_scheduler.shift_on(emp_id, today - timedelta(days=1))
+        if previous.end is not None and previous.end.date() >= today:
+            return previous
+        return None
+
+    def _resolve_shift(self, card_id, emp_id, now):
+        """
+        (shift, attendance, processed) a swipe at `now` belongs to: today's shift and
+        bucket, except while yesterday's overnight shift can still be completed - the
+        out after its open in (until the shift end plus OVERNIGHT_OUT_GRACE_HOURS), or
+        a late in before it ends. Those swipes count for yesterday.
+        """
+        today = now.date()
+        previous = self._overnight_shift_before(emp_id, today)
+        if previous is not None:
+            bucket = self.daily_state.peek(previous.work_date)
+            record = bucket[0].get(card_id) if bucket is not None else None
+            if record and record.get('in') and not record.get('out'):
+                if now <= previous.end + timedelta(hours=config.OVERNIGHT_OUT_GRACE_HOURS):
+                    return record.get('shift') or previous, bucket[0], bucket[1]
+            elif not record and now <= previous.end:
+                attendance, processed = self.daily_state.for_day(previous.work_date)
+                return previous, attendance, processed
+        return self.work_scheduler.shift_on(emp_id, today), self.todays_attendance, self.processed_today
+
+    def _note_shared_times(self, emp_id, day, recorded_in=None, recorded_out=None):
+        """
+        Shared folder mode: puts an in/out recorded at another station (datetime.time)
+        into the day's bucket, so the next swipe here pairs with it and the swipe delay
+        applies across stations. An out earlier than the in is on the next day.
+        """
+        employee_info = self.employee_manager.find_employee_by_id(emp_id)
+        if not employee_info or not employee_info.card_id:
+            return
+        card_id = employee_info.card_id
+        attendance = self.daily_state.for_day(day)[0]
+        record = attendance.get(card_id)
+        if recorded_in is not None:
+            record = attendance.setdefault(card_id, {'date': day})
+            if not record.get('in'):
+                record['in'] = datetime.combine(day, recorded_in)
+        if not record or not record.get('in'):
+            return # An out without its in: nothing to pair with
+        if recorded_out is not None and not record.get('out'):
+            out_time = datetime.combine(day, recorded_out)
+            if out_time < record['in']: # Overnight shift
+                out_time += timedelta(days=1)
+            record['out'] = out_time
+        latest = record.get('out') or record['in']
+        if latest <= datetime.now() and (card_id not in self.last_swipe_times or self.last_swipe_times[card_id] < latest):
+            self.last_swipe_times[card_id] = latest
+
+    def _on_shared_entries(self, log_filepath, entries):
+        """SharedLogSync listener: applies the in/out entries of today and yesterday (overnight shifts) to the daily state."""
+        log_month = log_month_of(log_filepath)
+        if log_month is None:
+            return
+        first_day = datetime.now().date() - timedelta(days=1)
+        for entry in entries:
+            entry_type = entry.get('type')
+            if entry_type not in ("Giờ Vào", "Giờ Ra"):
+                continue
+            try:
+                day = date(log_month[0], log_month[1], int(entry['day']))
+            except (KeyError, TypeError, ValueError):
+                continue
+            recorded = _clock_time(entry.get('value'))
+            if day < first_day or recorded is None:
+                continue
+            if entry_type == "Giờ Vào":
+                self._note_shared_times(entry.get('id'), day, recorded_in=recorded)
+            else:
+                self._note_shared_times(entry.get('id'), day, recorded_out=recorded)
 
-    def _reset_daily_state_if_needed(self):
-        """Checks if the date has changed and resets daily tracking."""
+    def _seed_shared_attendance(self):
+        """Shared folder mode, at startup: today's and yesterday's in/out already in the loaded log (all stations)."""
+        log_month = log_month_of(self.ot_log_manager.current_log_filepath)
+        base_df, vao, ra, _, day_columns = split_log_rows(self.ot_log_manager.df_log)
         today = datetime.now().date()
-        # Simple reset: Clear if keys exist from a previous date
-        keys_to_clear = [
-            card_id for card_id, data in self.todays_attendance.items()
-            if data.get('date') != today
-        ]
-        if keys_to_clear:
-            logger.info(f"New day ({today}). Resetting daily attendance state for {len(keys_to_clear)} card(s).")
-            for card_id in keys_to_clear:
-                del self.todays_attendance[card_id]
-                if card_id in self.processed_today:
-                    self.processed_today.remove(card_id)
-            # Also clear last swipe times older than a day? Optional.
-            # self.last_swipe_times = {k: v for k, v in self.last_swipe_times.items() if v.date() == today}
-
-
-    def process_swipe(self, card_id):
-        """Main logic to handle a card swipe."""
-        self._reset_daily_state_if_needed()
-        now = datetime.now()
+        for day in (today - timedelta(days=1), today):
+            column = f"Ngày {day.day}"
+            if (day.year, day.month) != log_month or column not in day_columns:
+                continue
+            col = day_columns.index(column)
+            for emp_id, in_value, out_value in zip(base_df['ID'].astype(str), vao[:, col], ra[:, col]):
+                recorded_in = _clock_time(in_value)
+                if recorded_in is not None:
+                    self._note_shared_times(emp_id, day, recorded_in, _clock_time(out_value))
+
+    def _record_decision(self, card_id, source, swipe_time, decision):
+        if self.event_store is not None:
+            self.event_store.append(card_id, source, swipe_time, decision)
+
+    def process_swipe(self, card_id, swipe_time=None, source=None):
+        """
+        Main logic to handle a card swipe.
+        swipe_time is the capture time stamped by the reader; all in/out, delay and
+        shift window checks use it, so a swipe processed late is recorded as it happened.
+        Falls back to now if the source gave no timestamp. source (reader/station name)
+        is only recorded in the event store.
+        """
+        now = swipe_time if swipe_time is not None else datetime.now()
         today = now.date()
+        self._switch_to_day(today)
         card_id = str(card_id).strip() # Ensure string format
 
         logger.info(f"Processing swipe for CARD ID: {card_id} at {now}")
 
         # 1. Check Swipe Delay
         swipe_delay = self.settings_manager.get_swipe_delay()
+        self.last_swipe_times.expire(now - swipe_delay) # Older swipes can no longer reject anything
         last_swipe = self.last_swipe_times.get(card_id)
         if last_swipe and (now - last_swipe) < swipe_delay:
             logger.warning(f"Swipe rejected for {card_id}: Too soon after last swipe ({now - last_swipe}).")
             self.ui_update_callback(status=f"Quẹt quá nhanh ({card_id})", card_id=card_id)
+            self._record_decision(card_id, source, now, decisions.DECISION_TOO_SOON)
             return
 
         self.last_swipe_times[card_id] = now # Update last swipe time immediately
@@ -63,53 +175,59 @@ class AttendanceManager:
 
         # 3. Handle New Employee
         if not employee_info:
-            logger.info(f"Card ID {card_id} not found in database.")
-            # Trigger UI to ask for Name/ID
-            # This needs to be handled carefully with threading/callbacks
-            # For now, we'll just log and update status
-            self.ui_update_callback(status=f"Thẻ mới: {card_id}. Cần đăng ký.", card_id=card_id)
-            # In a real implementation, the UI would pop up a dialog,
-            # get the info, and call employee_manager.add_employee
-            # Then potentially re-process this swipe.
+            # Park the swipe with its capture time; it is replayed by replay_pending()
+            # once the card is registered. Other employees keep swiping meanwhile.
+            swipe_count = self.pending_registrations.park(card_id, now)
+            logger.info(f"Card ID {card_id} not found in database. Parked for registration ({swipe_count} swipe(s) pending).")
+            self.ui_update_callback(status=f"Thẻ mới: {card_id}. Chờ đăng ký.", card_id=card_id)
+            self._record_decision(card_id, source, now, decisions.DECISION_UNKNOWN_CARD)
             return # Stop processing until registered
 
-        emp_name = employee_info.get('Họ tên', 'N/A')
-        emp_id = employee_info.get('ID', 'N/A')
+        emp_name = employee_info.name or 'N/A'
+        emp_id = employee_info.emp_id
         logger.info(f"Employee found: ID={emp_id}, Name={emp_name}")
 
-        # 4. Get Shift Info
-        shift_start_time, shift_end_time = self.settings_manager.get_shift_times()
+        # 4. Get Shift Info: the employee's scheduled shift for this swipe (general shift if unscheduled)
+        shift, attendance, _ = self._resolve_shift(card_id, emp_id, now)
+        work_date = shift.work_date
         allowed_window = self.settings_manager.get_allowed_swipe_window()
-        # Calculate the earliest allowed clock-in time
-        shift_start_dt_today = datetime.combine(today, shift_start_time)
-        earliest_clock_in = shift_start_dt_today - allowed_window
 
         # 5. Determine Swipe Type (In or Out) and Validate Time
-        attendance_record = self.todays_attendance.get(card_id)
+        attendance_record = attendance.get(card_id)
+        if attendance_record and attendance_record.get('shift'):
+            shift = attendance_record['shift'] # The shift fixed at clock in
 
         is_clock_in = False
         is_clock_out = False
 
         if not attendance_record or not attendance_record.get('in'):
+            if shift.start is None:
+                logger.warning(f"Clock IN rejected for {emp_id}: Day off on {work_date} (schedule code {shift.code})")
+                self.ui_update_callback(status=f"Ngày nghỉ theo lịch ({shift.code}) ({emp_name})", card_id=card_id, name=emp_name, emp_id=emp_id)
+                self._record_decision(card_id, source, now, decisions.DECISION_DAY_OFF)
+                return
+            # Calculate the earliest allowed clock-in time
+            earliest_clock_in = shift.start - allowed_window
             # Potentially a CLOCK IN
             # Rule: "Chỉ chấp nhận quẹt trong khoảng 15 phút trước giờ vào"
             # Interpretation: First swipe (clock-in) must be from 15 mins before shift start onwards.
             # Let's allow clock-in anytime from earliest_clock_in up to shift end? Or maybe a grace period after?
             # Sticking to the strict rule for now: only allow if now >= earliest_clock_in
             # Let's refine: Allow clock-in from earliest_clock_in until shift_end_time? Makes sense.
-            shift_end_dt_today = datetime.combine(today, shift_end_time)
-            if now >= earliest_clock_in and now <= shift_end_dt_today:
+            if now >= earliest_clock_in and now <= shift.end:
                  is_clock_in = True
                  logger.info(f"Swipe accepted as CLOCK IN for {emp_id} at {now.strftime('%H:%M:%S')}")
             elif now < earliest_clock_in:
                  logger.warning(f"Clock IN rejected for {emp_id}: Too early ({now.strftime('%H:%M:%S')} < {earliest_clock_in.strftime('%H:%M:%S')})")
                  self.ui_update_callback(status=f"Chưa đến giờ vào ca ({emp_name})", card_id=card_id, name=emp_name, emp_id=emp_id)
+                 self._record_decision(card_id, source, now, decisions.DECISION_TOO_EARLY)
                  return
-            else: # now > shift_end_dt_today
+            else: # now > shift.end
                  # Could this be a late clock-in or a clock-out attempt without prior clock-in?
                  # For simplicity, reject if it's the first swipe and it's after shift end.
-                 logger.warning(f"Clock IN rejected for {emp_id}: Swipe after shift end ({now.strftime('%H:%M:%S')} > {shift_end_dt_today.strftime('%H:%M:%S')})")
+                 logger.warning(f"Clock IN rejected for {emp_id}: Swipe after shift end ({now.strftime('%H:%M:%S')} > {shift.end.strftime('%H:%M:%S')})")
                  self.ui_update_callback(status=f"Đã qua giờ làm (chưa quẹt vào?) ({emp_name})", card_id=card_id, name=emp_name, emp_id=emp_id)
+                 self._record_decision(card_id, source, now, decisions.DECISION_AFTER_SHIFT_END)
                  return
 
         elif attendance_record.get('in') and not attendance_record.get('out'):
@@ -122,59 +240,91 @@ class AttendanceManager:
                 # This shouldn't happen if swipe delay works, but good to check
                 logger.warning(f"Clock OUT rejected for {emp_id}: Swipe time ({now}) is not after clock in time ({attendance_record['in']})")
                 self.ui_update_callback(status=f"Lỗi thời gian quẹt ra ({emp_name})", card_id=card_id, name=emp_name, emp_id=emp_id)
+                self._record_decision(card_id, source, now, decisions.DECISION_OUT_BEFORE_IN)
                 return
         else:
             # Already clocked in and out today
             logger.info(f"Employee {emp_id} already clocked in and out today. Ignoring swipe.")
             self.ui_update_callback(status=f"Đã chấm công đủ hôm nay ({emp_name})", card_id=card_id, name=emp_name, emp_id=emp_id)
+            self._record_decision(card_id, source, now, decisions.DECISION_ALREADY_COMPLETE)
             return
 
         # 6. Record Attendance and Log
         time_str = now.strftime('%H:%M:%S')
 
         if is_clock_in:
-            if card_id not in self.todays_attendance:
-                self.todays_attendance[card_id] = {'date': today}
-            self.todays_attendance[card_id]['in'] = now
+            if card_id not in attendance:
+                attendance[card_id] = {'date': work_date}
+            attendance[card_id]['in'] = now
+            attendance[card_id]['shift'] = shift
             # Log "Giờ Vào"
-            success = self.ot_log_manager.write_log_entry(employee_info, now, "Giờ Vào", time_str)
+            success = self.ot_log_manager.write_log_entry(employee_info, now, "Giờ Vào", time_str, work_date=work_date)
             if success:
                 self.ui_update_callback(status=f"Đã vào: {emp_name}", card_id=card_id, name=emp_name, emp_id=emp_id, time=now)
+                self._record_decision(card_id, source, now, decisions.DECISION_CLOCK_IN)
             else:
                  self.ui_update_callback(status=f"LỖI GHI LOG Giờ Vào ({emp_name})", card_id=card_id, name=emp_name, emp_id=emp_id, time=now)
+                 self._record_decision(card_id, source, now, decisions.DECISION_LOG_WRITE_FAILED)
 
 
         elif is_clock_out:
-            self.todays_attendance[card_id]['out'] = now
-            # Log "Giờ Ra"
-            success = self.ot_log_manager.write_log_entry(employee_info, now, "Giờ Ra", time_str)
+            attendance[card_id]['out'] = now
+            # Log "Giờ Ra" in the shift's day column (the previous day for an overnight shift)
+            success = self.ot_log_manager.write_log_entry(employee_info, now, "Giờ Ra", time_str, work_date=work_date)
             if success:
                 self.ui_update_callback(status=f"Đã ra: {emp_name}", card_id=card_id, name=emp_name, emp_id=emp_id, time=now)
+                self._record_decision(card_id, source, now, decisions.DECISION_CLOCK_OUT)
             else:
                  self.ui_update_callback(status=f"LỖI GHI LOG Giờ Ra ({emp_name})", card_id=card_id, name=emp_name, emp_id=emp_id, time=now)
+                 self._record_decision(card_id, source, now, decisions.DECISION_LOG_WRITE_FAILED)
                  # Should we proceed with OT calculation if logging failed? Maybe not.
                  return
 
             # Calculate Duration and OT only after successful clock-out log
-            self._calculate_and_log_ot(card_id, employee_info, now)
-
-
-    def _calculate_and_log_ot(self, card_id, employee_info, clock_out_time):
-        """Calculates work duration, OT, checks limits, and logs total time (as OT hours).""" # Updated docstring
-        if card_id not in self.todays_attendance or not self.todays_attendance[card_id].get('in'):
+            self._calculate_and_log_ot(card_id, employee_info, now, shift)
+
+
+    def replay_pending(self, card_id):
+        """
+        Replays the swipes parked while card_id was unregistered, at their original
+        capture times. Call after the card has been added to the database.
+        Returns the number of swipes replayed.
+        """
+        card_id = str(card_id).strip()
+        captured_times = self.pending_registrations.pop(card_id)
+        if not captured_times:
+            return 0
+        logger.info(f"Replaying {len(captured_times)} parked swipe(s) for newly registered card {card_id}.")
+        # The parked swipes already passed the delay check when they were captured
+        self.last_swipe_times.pop(card_id, None)
+        for captured_at in captured_times:
+            self.process_swipe(card_id, swipe_time=captured_at, source="replay")
+        return len(captured_times)
+
+    def discard_pending(self, card_id):
+        """Drops the parked swipes of a card that will not be registered."""
+        return len(self.pending_registrations.pop(str(card_id).strip()))
+
+    def _calculate_and_log_ot(self, card_id, employee_info, clock_out_time, shift=None):
+        """
+        Calculates work duration, OT, checks limits, and logs total time (as OT hours).
+        shift is the ShiftWindow the attendance belongs to (default: the employee's
+        shift on the clock-out date); OT is counted against its start and length.
+        """
+        emp_id = employee_info.emp_id
+        emp_name = employee_info.name
+        if shift is None:
+            shift = self.work_scheduler.shift_on(emp_id, clock_out_time.date())
+        today = shift.work_date
+        attendance, processed = self.daily_state.for_day(today)
+        if card_id not in attendance or not attendance[card_id].get('in'):
             logger.error(f"Cannot calculate OT for {card_id}: Missing clock-in time.")
             return
 
-        clock_in_time = self.todays_attendance[card_id]['in']
-        emp_id = str(employee_info['ID'])
-        emp_name = employee_info['Họ tên']
-        today = clock_out_time.date()
+        clock_in_time = attendance[card_id]['in']
 
         # 1. Calculate Actual Work Duration (Effective)
-        shift_start_time, shift_end_time = self.settings_manager.get_shift_times()
-        shift_start_dt = datetime.combine(today, shift_start_time)
-        shift_end_dt = datetime.combine(today, shift_end_time)
-        effective_start_time = max(clock_in_time, shift_start_dt)
+        effective_start_time = max(clock_in_time, shift.start)
         effective_end_time = clock_out_time
 
         if effective_end_time <= effective_start_time:
@@ -182,11 +332,8 @@ class AttendanceManager:
         else:
              work_duration = effective_end_time - effective_start_time
 
-        # 2. Calculate Standard Shift Duration
-        if shift_end_time <= shift_start_time: # Handle overnight shifts if ever needed
-            standard_shift_duration = timedelta(hours=24) - (datetime.combine(today, shift_start_time) - datetime.combine(today, shift_end_time))
-        else:
-            standard_shift_duration = datetime.combine(today, shift_end_time) - datetime.combine(today, shift_start_time)
+        # 2. Calculate Standard Shift Duration (end is already on the next day for overnight shifts)
+        standard_shift_duration = shift.end - shift.start
 
         # 3. Calculate OT
         ot_duration = work_duration - standard_shift_duration
@@ -231,7 +378,8 @@ class AttendanceManager:
             employee_info,
             clock_out_time,
             "Tổng thời gian",
-            ot_hours_to_log # Pass hours to log
+            ot_hours_to_log, # Pass hours to log
+            work_date=today
         )
 
         if not success:
@@ -245,4 +393,4 @@ class AttendanceManager:
              self.ui_update_callback(status=final_status, card_id=card_id, name=emp_name, emp_id=emp_id, time=clock_out_time)
 
         # Mark as processed for the day
-        self.processed_today.add(card_id)
\ No newline at end of file
+        processed.add(card_id)
\ No newline at end of file
@@ -0,0 +1,164 @@
+# batch_replay.py
+import os
+import argparse
+import logging
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import config
+from attendance_manager import AttendanceManager
+from swipe_event_store import SwipeEventStore
+from work_scheduler import WorkScheduler
+from report_engine import split_log_rows, time_cells_to_seconds
+
+logger = logging.getLogger(__name__)
+
+# Accepted column names in offline swipe exports
+CARD_COLUMN_ALIASES = ["CARD ID", "card_id", "card", "Mã thẻ"]
+TIME_COLUMN_ALIASES = ["Thời gian", "timestamp", "ts", "captured_at", "time"]
+
+
+def read_swipe_export(filepath):
+    """
+    Reads an offline swipe export (.csv, .xlsx or .jsonl) into a DataFrame with
+    'card_id' and 'captured_at' columns, sorted by capture time.
+    Returns (swipes_df, invalid_row_count).
+    """
+    lower = filepath.lower()
+    if lower.endswith(".csv"):
+        raw = pd.read_csv(filepath, dtype=str, encoding="utf-8-sig")
+    elif lower.endswith(".jsonl") or lower.endswith(".json"):
+        raw = pd.read_json(filepath, lines=lower.endswith(".jsonl"), dtype=False)
+    else:
+        raw = pd.read_excel(filepath, dtype=str)
+
+    card_col = next((c for c in CARD_COLUMN_ALIASES if c in raw.columns), None)
+    time_col = next((c for c in TIME_COLUMN_ALIASES if c in raw.columns), None)
+    if card_col is None or time_col is None:
+        raise ValueError(f"File cần có cột CARD ID ({'/'.join(CARD_COLUMN_ALIASES)}) và thời gian ({'/'.join(TIME_COLUMN_ALIASES)}).")
+
+    swipes = pd.DataFrame({
+        "card_id": raw[card_col].astype(str).str.strip(),
+        "captured_at": pd.to_datetime(raw[time_col], errors='coerce'),
+    })
+    invalid = swipes["captured_at"].isna() | swipes["card_id"].isin(["", "nan", "None"])
+    swipes = swipes[~invalid].sort_values("captured_at", kind="stable", ignore_index=True)
+    return swipes, int(invalid.sum())
+
+
+class _CollectingSink:
+    """Counts replay outcomes by status; ignores names/times."""
+
+    def __init__(self):
+        self.statuses = Counter()
+
+    def __call__(self, status="", card_id=None, name=None, emp_id=None, time=None):
+        # Strip the per-employee part so outcomes group together, e.g. "Đã vào: X" -> "Đã vào"
+        self.statuses[status.split(":")[0].split("(")[0].strip()] += 1
+
+
+class BatchReplayer:
+    """
+    Applies a time-sorted batch of offline swipes through the normal AttendanceManager
+    rules (in/out, swipe delay, shift window, monthly limit). Log entries stay in memory
+    and each affected month is saved once.
+    """
+    def __init__(self, settings_manager, employee_manager, ot_log_manager, work_scheduler=None):
+        self.ot_log_manager = ot_log_manager
+        self.employee_manager = employee_manager
+        self.sink = _CollectingSink()
+        self.attendance_manager = AttendanceManager(
+            settings_manager=settings_manager,
+            employee_manager=employee_manager,
+            ot_log_manager=ot_log_manager,
+            ui_update_callback=self.sink,
+            event_store=SwipeEventStore(config.get_swipe_store_folder(settings_manager)),
+            work_scheduler=work_scheduler
+        )
+
+    def _seed_day_state(self, day):
+        """
+        Loads the in/out times already in the log for `day` into the attendance state,
+        so an offline 'out' swipe pairs with an 'in' that was recorded online.
+        """
+        am = self.attendance_manager
+        am._switch_to_day(day)
+        day_dt = datetime.combine(day, datetime.min.time())
+        required = self.ot_log_manager._get_log_filepath(day_dt)
+        if required != self.ot_log_manager.current_log_filepath or self.ot_log_manager.df_log is None:
+            if self.ot_log_manager._load_log_file(required) is None:
+                return
+        base_df, vao, ra, _, day_columns = split_log_rows(self.ot_log_manager.df_log)
+        day_column = f"Ngày {day.day}"
+        if base_df.empty or day_column not in day_columns:
+            return
+        col = day_columns.index(day_column)
+        in_secs = time_cells_to_seconds(vao[:, col])
+        out_secs = time_cells_to_seconds(ra[:, col])
+        has_in = ~np.isnan(in_secs)
+        if not has_in.any():
+            return
+
+        by_id = self.employee_manager.directory.by_id
+        ids = base_df['ID'].astype(str).to_numpy()
+        for i in np.flatnonzero(has_in):
+            employee = by_id.get(ids[i])
+            if employee is None or not employee.card_id:
+                continue
+            record = {'date': day, 'in': day_dt + pd.Timedelta(seconds=float(in_secs[i])).to_pytimedelta()}
+            if not np.isnan(out_secs[i]):
+                out_offset = float(out_secs[i]) + (86400 if out_secs[i] < in_secs[i] else 0) # Overnight shift out
+                record['out'] = day_dt + pd.Timedelta(seconds=out_offset).to_pytimedelta()
+            am.todays_attendance[employee.card_id] = record
+
+    def replay(self, swipes):
+        """Replays a DataFrame from read_swipe_export. Returns a Counter of outcomes."""
+        current_day = None
+        with self.ot_log_manager.deferred_saves():
+            for card_id, captured_at in zip(swipes["card_id"], swipes["captured_at"]):
+                captured_at = captured_at.to_pydatetime()
+                if captured_at.date() != current_day:
+                    current_day = captured_at.date()
+                    self._seed_day_state(current_day)
+                self.attendance_manager.process_swipe(card_id, swipe_time=captured_at, source="batch")
+        self.attendance_manager.event_store.close()
+        pending = self.attendance_manager.pending_registrations.snapshot()
+        if pending:
+            logger.warning(f"{len(pending)} unknown card(s) in the batch were not applied: {', '.join(c for c, _, _ in pending)}")
+        return self.sink.statuses
+
+
+def main(argv=None):
+    from settings_manager import SettingsManager
+    from employee_manager import EmployeeManager
+    from ot_log_manager import OTLogManager
+    parser = argparse.ArgumentParser(description="Replay an offline swipe export (card id, timestamp) into the OT logs.")
+    parser.add_argument("swipe_file", help=".csv, .xlsx or .jsonl with CARD ID and timestamp columns")
+    parser.add_argument("--settings", default=config.SETTINGS_FILENAME)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    swipes, invalid = read_swipe_export(args.swipe_file)
+    print(f"{len(swipes)} swipe(s) to replay from {os.path.basename(args.swipe_file)} ({invalid} invalid row(s) skipped).")
+    if swipes.empty:
+        return
+    settings_manager = SettingsManager(args.settings)
+    employee_manager = EmployeeManager(settings_manager)
+    ot_log_manager = OTLogManager(settings_manager)
+    ot_log_manager.backup_current_log()
+    work_scheduler = WorkScheduler(settings_manager)
+    work_scheduler.load()
+
+    started = datetime.now()
+    outcomes = BatchReplayer(settings_manager, employee_manager, ot_log_manager, work_scheduler).replay(swipes)
+    print(f"Done in {(datetime.now() - started).total_seconds():.2f}s.")
+    for status, count in outcomes.most_common():
+        print(f"  {count:6d}  {status}")
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
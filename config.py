@@ -1,6 +1,7 @@
 # config.py
 import os
 import sys
+import socket
 from datetime import datetime
 
 # --- File Paths ---
@@ -65,10 +66,86 @@ DEFAULT_ZKTeco_PID = 0xb502 # Example PID - VERIFY!
 MONTHLY_OT_LIMIT_HOURS = 83.0
 MONTHLY_OT_LIMIT_MINUTES = MONTHLY_OT_LIMIT_HOURS * 60
 
+# --- Work Schedule ---
+DEFAULT_SCHEDULE_FILENAME = "schedule.xlsx" # In the database folder; optional - without it everyone uses shift_start/shift_end
+SCHEDULE_EMPLOYEE_ID_COLUMN = "Mã nhân viên" # Header cell that marks the header row of the schedule sheet
+GENERAL_SHIFT_NAME = "Hành chính" # Follows the shift_start/shift_end settings
+# Shift times by name ("start", "end" as HH:MM); end <= start means the shift ends the next day.
+# Override or extend with the "shifts" setting.
+DEFAULT_SHIFTS = {
+    "Ca 1": {"start": "06:00", "end": "14:00"},
+    "Ca 2": {"start": "14:00", "end": "22:00"},
+    "Ca 3": {"start": "22:00", "end": "06:00"},
+}
+# Schedule cell code -> shift name, or None for a day off. Override with the "schedule_code_map" setting.
+DEFAULT_SCHEDULE_CODE_MAP = {
+    "1": "Ca 1",
+    "2": "Ca 2",
+    "3": "Ca 3",
+    "D": GENERAL_SHIFT_NAME,
+    "D1": GENERAL_SHIFT_NAME,
+    "HC": GENERAL_SHIFT_NAME,
+    "AWD": GENERAL_SHIFT_NAME,
+    "WH": None, # Nghỉ tuần
+    "SO": None,
+    "PH": None, # Nghỉ lễ
+    "SL": None, # Nghỉ phép đặc biệt
+    "CH": None, # Nghỉ bù
+}
+OVERNIGHT_OUT_GRACE_HOURS = 8 # An out swipe this long after an overnight shift ended still closes it
+
+# --- Reports ---
+REPORT_OT_THRESHOLD_HOURS = 2.0 # Days with more OT than this are counted in the monthly report
+
+# --- Month Rollover ---
+MONTH_ROLLOVER_PREPARE_HOUR = 20 # On the last day of a month, next month's log is prepared in the background from this hour
+MONTH_ROLLOVER_CHECK_MS = 60000 # How often the GUI/headless loop checks whether to prepare or switch
+LOG_STANDBY_MONTHS = 2 # Month logs kept in memory for an I/O-free switch (next month, month just left)
+
+# --- Month Grid Viewer ---
+LOG_CHANGE_HISTORY_SIZE = 2000 # Cell writes remembered for partial refresh of live views
+MONTH_VIEW_CACHE_SIZE = 4 # Past month logs kept in memory by the viewer
+MONTH_VIEW_REFRESH_MS = 1000
+
+# --- Database File Watcher ---
+DB_WATCH_POLL_SECONDS = 2.0 # Database file check interval when inotify is not available
+DB_WATCH_SETTLE_SECONDS = 1.0 # Database file must stop changing this long before it is re-read
+
 # --- Other ---
 APP_TITLE = "OT Manager - Quản lý chấm công"
 MAX_LOG_DISPLAY_ENTRIES = 50
 
+# --- Application Logging ---
+APP_LOG_MAX_BYTES = 10 * 1024 * 1024 # A day's log file is rolled to .1, .2, ... past this size
+APP_LOG_BACKUP_COUNT = 5 # Rolled files kept per day
+APP_LOG_RETENTION_DAYS = 30 # Day files older than this are deleted
+# Per-logger levels; override or extend with the "log_levels" setting.
+# hid_handler at DEBUG logs every raw HID report (one per key press).
+DEFAULT_LOG_LEVELS = {"hid_handler": "INFO"}
+
+# --- Swipe Queue ---
+SWIPE_QUEUE_MEMORY_SLOTS = 256 # Swipes held in memory before spilling to disk
+SWIPE_SPILL_FILENAME = "swipe_overflow.jsonl"
+SWIPES_PER_UI_TICK = 20 # Max swipes processed per GUI poll, keeps the window responsive
+SWIPE_DEDUP_WINDOW_MS = 300 # Reads of the same card closer than this are one swipe (several readers / double reports)
+SWIPE_DEDUP_MAX_CARDS = 1024 # Upper bound of the recent-card table of the dedup stage
+
+# --- Swipe Event Store ---
+SWIPE_STORE_FOLDER_NAME = "swipe_events" # Daily binary files of every raw swipe and its decision
+
+# --- Shared Folder Mode (several stations on one log folder) ---
+SHARED_JOURNAL_FOLDER_NAME = ".journal" # Per-station delta journals, inside the log folder
+SHARED_MERGE_INTERVAL_SECONDS = 15 # How often a station tries to merge the journals into the workbook
+SHARED_LEASE_SECONDS = 60 # A merge lease older than this is considered abandoned
+SHARED_SYNC_MS = 2000 # GUI/headless poll: pull other stations' entries, merge when due
+
+# --- Excel Export ---
+EXCEL_STREAM_CHUNK_ROWS = 5000 # Rows converted at a time by the streaming (write-only) workbook writer
+
+# --- Log Archive ---
+LOG_ARCHIVE_FILENAME = "OT_Log_Archive.zip" # Closed months in compressed columnar form, in the log folder
+LOG_ARCHIVE_BLOCK_ROWS = 256 # Employees per archived block; a per-employee lookup reads one block per month
+
 # --- Dynamic Paths ---
 def get_db_filepath(settings_mgr):
     folder = settings_mgr.get_setting("database_folder", DEFAULT_DATA_FOLDER)
@@ -86,6 +163,31 @@ def get_log_filepath(settings_mgr, target_date=None):
     filename = f"{LOG_FILENAME_PREFIX}{target_date.strftime(LOG_FILENAME_DATE_FORMAT)}.xlsx"
     return os.path.join(log_folder, filename)
 
+def get_log_archive_filepath(settings_mgr):
+    return os.path.join(get_log_folder(settings_mgr), LOG_ARCHIVE_FILENAME)
+
+def get_swipe_spill_filepath(settings_mgr):
+    # Keep the overflow file on local disk (data folder), not on a possibly shared log folder
+    folder = settings_mgr.get_setting("spill_folder", DEFAULT_DATA_FOLDER)
+    return os.path.join(folder, SWIPE_SPILL_FILENAME)
+
+def get_swipe_store_folder(settings_mgr):
+    folder = settings_mgr.get_setting("swipe_store_folder", os.path.join(DEFAULT_DATA_FOLDER, SWIPE_STORE_FOLDER_NAME))
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def get_schedule_filepath(settings_mgr):
+    folder = settings_mgr.get_setting("database_folder", DEFAULT_DATA_FOLDER)
+    return os.path.join(folder, settings_mgr.get_setting("schedule_filename", DEFAULT_SCHEDULE_FILENAME))
+
+def is_shared_log_mode(settings_mgr):
+    return bool(settings_mgr.get_setting("shared_log_mode", False))
+
+def get_station_id(settings_mgr):
+    # Must be unique per station: each one appends to its own journal file
+    station_id = settings_mgr.get_setting("station_id") or socket.gethostname()
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(station_id))
+
 def get_backup_folder(settings_mgr, type="db"): # type can be 'db' or 'log'
     base_backup_folder = settings_mgr.get_setting("backup_folder", DEFAULT_BACKUP_FOLDER)
     subfolder = "db_backups" if type == "db" else "log_backups"
@@ -0,0 +1,77 @@
+# daily_state.py
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DAYS_KEPT = 2 # Today and yesterday: a swipe captured before midnight but processed after still pairs
+
+
+class DailyAttendanceBuckets:
+    """
+    Per-date attendance state. Each date has its own bucket
+    ({card_id: {'in', 'out', 'date'}}, set of processed cards), so moving to a new
+    day is creating one empty bucket and dropping the oldest - no scan over the
+    cards of the previous day.
+    """
+    def __init__(self, days_kept=DAYS_KEPT):
+        self.days_kept = days_kept
+        self._buckets = OrderedDict() # date -> (attendance dict, processed set), oldest first
+
+    def for_day(self, day):
+        """(attendance, processed) of `day`, creating the bucket on first use."""
+        bucket = self._buckets.get(day)
+        if bucket is None:
+            bucket = ({}, set())
+            self._buckets[day] = bucket
+            if len(self._buckets) > 1 and day < next(reversed(self._buckets)):
+                # A late swipe for an older day: keep buckets in date order
+                self._buckets = OrderedDict(sorted(self._buckets.items()))
+            while len(self._buckets) > self.days_kept:
+                dropped_day, (dropped, _) = self._buckets.popitem(last=False)
+                logger.info(f"Dropped attendance state of {dropped_day} ({len(dropped)} card(s)).")
+        return bucket
+
+    def peek(self, day):
+        """(attendance, processed) of `day` if it is still kept, else None. Never creates a bucket."""
+        return self._buckets.get(day)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RecentSwipes:
+    """
+    Last accepted swipe time per card, kept only as long as it can still reject a
+    swipe: entries older than the swipe delay are expired from the front (oldest
+    first), so the size is bounded by the cards swiped within one delay window.
+    """
+    def __init__(self):
+        self._times = OrderedDict() # card_id -> datetime, oldest first
+
+    def expire(self, cutoff):
+        """Drops entries at or before cutoff (now - swipe delay)."""
+        while self._times:
+            card_id, swiped_at = next(iter(self._times.items()))
+            if swiped_at > cutoff:
+                break
+            del self._times[card_id]
+
+    def get(self, card_id, default=None):
+        return self._times.get(card_id, default)
+
+    def __setitem__(self, card_id, swiped_at):
+        self._times[card_id] = swiped_at
+        self._times.move_to_end(card_id)
+
+    def __getitem__(self, card_id):
+        return self._times[card_id]
+
+    def __contains__(self, card_id):
+        return card_id in self._times
+
+    def pop(self, card_id, default=None):
+        return self._times.pop(card_id, default)
+
+    def __len__(self):
+        return len(self._times)
@@ -3,11 +3,37 @@ import pandas as pd
 import os
 import shutil
 from datetime import datetime
+import threading
 import config
 import logging
+from employee_search import EmployeeSearchIndex, SEARCH_COLUMNS
+from employee_records import EmployeeDirectory, EmployeeRecord
+from file_watcher import FileWatcher, file_signature
+from excel_stream import write_excel
 
 logger = logging.getLogger(__name__)
 
+
+def diff_employee_tables(old_df, new_df):
+    """
+    Compares two employee tables by ID. Returns (added_df, changed_df, removed_ids):
+    rows of new_df whose ID is new, rows whose name or CARD ID changed, and IDs that
+    disappeared. STT is not compared (it does not affect lookups).
+    """
+    def keyed(df):
+        cols = df.reindex(columns=SEARCH_COLUMNS).fillna("").astype(str).apply(lambda col: col.str.strip())
+        cols = cols[cols['ID'] != ""]
+        return cols.drop_duplicates(subset='ID', keep='first').set_index('ID', drop=False)
+
+    old, new = keyed(old_df), keyed(new_df)
+    added_ids = new.index.difference(old.index)
+    removed_ids = old.index.difference(new.index)
+    common = new.index.intersection(old.index)
+    differs = (new.loc[common, ['Họ tên', 'CARD ID']] != old.loc[common, ['Họ tên', 'CARD ID']]).any(axis=1)
+    changed_ids = common[differs.to_numpy()]
+    return new.loc[added_ids].reset_index(drop=True), new.loc[changed_ids].reset_index(drop=True), list(removed_ids)
+
+
 class EmployeeManager:
     def __init__(self, settings_manager):
         self.settings_manager = settings_manager
@@ -15,21 +41,33 @@ class EmployeeManager:
         self.db_filepath = config.get_db_filepath(self.settings_manager)
         logger.info(f"[EmployeeManager Init] Using DB Filepath: {self.db_filepath}") # Log path used
         self.df = self._load_database() 
+        self.search_index = EmployeeSearchIndex(self.df) # Type-ahead search over name/ID/CARD ID
+        self.directory = EmployeeDirectory(self.df) # CARD ID / ID -> EmployeeRecord for the swipe path
+        self._own_save_signature = None # (mtime, size) of the file as this app last wrote it
+        self._watcher = None
+        self._pending_lock = threading.Lock()
+        self._pending_delta = None # Set by the watcher thread, applied by apply_external_changes()
 
-    def _load_database(self):
+    def _load_database(self, filepath=None, strict=False):
+        """
+        Reads the database file (default: self.db_filepath) and returns the DataFrame; does
+        not assign it. With strict=True read errors are raised instead of giving an empty table.
+        """
+        if filepath is None:
+            filepath = self.db_filepath
         try:
             # Use the path determined during initialization
-            if not os.path.exists(self.db_filepath):
-                logger.warning(f"Database file '{self.db_filepath}' not found. Creating empty database.")
+            if not os.path.exists(filepath):
+                logger.warning(f"Database file '{filepath}' not found. Creating empty database.")
                 df = pd.DataFrame(columns=config.DB_COLUMNS)
                 df['CARD ID'] = df['CARD ID'].astype(str)
                 # Ensure directory exists before saving
-                os.makedirs(os.path.dirname(self.db_filepath) or '.', exist_ok=True)
-                df.to_excel(self.db_filepath, index=False)
+                os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+                write_excel(df, filepath)
                 return df
             else:
-                logger.info(f"Loading database from: {self.db_filepath}")
-                df = pd.read_excel(self.db_filepath, dtype={'CARD ID': str, 'ID': str})
+                logger.info(f"Loading database from: {filepath}")
+                df = pd.read_excel(filepath, dtype={'CARD ID': str, 'ID': str})
                 # ... (rest of loading logic remains the same) ...
                 for col in config.DB_COLUMNS:
                     if col not in df.columns:
@@ -41,12 +79,35 @@ class EmployeeManager:
                 return df
 
         except FileNotFoundError:
-             logger.error(f"Database file '{self.db_filepath}' not found during load.")
+             if strict:
+                 raise
+             logger.error(f"Database file '{filepath}' not found during load.")
              return pd.DataFrame(columns=config.DB_COLUMNS, dtype={'CARD ID': str, 'ID': str})
         except Exception as e:
-            logger.error(f"Error loading employee database '{self.db_filepath}': {e}", exc_info=True) # Log traceback
+            if strict:
+                raise
+            logger.error(f"Error loading employee database '{filepath}': {e}", exc_info=True) # Log traceback
             return pd.DataFrame(columns=config.DB_COLUMNS, dtype={'CARD ID': str, 'ID': str})
 
+    def read_database_snapshot(self, filepath):
+        """
+        Loads a database file and builds its search index and records without touching
+        the live table, so it can run on a background thread. Pass the result to swap_database.
+        """
+        df = self._load_database(filepath)
+        return df, EmployeeSearchIndex(df), EmployeeDirectory(df)
+
+    def swap_database(self, filepath, df, search_index, directory):
+        """Replaces the live table, its path, its index and its records in one step."""
+        self.db_filepath = filepath
+        self.df = df
+        self.search_index = search_index
+        self.directory = directory
+        logger.info(f"Employee database switched to '{filepath}' ({len(df)} employee(s)).")
+        if self._watcher is not None and self._watcher.filepath != os.path.abspath(filepath):
+            self.stop_watching()
+            self.start_watching()
+
     def save_database(self):
         try:
             # Ensure directory exists
@@ -54,31 +115,84 @@ class EmployeeManager:
             # Sort by STT before saving if column exists
             if 'STT' in self.df.columns:
                  self.df.sort_values(by='STT', inplace=True)
-            self.df.to_excel(self.db_filepath, index=False)
+            write_excel(self.df, self.db_filepath)
+            self._own_save_signature = file_signature(self.db_filepath) # So the watcher ignores our own write
             logger.info(f"Employee database saved to '{self.db_filepath}'")
         except Exception as e:
             logger.error(f"Error saving employee database '{self.db_filepath}': {e}")
             # Notify the user via UI
 
-    def find_employee_by_card_id(self, card_id):
-        if self.df.empty:
+    # --- External edits (HR editing the file in Excel while the app runs) ---
+    def start_watching(self):
+        """Watches the database file; external edits are read and diffed on the watcher thread."""
+        if self._watcher is not None:
+            return
+        self._watcher = FileWatcher(self.db_filepath, self._on_database_file_changed)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _on_database_file_changed(self, filepath):
+        """Watcher thread: parses the edited file and queues the delta; never touches the live table."""
+        if file_signature(filepath) == self._own_save_signature:
+            logger.debug(f"Ignoring change to '{filepath}': written by this app.")
+            return
+        if os.path.abspath(filepath) != os.path.abspath(self.db_filepath):
+            return # Database folder was switched meanwhile
+        base_df = self.df
+        try:
+            new_df = self._load_database(filepath, strict=True)
+        except Exception as e:
+            # Usually still locked or half-written by Excel; the next write triggers another read
+            logger.warning(f"Cannot read externally edited database '{filepath}' yet: {e}")
+            return
+        added, changed, removed = diff_employee_tables(base_df, new_df)
+        logger.info(f"External edit of '{filepath}': {len(added)} added, {len(changed)} changed, {len(removed)} removed.")
+        new_index = None
+        if len(added) + len(changed) + len(removed) > max(100, len(base_df) // 10):
+            new_index = EmployeeSearchIndex(new_df) # Large edit: rebuild here rather than patch on the swipe thread
+        new_directory = EmployeeDirectory(new_df) # Plain dicts: cheap to rebuild whole, swapped in by reference
+        with self._pending_lock:
+            self._pending_delta = (base_df, new_df, added, changed, removed, new_index, new_directory)
+
+    def apply_external_changes(self):
+        """
+        Applies the latest external edit, if any: swaps in the re-read table and updates
+        the search index for the changed records only. Call from the swipe-processing
+        thread. Returns (added, changed, removed) counts, or None if nothing was applied.
+        """
+        with self._pending_lock:
+            pending, self._pending_delta = self._pending_delta, None
+        if pending is None:
             return None
-        # Ensure comparison is string vs string
-        card_id_str = str(card_id).strip()
-        result = self.df[self.df['CARD ID'] == card_id_str]
-        if not result.empty:
-            # Return first match as a dictionary
-            return result.iloc[0].to_dict()
-        return None
+        base_df, new_df, added, changed, removed, new_index, new_directory = pending
+        if self.df is not base_df:
+            # The app added/imported employees and saved after the file was read: the
+            # file now holds that newer table, so this delta is stale.
+            logger.warning("Discarding external database edit: the table changed in the app meanwhile.")
+            return None
+
+        if new_index is not None:
+            self.search_index = new_index
+        else:
+            for emp_id in removed + changed['ID'].tolist():
+                self.search_index.remove(emp_id)
+            for name, emp_id, card_id in zip(*(pd.concat([changed, added])[col].tolist() for col in SEARCH_COLUMNS)):
+                self.search_index.add(name, emp_id, card_id)
+        self.df = new_df
+        self.directory = new_directory
+        logger.info(f"Applied external database edit ({len(new_df)} employee(s)).")
+        return len(added), len(changed), len(removed)
+
+    def find_employee_by_card_id(self, card_id):
+        """The EmployeeRecord with this CARD ID, or None. A dict lookup: no DataFrame work."""
+        return self.directory.by_card.get(str(card_id).strip())
 
     def find_employee_by_id(self, emp_id):
-        if self.df.empty:
-            return None
-        emp_id_str = str(emp_id).strip()
-        result = self.df[self.df['ID'] == emp_id_str]
-        if not result.empty:
-            return result.iloc[0].to_dict()
-        return None
+        return self.directory.by_id.get(str(emp_id).strip())
 
     def add_employee(self, name, emp_id, card_id):
         card_id_str = str(card_id).strip()
@@ -101,6 +215,8 @@ class EmployeeManager:
             }], columns=config.DB_COLUMNS)
 
             self.df = pd.concat([self.df, new_employee], ignore_index=True)
+            self.search_index.add(name, emp_id_str, card_id_str)
+            self.directory.add(EmployeeRecord(next_stt, str(name).strip(), emp_id_str, card_id_str))
             self.save_database()
             logger.info(f"Added new employee: ID={emp_id_str}, Name={name}, CARD ID={card_id_str}")
             return True, "Thêm nhân viên thành công."
@@ -108,6 +224,62 @@ class EmployeeManager:
             logger.error(f"Error adding employee: {e}")
             return False, f"Lỗi khi thêm nhân viên: {e}"
 
+    def _read_import_file(self, filepath):
+        if filepath.lower().endswith(".csv"):
+            return pd.read_csv(filepath, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        return pd.read_excel(filepath, dtype=str, keep_default_na=False)
+
+    def bulk_import(self, filepath, dry_run=False):
+        """
+        Imports many employees from a CSV/XLSX file with 'Họ tên', 'ID', 'CARD ID' columns.
+        All checks (missing fields, duplicate CARD ID/ID inside the file or against the
+        database) run as vectorized column operations; valid rows get consecutive STT
+        numbers and are committed with a single save.
+        Returns (imported_count, conflicts_df). conflicts_df lists skipped rows with
+        their file row number and the reason ('Lý do').
+        """
+        incoming = self._read_import_file(filepath)
+        missing_cols = [col for col in ("Họ tên", "ID", "CARD ID") if col not in incoming.columns]
+        if missing_cols:
+            raise ValueError(f"Thiếu cột trong file nhập: {', '.join(missing_cols)}")
+
+        incoming = incoming[["Họ tên", "ID", "CARD ID"]].apply(lambda col: col.astype(str).str.strip())
+        incoming.insert(0, "Dòng", incoming.index + 2) # Row number as seen in Excel (header is row 1)
+        incoming = incoming[(incoming[["Họ tên", "ID", "CARD ID"]] != "").any(axis=1)] # Skip blank lines
+
+        existing_cards = self.df['CARD ID'].astype(str).str.strip()
+        existing_ids = self.df['ID'].astype(str).str.strip()
+        checks = [
+            (incoming["Họ tên"] == "", "Thiếu Họ tên"),
+            (incoming["ID"] == "", "Thiếu ID"),
+            (incoming["CARD ID"] == "", "Thiếu CARD ID"),
+            (incoming["CARD ID"].duplicated(keep=False) & (incoming["CARD ID"] != ""), "CARD ID trùng trong file"),
+            (incoming["ID"].duplicated(keep=False) & (incoming["ID"] != ""), "ID trùng trong file"),
+            (incoming["CARD ID"].isin(existing_cards), "CARD ID đã tồn tại"),
+            (incoming["ID"].isin(existing_ids), "ID nhân viên đã tồn tại"),
+        ]
+        reasons = pd.Series("", index=incoming.index)
+        for mask, reason in checks:
+            reasons = reasons.mask(mask, reasons + reason + "; ")
+        reasons = reasons.str.rstrip("; ")
+        has_conflict = reasons != ""
+
+        conflicts = incoming[has_conflict].assign(**{"Lý do": reasons[has_conflict]})
+        valid = incoming[~has_conflict].drop(columns=["Dòng"])
+        logger.info(f"Bulk import '{filepath}': {len(valid)} valid row(s), {len(conflicts)} conflict(s).")
+        if dry_run or valid.empty:
+            return 0, conflicts.reset_index(drop=True)
+
+        current_max = pd.to_numeric(self.df['STT'], errors='coerce').max() if not self.df.empty else 0
+        next_stt = int(current_max) + 1 if pd.notna(current_max) else 1
+        valid.insert(0, "STT", range(next_stt, next_stt + len(valid)))
+        self.df = pd.concat([self.df, valid[config.DB_COLUMNS]], ignore_index=True)
+        self.search_index.add_many(valid)
+        self.directory.add_many(valid)
+        self.save_database() # One save for the whole batch
+        logger.info(f"Bulk imported {len(valid)} employee(s) from '{filepath}'.")
+        return len(valid), conflicts.reset_index(drop=True)
+
     def get_all_employees(self):
          # Return a list of dictionaries, ensure CARD ID and ID are strings
         if self.df.empty:
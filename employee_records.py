@@ -0,0 +1,58 @@
+# employee_records.py
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def clean_field(value):
+    """Employee cell as text: stripped, '' for None/NaN (also read back as 'nan'/'None')."""
+    value = "" if value is None else str(value).strip()
+    return "" if value.lower() in ("nan", "none") else value
+
+
+class EmployeeRecord:
+    """
+    One employee as used on the swipe path. Created once when the table is loaded and
+    handed out by reference, so lookups build nothing. Treat as read-only: an edit
+    replaces the record.
+    """
+    __slots__ = ("stt", "name", "emp_id", "card_id")
+
+    def __init__(self, stt, name, emp_id, card_id):
+        self.stt = stt
+        self.name = name
+        self.emp_id = emp_id
+        self.card_id = card_id
+
+    def __repr__(self):
+        return f"EmployeeRecord(stt={self.stt!r}, name={self.name!r}, emp_id={self.emp_id!r}, card_id={self.card_id!r})"
+
+
+class EmployeeDirectory:
+    """
+    CARD ID -> EmployeeRecord and ID -> EmployeeRecord dicts over an employee table.
+    When a CARD ID or ID appears twice, the first row wins, as with the old
+    DataFrame lookups.
+    """
+    def __init__(self, df=None):
+        self.by_card = {}
+        self.by_id = {}
+        if df is not None:
+            self.add_many(df)
+
+    def add(self, record):
+        if record.card_id:
+            self.by_card.setdefault(record.card_id, record)
+        if record.emp_id:
+            self.by_id.setdefault(record.emp_id, record)
+
+    def add_many(self, df):
+        """Adds one record per row of a DataFrame with the DB_COLUMNS columns."""
+        if df is None or df.empty:
+            return
+        columns = [df[col].tolist() if col in df.columns else [None] * len(df) for col in ("STT", "Họ tên", "ID", "CARD ID")]
+        for stt, name, emp_id, card_id in zip(*columns):
+            self.add(EmployeeRecord(stt, clean_field(name), clean_field(emp_id), clean_field(card_id)))
+
+    def __len__(self):
+        return len(self.by_id)
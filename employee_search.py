@@ -0,0 +1,135 @@
+# employee_search.py
+import heapq
+import unicodedata
+import logging
+from bisect import bisect_left, bisect_right
+
+import pandas as pd
+
+from employee_records import clean_field
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ["Họ tên", "ID", "CARD ID"]
+DEFAULT_RESULT_LIMIT = 50
+_PREFIX_END = "￿" # Sorts after any folded character, closes a prefix range
+# Drops the combining marks left by NFD (all Vietnamese tones/vowel marks) and maps đ -> d
+_FOLD_TABLE = {code: None for code in range(0x300, 0x370)}
+_FOLD_TABLE[ord("đ")] = "d"
+
+
+def fold_text(text):
+    """Lower-cases and strips Vietnamese diacritics: 'Nguyễn Văn Đức' -> 'nguyen van duc'."""
+    text = str(text).lower()
+    if text.isascii(): # IDs, card numbers and unaccented names need no decomposition
+        return text
+    return unicodedata.normalize("NFD", text).translate(_FOLD_TABLE)
+
+
+class EmployeeSearchIndex:
+    """
+    In-memory type-ahead index over employee name, ID and CARD ID.
+    Every folded name word, the whole folded name, the ID and the CARD ID are kept as
+    tokens in one sorted list, so a prefix lookup is two bisects. A multi-word query
+    starts from the rarest word's range and filters by the others.
+    """
+    def __init__(self, df=None):
+        self._records = [] # row_id -> (name, emp_id, card_id), None once removed
+        self._folded = [] # row_id -> folded (name, emp_id, card_id)
+        self._row_tokens = [] # row_id -> tuple of tokens
+        self._keys = [] # Sorted tokens
+        self._rows = [] # Row id of each entry in _keys
+        self._row_by_id = {} # emp_id -> row_id of its live record
+        self._removed = 0
+        if df is not None:
+            self.rebuild(df)
+
+    def _append_record(self, name, emp_id, card_id):
+        row_id = len(self._records)
+        record = (clean_field(name), clean_field(emp_id), clean_field(card_id))
+        folded = tuple(fold_text(value) for value in record)
+        tokens = set(folded[0].split())
+        tokens.update(value for value in folded if value)
+        self._records.append(record)
+        self._folded.append(folded)
+        self._row_tokens.append(tuple(tokens))
+        self._row_by_id[record[1]] = row_id
+        return row_id
+
+    def rebuild(self, df):
+        """Re-indexes all employees of an EmployeeManager DataFrame."""
+        self._records, self._folded, self._row_tokens = [], [], []
+        self._row_by_id, self._removed = {}, 0
+        if df is not None and not df.empty:
+            columns = [df[col].tolist() if col in df.columns else [None] * len(df) for col in SEARCH_COLUMNS]
+            for name, emp_id, card_id in zip(*columns):
+                self._append_record(name, emp_id, card_id)
+        entries = sorted((token, row_id) for row_id, tokens in enumerate(self._row_tokens) for token in tokens)
+        self._keys = [token for token, _ in entries]
+        self._rows = [row_id for _, row_id in entries]
+        logger.info(f"Employee search index built: {len(self._records)} employee(s), {len(self._keys)} token(s).")
+
+    def add(self, name, emp_id, card_id):
+        """Indexes one new employee without rebuilding."""
+        row_id = self._append_record(name, emp_id, card_id)
+        for token in self._row_tokens[row_id]:
+            position = bisect_right(self._keys, token)
+            self._keys.insert(position, token)
+            self._rows.insert(position, row_id)
+
+    def add_many(self, df):
+        """Indexes a batch of new employees (rows of a DataFrame with SEARCH_COLUMNS)."""
+        if len(df) > max(100, len(self._records) // 10):
+            # Large batch: one sort is cheaper than many list inserts
+            existing = pd.DataFrame([record for record in self._records if record is not None], columns=SEARCH_COLUMNS)
+            self.rebuild(pd.concat([existing, df[SEARCH_COLUMNS]], ignore_index=True))
+            return
+        for name, emp_id, card_id in zip(*(df[col].tolist() for col in SEARCH_COLUMNS)):
+            self.add(name, emp_id, card_id)
+
+    def remove(self, emp_id):
+        """Drops one employee's tokens. Returns False if the ID is not indexed."""
+        row_id = self._row_by_id.pop(clean_field(emp_id), None)
+        if row_id is None:
+            return False
+        for token in self._row_tokens[row_id]:
+            lo, hi = bisect_left(self._keys, token), bisect_right(self._keys, token)
+            position = lo + self._rows[lo:hi].index(row_id)
+            del self._keys[position]
+            del self._rows[position]
+        self._records[row_id] = None
+        self._row_tokens[row_id] = ()
+        self._removed += 1
+        return True
+
+    def _prefix_range(self, prefix):
+        return bisect_left(self._keys, prefix), bisect_right(self._keys, prefix + _PREFIX_END)
+
+    def search(self, query, limit=DEFAULT_RESULT_LIMIT):
+        """
+        Returns up to `limit` dicts (Họ tên, ID, CARD ID) whose tokens start with every
+        word of the query, diacritics and case ignored. Exact ID/CARD ID matches come
+        first, then names starting with the query, then by name.
+        """
+        words = fold_text(query).split()
+        if not words:
+            return []
+        ranges = sorted((hi - lo, lo, hi, word) for word in set(words) for lo, hi in [self._prefix_range(word)])
+        if ranges[0][0] == 0:
+            return []
+        _, lo, hi, _ = ranges[0]
+        candidates = set(self._rows[lo:hi])
+        for _, _, _, word in ranges[1:]:
+            candidates = {row_id for row_id in candidates
+                          if any(token.startswith(word) for token in self._row_tokens[row_id])}
+
+        folded_query = " ".join(words)
+        def rank(row_id):
+            name, emp_id, card_id = self._folded[row_id]
+            return (folded_query != emp_id and folded_query != card_id, not name.startswith(folded_query), name, emp_id)
+
+        best = heapq.nsmallest(limit, candidates, key=rank)
+        return [dict(zip(SEARCH_COLUMNS, self._records[row_id])) for row_id in best]
+
+    def __len__(self):
+        return len(self._records) - self._removed
@@ -0,0 +1,124 @@
+# event_sinks.py
+import json
+import os
+import sys
+import threading
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Every sink is a callable with the same keyword signature as UIManager.update_display,
+# so it can be handed to AttendanceManager as its ui_update_callback.
+
+
+class JsonLinesSink:
+    """Writes one JSON object per attendance event to a stream (stdout by default)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+        self._lock = threading.Lock()
+
+    def _build_event(self, status, card_id, name, emp_id, time):
+        return {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "status": status,
+            "card_id": card_id,
+            "name": name,
+            "emp_id": emp_id,
+            "time": time.isoformat(timespec="seconds") if time else None,
+        }
+
+    def __call__(self, status="", card_id=None, name=None, emp_id=None, time=None):
+        line = json.dumps(self._build_event(status, card_id, name, emp_id, time), ensure_ascii=False, default=str)
+        with self._lock:
+            try:
+                self.stream.write(line + "\n")
+                self.stream.flush()
+            except (IOError, ValueError) as e:
+                logger.error(f"Failed to write event to stream: {e}")
+
+    def close(self):
+        pass # stdout is not ours to close
+
+
+class JsonLinesFileSink(JsonLinesSink):
+    """JSON lines appended to a file instead of stdout."""
+
+    def __init__(self, filepath):
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        super().__init__(open(filepath, 'a', encoding='utf-8'))
+        self.filepath = filepath
+
+    def close(self):
+        with self._lock:
+            self.stream.close()
+
+
+class LogFileSink:
+    """Human readable event log, same message layout as the GUI log panel."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        self._file = open(filepath, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, status="", card_id=None, name=None, emp_id=None, time=None):
+        event_time = time if time else datetime.now()
+        log_msg = status
+        details = []
+        if card_id: details.append(f"Card: {card_id}")
+        if name: details.append(f"Tên: {name}")
+        if emp_id: details.append(f"ID: {emp_id}")
+        if details:
+            log_msg += f" ({', '.join(details)})"
+        with self._lock:
+            try:
+                self._file.write(f"[{event_time.strftime('%Y-%m-%d %H:%M:%S')}] {log_msg}\n")
+                self._file.flush()
+            except (IOError, ValueError) as e:
+                logger.error(f"Failed to write event to '{self.filepath}': {e}")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MultiSink:
+    """Fans one event out to several sinks."""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def __call__(self, **kwargs):
+        for sink in self.sinks:
+            try:
+                sink(**kwargs)
+            except Exception as e:
+                logger.error(f"Event sink {sink!r} failed: {e}", exc_info=True)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def build_sink(specs):
+    """
+    Builds a sink from a list of specs such as ["stdout", "log:events.log", "jsonl:events.jsonl"].
+    Returns a single sink (a MultiSink if more than one spec is given).
+    """
+    sinks = []
+    for spec in specs:
+        kind, _, target = spec.partition(":")
+        if kind == "stdout":
+            sinks.append(JsonLinesSink())
+        elif kind == "jsonl" and target:
+            sinks.append(JsonLinesFileSink(target))
+        elif kind == "log" and target:
+            sinks.append(LogFileSink(target))
+        else:
+            raise ValueError(f"Unknown event sink spec: '{spec}' (expected stdout, jsonl:<file> or log:<file>)")
+    if not sinks:
+        sinks.append(JsonLinesSink())
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
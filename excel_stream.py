@@ -0,0 +1,77 @@
+# excel_stream.py
+import math
+import logging
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Same header look as DataFrame.to_excel
+_THIN = Side(style="thin")
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+
+def _cell_value(value, decimals):
+    """One value as the writer takes it: None for empty cells, floats rounded like to_excel's float_format."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float): # Includes np.float64
+        if math.isnan(value):
+            return None
+        return round(float(value), decimals) if decimals is not None else float(value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return _cell_value(value.item(), decimals)
+    return value
+
+
+def _column_values(series, decimals):
+    """
+    Values of one column chunk. The conversion is chosen once per column: plain
+    float columns are rounded in one numpy call, integer columns pass through,
+    and only object/string columns (the mixed time/hours day columns) go value by value.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        values = series.to_numpy()
+        if decimals is not None:
+            values = np.round(values, decimals)
+        return [None if v != v else v for v in values.tolist()] # v != v only for NaN
+    if isinstance(dtype, np.dtype) and dtype.kind in "iub":
+        return series.tolist()
+    return [_cell_value(value, decimals) for value in series.tolist()]
+
+
+def write_excel(df, filepath, decimals=None, sheet_name="Sheet1", chunk_rows=config.EXCEL_STREAM_CHUNK_ROWS):
+    """
+    Writes a DataFrame to .xlsx like df.to_excel(filepath, index=False), but with
+    openpyxl in write-only mode: rows are streamed to the file in chunks instead of
+    building the whole workbook in memory first. decimals rounds float cells, as
+    float_format="%.2f" did for decimals=2.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(sheet, value=str(name))
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        header.append(cell)
+    sheet.append(header)
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        columns = [_column_values(chunk.iloc[:, i], decimals) for i in range(chunk.shape[1])]
+        for row in zip(*columns):
+            sheet.append(row)
+    workbook.save(filepath)
+    logger.debug(f"Wrote {len(df)} row(s) x {df.shape[1]} column(s) to '{filepath}'.")
@@ -0,0 +1,139 @@
+# file_watcher.py
+import os
+import sys
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+import time
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# inotify constants (linux/inotify.h)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def file_signature(filepath):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class _Inotify:
+    """Minimal ctypes binding: watches one directory for files written/renamed into it."""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for '{directory}'")
+
+    def read_names(self, timeout):
+        """File names with events, waiting up to timeout seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, _, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            names.append(os.fsdecode(data[offset:offset + name_len].rstrip(b"\0")))
+            offset += name_len
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """
+    Calls callback(filepath) on a background thread when the file changes.
+
+    On Linux the parent directory is watched with inotify (editors such as Excel
+    replace the file through a temp file + rename, so the directory is watched, not
+    the file). Elsewhere, or if inotify fails, the file's mtime/size is polled.
+    Bursts of writes are coalesced: the callback runs once the file has stopped
+    changing for settle_seconds.
+    """
+    def __init__(self, filepath, callback, poll_interval=config.DB_WATCH_POLL_SECONDS,
+                 settle_seconds=config.DB_WATCH_SETTLE_SECONDS, use_inotify=True):
+        self.filepath = os.path.abspath(filepath)
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.backend = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _Inotify(os.path.dirname(self.filepath) or ".")
+                self.backend = "inotify"
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify unavailable ({e}); polling '{self.filepath}' instead.")
+        if inotify is None:
+            self.backend = "polling"
+        logger.info(f"Watching '{self.filepath}' ({self.backend}).")
+
+        basename = os.path.basename(self.filepath)
+        last_signature = file_signature(self.filepath)
+        pending_since = None # Time of the last change not yet reported
+        try:
+            while not self._stop_event.is_set():
+                wait = self.settle_seconds / 2 if pending_since is not None else self.poll_interval
+                if inotify is not None:
+                    if basename in inotify.read_names(wait):
+                        pending_since = time.monotonic()
+                else:
+                    self._stop_event.wait(wait)
+
+                signature = file_signature(self.filepath)
+                if signature != last_signature:
+                    last_signature = signature
+                    pending_since = time.monotonic() # Still being written: restart the settle timer
+                    continue
+                if pending_since is not None and time.monotonic() - pending_since >= self.settle_seconds:
+                    pending_since = None
+                    if signature is None:
+                        continue # Removed (e.g. mid-replace); wait for it to come back
+                    try:
+                        self.callback(self.filepath)
+                    except Exception as e:
+                        logger.error(f"File change handler failed for '{self.filepath}': {e}", exc_info=True)
+        finally:
+            if inotify is not None:
+                inotify.close()
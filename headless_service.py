@@ -0,0 +1,221 @@
+# headless_service.py
+import sys
+import os
+import argparse
+import logging
+import queue
+import signal
+import threading
+import time
+
+import config
+import app_logging
+from settings_manager import SettingsManager
+from employee_manager import EmployeeManager
+from ot_log_manager import OTLogManager
+from attendance_manager import AttendanceManager
+from work_scheduler import WorkScheduler
+from event_sinks import build_sink
+from spill_queue import SpillQueue
+from swipe_dedup import SwipeDeduplicator
+from month_rollover import MonthRollover
+from swipe_event_store import SwipeEventStore
+
+# NOTE: nothing in this module may import ui_manager/customtkinter/tkinter.
+# The headless engine is meant to run as a service on machines without a display.
+
+logger = logging.getLogger(__name__)
+
+READER_CHOICES = ("hid", "simulator", "stdin", "none")
+
+
+def setup_logging(log_dir="app_logs", level=logging.INFO):
+    # Console logging goes to stderr so stdout stays clean for JSON line events
+    app_logging.setup_logging(log_dir, "ot_manager_headless", level, stream=sys.stderr)
+
+
+class HeadlessApplication:
+    """Runs the attendance engine without any GUI. Events are reported to an event sink."""
+
+    def __init__(self, event_sink, reader="hid", settings_file=config.SETTINGS_FILENAME):
+        logger.info("Initializing OT Manager (headless)...")
+        self.event_sink = event_sink
+        self._stop_event = threading.Event()
+
+        self.settings_manager = SettingsManager(settings_file)
+        logger.info("Settings Manager initialized.")
+        app_logging.configure_levels(self.settings_manager.get_setting("log_levels"))
+        self.swipe_queue = SpillQueue(
+            config.get_swipe_spill_filepath(self.settings_manager),
+            maxsize=config.SWIPE_QUEUE_MEMORY_SLOTS,
+            overflow_callback=self._on_queue_overflow
+        )
+        self.swipe_input = SwipeDeduplicator(self.swipe_queue) # What the readers write to: drops double reads
+        self.employee_manager = EmployeeManager(self.settings_manager)
+        logger.info("Employee Manager initialized.")
+        self.ot_log_manager = OTLogManager(self.settings_manager)
+        logger.info("OT Log Manager initialized.")
+        self.work_scheduler = WorkScheduler(self.settings_manager)
+        self.work_scheduler.load()
+        logger.info("Work Scheduler initialized.")
+        self.attendance_manager = AttendanceManager(
+            settings_manager=self.settings_manager,
+            employee_manager=self.employee_manager,
+            ot_log_manager=self.ot_log_manager,
+            ui_update_callback=self.event_sink,
+            event_store=SwipeEventStore(config.get_swipe_store_folder(self.settings_manager)),
+            work_scheduler=self.work_scheduler
+        )
+        logger.info("Attendance Manager initialized.")
+        self.month_rollover = MonthRollover(self.employee_manager, self.ot_log_manager)
+
+        self.reader = self._create_reader(reader)
+        self._perform_backups()
+
+    def _create_reader(self, reader):
+        if reader == "none":
+            logger.info(">>> No local card reader (network/batch input only) <<<")
+            return None
+        if reader == "simulator":
+            from simulator_hid_handler import SimulatorHidHandler
+            logger.info(">>> Using HID Simulator <<<")
+            return SimulatorHidHandler(self.swipe_input)
+        if reader == "stdin":
+            from stdin_card_reader import StdinCardReader
+            logger.info(">>> Reading card IDs from stdin <<<")
+            return StdinCardReader(self.swipe_input)
+        # Real HID reader - pywinusb is Windows only, so import lazily
+        if sys.platform != "win32":
+            logger.error("Real HID handling currently only supported on Windows with pywinusb. Use --reader stdin on Linux.")
+            return None
+        try:
+            from hid_handler import HidHandler
+            vid = self.settings_manager.get_setting("zkteco_vid", config.DEFAULT_ZKTeco_VID)
+            pid = self.settings_manager.get_setting("zkteco_pid", config.DEFAULT_ZKTeco_PID)
+            logger.info(f"Attempting to use VID=0x{vid:04X}, PID=0x{pid:04X} from settings.")
+            return HidHandler(self.swipe_input, vid, pid)
+        except Exception as e:
+            logger.error(f"Failed to initialize real HidHandler: {e}", exc_info=True)
+            return None
+
+    def _perform_backups(self):
+        logger.info("Performing startup backups...")
+        try:
+            self.employee_manager.backup_database()
+        except Exception as e:
+            logger.error(f"Error during database backup: {e}")
+        try:
+            self.ot_log_manager.backup_current_log()
+        except Exception as e:
+            logger.error(f"Error during log backup: {e}")
+        logger.info("Startup backups completed.")
+
+    def _on_queue_overflow(self, event, depth):
+        if event == "overflow":
+            self.event_sink(status=f"Hàng đợi quẹt thẻ đầy - đang ghi tạm ra đĩa ({depth} lần quẹt chờ)")
+        else:
+            self.event_sink(status="Hàng đợi quẹt thẻ đã xử lý hết phần ghi tạm")
+
+    def _handle_swipe(self, event):
+        try:
+            self.attendance_manager.process_swipe(event.card_id, swipe_time=event.captured_at, source=event.source)
+        except Exception as e:
+            logger.error(f"Unhandled error processing swipe {event.card_id}: {e}", exc_info=True)
+            self.event_sink(status=f"LỖI xử lý thẻ ({event.card_id})", card_id=event.card_id)
+
+    def stop(self, *args):
+        logger.info("Stop requested.")
+        self._stop_event.set()
+
+    def start(self):
+        """Starts the local reader and the database watcher."""
+        if self.reader:
+            self.reader.start()
+        self.employee_manager.start_watching()
+        self.event_sink(status="Sẵn sàng nhận thẻ (headless)")
+        self._next_shared_sync = time.monotonic()
+        self._next_rollover_check = time.monotonic()
+
+    def upkeep(self):
+        """
+        Periodic engine upkeep, called about every 0.5 s from the thread that processes
+        swipes: shared folder sync, month log rollover, external database edits.
+        """
+        if self.ot_log_manager.shared is not None and time.monotonic() >= self._next_shared_sync:
+            try:
+                self.ot_log_manager.sync_shared() # Other stations' entries, merge when due
+            except Exception as e:
+                logger.error(f"Error syncing shared log folder: {e}", exc_info=True)
+            self._next_shared_sync = time.monotonic() + config.SHARED_SYNC_MS / 1000
+        if time.monotonic() >= self._next_rollover_check:
+            try:
+                message = self.month_rollover.tick() # Next month's log prepared in background, switched at midnight
+                if message:
+                    self.event_sink(status=message)
+            except Exception as e:
+                logger.error(f"Error during month log rollover: {e}", exc_info=True)
+            self._next_rollover_check = time.monotonic() + (1.0 if self.month_rollover.is_running() else config.MONTH_ROLLOVER_CHECK_MS / 1000)
+        counts = self.employee_manager.apply_external_changes() # Edits HR made to the database file
+        if counts is not None:
+            self.event_sink(status=f"CSDL nhân viên được sửa bên ngoài: +{counts[0]} / ~{counts[1]} / -{counts[2]} NV")
+
+    def shutdown(self):
+        """Stops the reader and watcher, merges/closes the shared journal, flushes the queue and stores."""
+        if self.reader:
+            self.reader.stop()
+        self.employee_manager.stop_watching()
+        self.month_rollover.shutdown()
+        self.ot_log_manager.close_shared()
+        self.swipe_queue.close()
+        self.attendance_manager.event_store.close()
+        logger.info(f"Swipe queue stats at shutdown: {self.swipe_queue.stats()}")
+        logger.info(f"Swipe dedup stats at shutdown: {self.swipe_input.stats()}")
+        self.event_sink(status="Đã dừng (headless)")
+        self.event_sink.close()
+        logger.info("Headless engine stopped.")
+
+    def run(self):
+        logger.info("Starting headless engine...")
+        self.start()
+        try:
+            while not self._stop_event.is_set():
+                self.upkeep()
+                try:
+                    event = self.swipe_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                self._handle_swipe(event)
+        except KeyboardInterrupt:
+            logger.info("Interrupted.")
+        finally:
+            self.shutdown()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OT Manager headless attendance engine (no GUI).")
+    parser.add_argument("--reader", choices=READER_CHOICES, default="hid",
+                        help="Card reader source (default: hid)")
+    parser.add_argument("--sink", action="append", default=[],
+                        help="Event sink: stdout, jsonl:<file> or log:<file>. Can be given several times (default: stdout)")
+    parser.add_argument("--settings", default=config.SETTINGS_FILENAME, help="Path to settings.json")
+    parser.add_argument("--log-dir", default="app_logs", help="Folder for application logs")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_dir, logging.DEBUG if args.debug else logging.INFO)
+    try:
+        os.makedirs(config.DEFAULT_DATA_FOLDER, exist_ok=True)
+    except Exception as e:
+        logger.error(f"Error creating initial directories: {e}")
+
+    app = HeadlessApplication(build_sink(args.sink), reader=args.reader, settings_file=args.settings)
+    signal.signal(signal.SIGTERM, app.stop)
+    app.run()
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ import logging
 from collections import defaultdict
 
 import config # Import config for VID/PID
+from swipe_event import make_swipe_event
 
 
 
@@ -53,7 +54,8 @@ class HidHandler:
 
     def _raw_data_handler(self, data, device_path):
         """Callback function for pywinusb."""
-        logger.debug(f"Raw data from {device_path}: {data}")
+        if logger.isEnabledFor(logging.DEBUG): # Called for every HID report; skip building the message unless wanted
+            logger.debug(f"Raw data from {device_path}: {data}")
 
         # Check if it's a key release event (typically all zeros after byte 1 or 2)
         # Check bytes 2 onwards for keycodes
@@ -74,7 +76,8 @@ class HidHandler:
                 char = KEYCODE_MAP.get(key_code)
                 if char:
                     processed_char = char
-                    logger.debug(f"Device {device_path}: Keycode {key_code:02X} -> Char '{char}'")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"Device {device_path}: Keycode {key_code:02X} -> Char '{char}'")
                     break # Process only the first detected key per report for simplicity
 
         # Update last key data only if it wasn't a release
@@ -84,8 +87,10 @@ class HidHandler:
             if processed_char == 'ENTER':
                 card_id = self.device_buffers[device_path]
                 if card_id: # Only process if buffer is not empty
+                    # Stamp the swipe here, at the source, so queueing delays don't shift the in/out time
+                    event = make_swipe_event(card_id, source=device_path)
                     logger.info(f"Card ID detected from {device_path}: {card_id}")
-                    self.output_queue.put(card_id) # Send complete ID to main thread
+                    self.output_queue.put(event) # Send complete swipe to main thread
                 self.device_buffers[device_path] = "" # Clear buffer for this device
             else:
                 # Append character to the specific device's buffer
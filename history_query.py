@@ -0,0 +1,238 @@
+# history_query.py
+import os
+import re
+import glob
+import json
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+import config
+from report_engine import build_monthly_report, export_report
+
+logger = logging.getLogger(__name__)
+
+CACHE_FOLDER_NAME = ".history_cache"
+CACHE_FORMAT_VERSION = 2
+_LOG_FILE_RE = re.compile(re.escape(config.LOG_FILENAME_PREFIX) + r"(\d{2})_(\d{4})\.xlsx$")
+
+
+def find_month_logs(log_folder, year=None):
+    """Returns [(year, month, filepath), ...] for every monthly log in the folder, oldest first."""
+    found = []
+    for filepath in glob.glob(os.path.join(log_folder, f"{config.LOG_FILENAME_PREFIX}*.xlsx")):
+        match = _LOG_FILE_RE.search(os.path.basename(filepath))
+        if not match:
+            continue
+        month, file_year = int(match.group(1)), int(match.group(2))
+        if year is None or file_year == year:
+            found.append((file_year, month, filepath))
+    return sorted(found)
+
+
+def _aggregate_month(filepath, year, month, shift_start, shift_end, threshold, work_scheduler=None):
+    """Parses one month log and reduces it to per-employee totals. Runs in a worker process."""
+    df_log = pd.read_excel(filepath, dtype={'ID': str})
+    return _month_report(df_log, year, month, shift_start, shift_end, threshold, work_scheduler)
+
+
+def _month_report(df_log, year, month, shift_start, shift_end, threshold, work_scheduler=None):
+    report = build_monthly_report(df_log, shift_start, shift_end, threshold,
+                                  work_scheduler=work_scheduler, log_month=(year, month))
+    report.insert(0, "Tháng", f"{month:02d}/{year}")
+    report.insert(1, "Năm", year)
+    report.insert(2, "Số tháng", month)
+    return report
+
+
+def _json_value(value):
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class MonthAggregateCache:
+    """
+    Per-month aggregates stored as JSON next to the logs, valid while the log's
+    mtime/size and parameters match. The log folder may be a shared network folder,
+    so the cache holds plain data only (no pickle): a planted file can at worst
+    give wrong numbers, never run code. Any unreadable entry is a miss.
+    """
+
+    def __init__(self, log_folder):
+        self.folder = os.path.join(log_folder, CACHE_FOLDER_NAME)
+
+    def _path(self, filepath):
+        return os.path.join(self.folder, os.path.splitext(os.path.basename(filepath))[0] + ".json")
+
+    @staticmethod
+    def _key(filepath, params):
+        stat = os.stat(filepath)
+        return json.dumps([CACHE_FORMAT_VERSION, stat.st_mtime_ns, stat.st_size, params], default=_json_value)
+
+    def get(self, filepath, params):
+        try:
+            with open(self._path(filepath), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry["key"] != self._key(filepath, params):
+                return None
+            return pd.DataFrame({column: pd.Series(values, dtype=dtype)
+                                 for column, dtype, values in zip(entry["columns"], entry["dtypes"], entry["data"])})
+        except Exception:
+            return None
+
+    def put(self, filepath, params, report):
+        """Stores one month; a failure (e.g. read-only share) only costs the next run a re-parse."""
+        entry = {"key": self._key(filepath, params), "columns": [str(c) for c in report.columns],
+                 "dtypes": [str(dtype) for dtype in report.dtypes],
+                 "data": [report[column].tolist() for column in report.columns]}
+        tmp_path = self._path(filepath) + ".tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, default=_json_value)
+            os.replace(tmp_path, self._path(filepath))
+        except OSError as e:
+            logger.warning(f"Could not write history cache for '{filepath}': {e}")
+
+
+def load_month_aggregates(log_folder, shift_start, shift_end, year=None,
+                          threshold=config.REPORT_OT_THRESHOLD_HOURS, max_workers=None, use_cache=True, work_scheduler=None):
+    """
+    Returns one DataFrame with a row per employee per month for all month logs in
+    log_folder (optionally one year). Months whose file is unchanged since the last
+    run come from the cache; the others are parsed in a process pool. With a loaded
+    work_scheduler, late/early counts follow each employee's scheduled shift.
+    """
+    months = find_month_logs(log_folder, year)
+    archived = _archived_only_months(log_folder, year, months)
+    if not months and not archived:
+        return pd.DataFrame()
+    params = (shift_start.strftime("%H:%M:%S"), shift_end.strftime("%H:%M:%S"), float(threshold),
+              work_scheduler.cache_token() if work_scheduler is not None else None)
+    cache = MonthAggregateCache(log_folder)
+
+    results = {}
+    to_parse = []
+    for file_year, month, filepath in months:
+        cached = cache.get(filepath, params) if use_cache else None
+        if cached is not None:
+            results[filepath] = cached
+        else:
+            to_parse.append((file_year, month, filepath))
+    logger.info(f"History query: {len(months)} month log(s), {len(results)} from cache, {len(to_parse)} to parse.")
+
+    if len(to_parse) == 1:
+        file_year, month, filepath = to_parse[0]
+        try:
+            results[filepath] = _aggregate_month(filepath, file_year, month, shift_start, shift_end, threshold, work_scheduler)
+            cache.put(filepath, params, results[filepath])
+        except Exception as e:
+            logger.error(f"Failed to aggregate '{filepath}': {e}")
+    elif to_parse:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(_aggregate_month, filepath, file_year, month, shift_start, shift_end, threshold, work_scheduler): filepath
+                for file_year, month, filepath in to_parse
+            }
+            for future, filepath in futures.items():
+                try:
+                    results[filepath] = future.result()
+                    cache.put(filepath, params, results[filepath])
+                except Exception as e:
+                    logger.error(f"Failed to aggregate '{filepath}': {e}")
+
+    ordered = [(file_year, month, results[filepath]) for file_year, month, filepath in months if filepath in results]
+    if archived:
+        archive, keys = archived
+        for key in keys:
+            file_year, month = int(key[:4]), int(key[5:])
+            ordered.append((file_year, month, _month_report(archive.month_frame(key), file_year, month, shift_start, shift_end, threshold, work_scheduler)))
+        logger.info(f"History query: {len(keys)} month(s) from the log archive.")
+    frames = [report for _, _, report in sorted(ordered, key=lambda item: item[:2])]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _archived_only_months(log_folder, year, months):
+    """(LogArchive, [month keys]) for archived months whose workbook is no longer in the folder, or None."""
+    archive_path = os.path.join(log_folder, config.LOG_ARCHIVE_FILENAME)
+    if not os.path.exists(archive_path):
+        return None
+    from log_archive import LogArchive, month_key # log_archive imports this module
+    archive = LogArchive(archive_path)
+    on_disk = {month_key(file_year, month) for file_year, month, _ in months}
+    keys = [key for key in archive.months() if key not in on_disk and (year is None or key.startswith(f"{year:04d}-"))]
+    return (archive, keys) if keys else None
+
+
+def year_to_date(monthly):
+    """Per-employee totals over all months in the aggregate."""
+    if monthly.empty:
+        return monthly
+    ytd = monthly.groupby("ID", sort=False).agg(**{
+        "Họ tên": ("Họ tên", "last"),
+        "Số tháng có dữ liệu": ("Tháng", "nunique"),
+        "Số ngày có mặt": ("Số ngày có mặt", "sum"),
+        "Tổng giờ OT": ("Tổng giờ OT", "sum"),
+        "Số lần đi muộn": ("Số lần đi muộn", "sum"),
+        "Số lần về sớm": ("Số lần về sớm", "sum"),
+    }).reset_index()
+    ytd["Tổng giờ OT"] = ytd["Tổng giờ OT"].round(2)
+    return ytd.sort_values("Tổng giờ OT", ascending=False, ignore_index=True)
+
+
+def limit_hits(monthly, limit_hours=config.MONTHLY_OT_LIMIT_HOURS):
+    """Employee-months at or over the monthly OT limit."""
+    if monthly.empty:
+        return monthly
+    hits = monthly[monthly["Tổng giờ OT"] >= limit_hours]
+    return hits[["ID", "Họ tên", "Tháng", "Tổng giờ OT"]].sort_values(["ID", "Tháng"], ignore_index=True)
+
+
+def ot_by_month(monthly):
+    """Employee x month pivot of OT hours."""
+    if monthly.empty:
+        return monthly
+    pivot = monthly.pivot_table(index=["ID", "Họ tên"], columns=["Năm", "Số tháng"], values="Tổng giờ OT", aggfunc="sum")
+    pivot.columns = [f"{month:02d}/{year}" for year, month in pivot.columns]
+    return pivot.reset_index()
+
+
+QUERIES = {
+    "ytd": year_to_date,
+    "limit-hits": limit_hits,
+    "by-month": ot_by_month,
+}
+
+
+def main(argv=None):
+    from settings_manager import SettingsManager
+    from work_scheduler import WorkScheduler
+    parser = argparse.ArgumentParser(description="OT queries across all monthly logs in the log folder.")
+    parser.add_argument("query", choices=sorted(QUERIES), help="ytd: year-to-date totals, limit-hits: months at the OT limit, by-month: OT per month")
+    parser.add_argument("--year", type=int, default=datetime.now().year, help="Year to query (default: current year, 0 = all)")
+    parser.add_argument("-o", "--output", default=None, help="Export result to .xlsx/.csv instead of printing")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for parsing (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every month")
+    parser.add_argument("--settings", default=config.SETTINGS_FILENAME)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    settings_manager = SettingsManager(args.settings)
+    shift_start, shift_end = settings_manager.get_shift_times()
+    work_scheduler = WorkScheduler(settings_manager)
+    work_scheduler.load()
+    monthly = load_month_aggregates(
+        config.get_log_folder(settings_manager), shift_start, shift_end, args.year or None,
+        max_workers=args.workers, use_cache=not args.no_cache, work_scheduler=work_scheduler)
+    result = QUERIES[args.query](monthly)
+    if args.output:
+        export_report(result, args.output)
+    else:
+        print(result.to_string(index=False) if not result.empty else "Không có dữ liệu.")
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# load_generator.py
+import asyncio
+import json
+import argparse
+import random
+import time
+import logging
+from datetime import datetime
+
+from network_ingest import DEFAULT_PORT
+
+logger = logging.getLogger(__name__)
+
+# Simulates many gates hammering the ingestion server at once, e.g.
+#   python network_ingest.py --port 9630 --sink log:app_logs/load_events.log
+#   python load_generator.py --port 9630 --stations 40 --swipes 500
+
+
+def load_card_ids(args):
+    if args.cards_from_db:
+        import pandas as pd
+        df = pd.read_excel(args.cards_from_db, dtype={'CARD ID': str})
+        return df['CARD ID'].dropna().astype(str).tolist()
+    return [f"LG{n:08d}" for n in range(args.card_pool)]
+
+
+async def run_station(station_no, args, card_ids, latencies, errors):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    station_id = f"LOAD-{station_no:03d}"
+    sent_at = {}
+    window = asyncio.Semaphore(args.window)
+
+    async def read_acks():
+        for _ in range(args.swipes):
+            line = await reader.readline()
+            if not line:
+                errors.append("connection closed")
+                return
+            ack = json.loads(line)
+            started = sent_at.pop(ack.get("seq"), None)
+            if started is not None:
+                latencies.append(time.perf_counter() - started)
+            if not ack.get("ok"):
+                errors.append(ack.get("error"))
+            window.release()
+
+    ack_task = asyncio.create_task(read_acks())
+    for seq in range(1, args.swipes + 1):
+        await window.acquire()
+        message = {
+            "seq": seq,
+            "station": station_id,
+            "card_id": random.choice(card_ids),
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+        }
+        sent_at[seq] = time.perf_counter()
+        writer.write((json.dumps(message) + "\n").encode("utf-8"))
+        await writer.drain()
+        if args.interval:
+            await asyncio.sleep(random.uniform(0, 2 * args.interval))
+    await ack_task
+    writer.close()
+
+
+async def run(args):
+    card_ids = load_card_ids(args)
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_station(n, args, card_ids, latencies, errors) for n in range(args.stations)))
+    elapsed = time.perf_counter() - started
+
+    total = args.stations * args.swipes
+    latencies.sort()
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float('nan')
+    print(f"Stations: {args.stations}  Swipes: {total}  Elapsed: {elapsed:.2f}s  Throughput: {total / elapsed:.1f} swipes/s")
+    print(f"Ack latency ms  p50={pct(0.50):.1f}  p95={pct(0.95):.1f}  p99={pct(0.99):.1f}  max={pct(1.0):.1f}")
+    print(f"Errors: {len(errors)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for the swipe ingestion server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--stations", type=int, default=20, help="Concurrent station connections")
+    parser.add_argument("--swipes", type=int, default=200, help="Swipes per station")
+    parser.add_argument("--window", type=int, default=8, help="Unacked swipes allowed per station")
+    parser.add_argument("--interval", type=float, default=0.0, help="Mean seconds between swipes per station")
+    parser.add_argument("--card-pool", type=int, default=5000, help="Number of synthetic card IDs")
+    parser.add_argument("--cards-from-db", default=None, help="Use CARD IDs from this employee_database.xlsx")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args))
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
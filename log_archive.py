@@ -0,0 +1,375 @@
+# log_archive.py
+import io
+import os
+import glob
+import json
+import zipfile
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import config
+from report_engine import split_log_rows, time_cells_to_seconds, numeric_cells, export_report
+from history_query import find_month_logs
+from file_watcher import file_signature
+from shared_journal import months_with_pending_entries
+from excel_stream import write_excel
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+NO_TIME = -1 # Empty cell in the int32 time matrices
+ROW_KINDS = ("vao", "ra", "tong") # Block arrays of the 3 LOG_ROW_TYPES, in order
+HISTORY_COLUMNS = ["Tháng", "Ngày", "ID", "Họ tên", "Giờ Vào", "Giờ Ra", "Tổng thời gian"]
+
+
+def month_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+def _time_text(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _cell_key(value):
+    """Comparable text of a log cell: '' when empty, numbers normalized ('1.50' == 1.5)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    text = str(value).strip()
+    try:
+        return f"{float(text):.6g}"
+    except ValueError:
+        return text
+
+
+def _encode_block(base_df, matrices):
+    """
+    One block as column arrays. In/out are int32 seconds and OT is float64; a cell that
+    would not come back verbatim from those (hand-typed '7:05', text in a number row)
+    is also stored as text in the odd_* arrays and wins on restore.
+    """
+    arrays = {
+        "stt": pd.to_numeric(base_df["STT"], errors="coerce").to_numpy(dtype=float),
+        "name": base_df["Họ tên"].fillna("").astype(str).to_numpy(dtype=str),
+        "emp_id": base_df["ID"].astype(str).to_numpy(dtype=str),
+    }
+    odd = []
+    for kind, (name, cells) in enumerate(zip(ROW_KINDS, matrices)):
+        present = ~pd.isna(cells)
+        if name == "tong":
+            values = numeric_cells(cells)
+            arrays[name] = values
+            for row, col in zip(*np.nonzero(present & np.isnan(values))):
+                odd.append((kind, row, col, str(cells[row, col])))
+            continue
+        seconds = time_cells_to_seconds(cells)
+        codes = np.where(np.isnan(seconds), NO_TIME, seconds).astype(np.int32)
+        arrays[name] = codes
+        for row, col in zip(*np.nonzero(present)):
+            if codes[row, col] == NO_TIME or str(cells[row, col]) != _time_text(int(codes[row, col])):
+                odd.append((kind, row, col, str(cells[row, col])))
+    arrays["odd_kind"] = np.array([o[0] for o in odd], dtype=np.int8)
+    arrays["odd_row"] = np.array([o[1] for o in odd], dtype=np.int32)
+    arrays["odd_col"] = np.array([o[2] for o in odd], dtype=np.int16)
+    arrays["odd_text"] = np.array([o[3] for o in odd], dtype=str) if odd else np.array([], dtype="U1")
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays) # The zip member is deflated; no second compression inside
+    return buffer.getvalue()
+
+
+def _decode_cells(data):
+    """(vao, ra, tong) object matrices as they were in the workbook."""
+    matrices = []
+    for name in ROW_KINDS:
+        values = data[name]
+        if name == "tong":
+            cells = values.astype(object)
+            cells[np.isnan(values)] = None
+        else:
+            cells = np.empty(values.shape, dtype=object)
+            for row, col in zip(*np.nonzero(values != NO_TIME)):
+                cells[row, col] = _time_text(int(values[row, col]))
+        matrices.append(cells)
+    for kind, row, col, text in zip(data["odd_kind"], data["odd_row"], data["odd_col"], data["odd_text"]):
+        matrices[kind][row, col] = str(text)
+    return matrices
+
+
+class LogArchive:
+    """
+    Closed month logs in one zip file. Each month is split into blocks of
+    LOG_ARCHIVE_BLOCK_ROWS employees, each block an .npz of column arrays.
+    manifest.json lists the months and maps every employee ID to the
+    (month, block, row) slices holding it, so a per-employee query reads one
+    small block per month instead of whole workbooks.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if not os.path.exists(self.filepath):
+            return {"format": ARCHIVE_FORMAT_VERSION, "months": {}, "index": {}}
+        with zipfile.ZipFile(self.filepath) as zf:
+            manifest = json.loads(zf.read(MANIFEST_NAME).decode("utf-8"))
+        if manifest.get("format") != ARCHIVE_FORMAT_VERSION:
+            raise ValueError(f"Định dạng kho lưu trữ '{self.filepath}' không được hỗ trợ: {manifest.get('format')}")
+        return manifest
+
+    def months(self):
+        return sorted(self.manifest["months"])
+
+    def month_info(self, key):
+        return self.manifest["months"].get(key)
+
+    def add_months(self, entries):
+        """
+        Adds or replaces months. entries: [(key, df_log, source filename, file signature)].
+        The archive is rewritten to a temporary file and swapped in, so a crash leaves
+        the previous archive intact.
+        """
+        replaced = {entry[0] for entry in entries}
+        months = {key: info for key, info in self.manifest["months"].items() if key not in replaced}
+        index = {}
+        for emp_id, slices in self.manifest["index"].items():
+            kept = [s for s in slices if s[0] not in replaced]
+            if kept:
+                index[emp_id] = kept
+        members = {}
+        block_rows = config.LOG_ARCHIVE_BLOCK_ROWS
+        for key, df_log, source, signature in entries:
+            base_df, vao, ra, tong, day_columns = split_log_rows(df_log)
+            emp_ids = base_df["ID"].astype(str).tolist()
+            blocks = 0
+            for block, start in enumerate(range(0, len(base_df), block_rows)):
+                stop = start + block_rows
+                members[f"{key}/b{block:03d}.npz"] = _encode_block(base_df.iloc[start:stop], (vao[start:stop], ra[start:stop], tong[start:stop]))
+                for row, emp_id in enumerate(emp_ids[start:stop]):
+                    index.setdefault(emp_id, []).append([key, block, row])
+                blocks = block + 1
+            months[key] = {"days": len(day_columns), "employees": len(base_df), "blocks": blocks,
+                           "source": source, "signature": signature, "archived_at": datetime.now().isoformat(timespec="seconds")}
+            logger.info(f"Archiving {source} as {key}: {len(base_df)} employee(s) in {blocks} block(s).")
+        for slices in index.values():
+            slices.sort()
+        manifest = {"format": ARCHIVE_FORMAT_VERSION, "months": dict(sorted(months.items())), "index": index}
+
+        tmp_path = self.filepath + ".tmp"
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as out:
+            if os.path.exists(self.filepath):
+                with zipfile.ZipFile(self.filepath) as old:
+                    for info in old.infolist():
+                        if info.filename != MANIFEST_NAME and info.filename.split("/")[0] not in replaced:
+                            out.writestr(info, old.read(info))
+            for name, payload in members.items():
+                out.writestr(name, payload)
+            out.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False))
+        os.replace(tmp_path, self.filepath)
+        self.manifest = manifest
+
+    def _load_block(self, zf, key, block):
+        with zf.open(f"{key}/b{block:03d}.npz") as member:
+            data = np.load(io.BytesIO(member.read()), allow_pickle=False)
+            return {name: data[name] for name in data.files}
+
+    def month_frame(self, key):
+        """Rebuilds the month log in the workbook layout (3 rows per employee, 'Ngày N' columns)."""
+        info = self.manifest["months"][key]
+        day_columns = [f"Ngày {day}" for day in range(1, info["days"] + 1)]
+        stt, names, emp_ids, cells = [], [], [], []
+        with zipfile.ZipFile(self.filepath) as zf:
+            for block in range(info["blocks"]):
+                data = self._load_block(zf, key, block)
+                stt.append(data["stt"])
+                names.append(data["name"])
+                emp_ids.append(data["emp_id"])
+                cells.append(_decode_cells(data))
+        if not cells:
+            return pd.DataFrame(columns=config.LOG_BASE_COLUMNS + day_columns)
+
+        layout = np.empty((3 * sum(len(ids) for ids in emp_ids), len(day_columns)), dtype=object)
+        for kind in range(3): # Giờ Vào, Giờ Ra, Tổng thời gian rows of each employee are consecutive
+            layout[kind::3] = np.concatenate([block_cells[kind] for block_cells in cells])
+        stt = np.repeat(np.concatenate(stt), 3)
+        df_log = pd.DataFrame(layout, columns=day_columns)
+        stt_series = pd.Series(stt)
+        if stt_series.notna().all() and (stt_series % 1 == 0).all():
+            stt_series = stt_series.astype("int64")
+        df_log.insert(0, "STT", stt_series)
+        df_log.insert(1, "Họ tên", np.repeat(np.concatenate(names), 3).astype(object))
+        df_log.insert(2, "ID", np.repeat(np.concatenate(emp_ids), 3).astype(object))
+        return df_log
+
+    def employee_history(self, emp_id, year=None):
+        """Day-by-day in/out/OT of one employee over the archived months (optionally one year)."""
+        slices = [s for s in self.manifest["index"].get(str(emp_id), []) if year is None or s[0].startswith(f"{year:04d}-")]
+        rows = []
+        if not slices:
+            return pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+        with zipfile.ZipFile(self.filepath) as zf:
+            for key, block, row in slices:
+                data = self._load_block(zf, key, block)
+                vao, ra, tong = (matrix[row] for matrix in _decode_cells(data))
+                for day in range(len(vao)):
+                    if vao[day] is not None or ra[day] is not None or tong[day] is not None:
+                        rows.append([key, day + 1, str(data["emp_id"][row]), str(data["name"][row]), vao[day], ra[day], tong[day]])
+        logger.info(f"History of {emp_id}: {len(slices)} month slice(s) read, {len(rows)} day(s).")
+        return pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+
+
+def count_mismatches(df_source, df_restored):
+    """Number of base/day cells that differ between a month log and its restored copy (matched by ID)."""
+    src_base, *src_cells, src_days = split_log_rows(df_source)
+    out_base, *out_cells, out_days = split_log_rows(df_restored)
+    if src_days != out_days or len(src_base) != len(out_base):
+        return max(1, abs(len(src_base) - len(out_base)))
+    order = pd.Index(out_base["ID"].astype(str)).get_indexer(src_base["ID"].astype(str))
+    if (order < 0).any():
+        return int((order < 0).sum())
+    mismatches = int((src_base["Họ tên"].map(_cell_key).to_numpy() != out_base["Họ tên"].map(_cell_key).to_numpy()[order]).sum())
+    keys = np.vectorize(_cell_key, otypes=[object])
+    for src, out in zip(src_cells, out_cells):
+        if src.size:
+            mismatches += int((keys(src) != keys(out[order])).sum())
+    return mismatches
+
+
+def closed_month_logs(log_folder, today=None):
+    """[(year, month, filepath)] of month logs before the current month."""
+    today = today or datetime.now()
+    return [(year, month, filepath) for year, month, filepath in find_month_logs(log_folder)
+            if (year, month) < (today.year, today.month)]
+
+
+def removable_after(year, month):
+    """
+    When a closed month's file may be deleted: an overnight shift of its last day ends
+    on the 1st of the next month at the latest, and its out is still written to this
+    month up to OVERNIGHT_OUT_GRACE_HOURS after that.
+    """
+    next_month = datetime(year + month // 12, month % 12 + 1, 1)
+    return next_month + timedelta(days=1, hours=config.OVERNIGHT_OUT_GRACE_HOURS)
+
+
+def archive_closed_months(log_folder, archive_path, backup_folder=None, remove_sources=False):
+    """
+    Archives every closed month log that is new or changed since it was archived.
+    With remove_sources, each archived month whose file is unchanged and whose
+    restored copy matches it cell for cell is deleted, with its timestamped copies
+    in backup_folder - unless station journals still hold entries for it (shared
+    folder mode) or an overnight out can still be written to it (removable_after).
+    Returns (archived month keys, removed file paths).
+    """
+    archive = LogArchive(archive_path)
+    closed = closed_month_logs(log_folder)
+    frames, entries = {}, []
+    for year, month, filepath in closed:
+        key = month_key(year, month)
+        signature = list(file_signature(filepath))
+        info = archive.month_info(key)
+        if info is not None and info.get("signature") == signature:
+            continue
+        frames[key] = pd.read_excel(filepath, dtype={'ID': str})
+        entries.append((key, frames[key], os.path.basename(filepath), signature))
+    if entries:
+        archive.add_months(entries)
+
+    removed = []
+    if remove_sources:
+        now = datetime.now()
+        pending = {os.path.normcase(os.path.abspath(path)) for path in months_with_pending_entries(log_folder)}
+        for year, month, filepath in closed:
+            key = month_key(year, month)
+            if os.path.normcase(os.path.abspath(filepath)) in pending:
+                logger.warning(f"Station journals still hold entries for {key}; keeping '{filepath}' until they are merged.")
+                continue
+            if now < removable_after(year, month):
+                logger.info(f"{key} closed less than {config.OVERNIGHT_OUT_GRACE_HOURS}h ago (overnight outs); keeping '{filepath}'.")
+                continue
+            info = archive.month_info(key)
+            if info is None or info.get("signature") != list(file_signature(filepath)):
+                continue
+            df_source = frames.get(key)
+            if df_source is None:
+                df_source = pd.read_excel(filepath, dtype={'ID': str})
+            mismatches = count_mismatches(df_source, archive.month_frame(key))
+            if mismatches:
+                logger.error(f"Restored {key} differs from '{filepath}' in {mismatches} cell(s); keeping the file.")
+                continue
+            os.remove(filepath)
+            removed.append(filepath)
+            if backup_folder:
+                stem = os.path.splitext(os.path.basename(filepath))[0]
+                for backup in glob.glob(os.path.join(backup_folder, f"{stem}_*.xlsx")):
+                    os.remove(backup)
+                    removed.append(backup)
+    return [entry[0] for entry in entries], removed
+
+
+def restore_month(archive_path, key, output_path):
+    """Writes an archived month back as a workbook in the original log layout."""
+    df_log = LogArchive(archive_path).month_frame(key)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    write_excel(df_log, output_path, decimals=2)
+    return len(df_log) // len(config.LOG_ROW_TYPES)
+
+
+def main(argv=None):
+    from settings_manager import SettingsManager
+    parser = argparse.ArgumentParser(description="Archive closed OT month logs into one compressed file and query/restore them.")
+    parser.add_argument("--settings", default=config.SETTINGS_FILENAME)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_archive = sub.add_parser("archive", help="Archive month logs before the current month")
+    p_archive.add_argument("--remove", action="store_true", help="Delete archived month files (and their backups) after verifying them")
+    sub.add_parser("list", help="List archived months")
+    p_employee = sub.add_parser("employee", help="Day-by-day history of one employee from the archive")
+    p_employee.add_argument("emp_id")
+    p_employee.add_argument("--year", type=int, default=None)
+    p_employee.add_argument("-o", "--output", default=None, help="Export to .xlsx/.csv instead of printing")
+    p_restore = sub.add_parser("restore", help="Regenerate a month workbook from the archive")
+    p_restore.add_argument("month", help="YYYY-MM")
+    p_restore.add_argument("-o", "--output", default=None, help="Output file (default: the original name in the log folder)")
+    p_restore.add_argument("--force", action="store_true", help="Overwrite an existing file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    settings_manager = SettingsManager(args.settings)
+    log_folder = config.get_log_folder(settings_manager)
+    archive_path = config.get_log_archive_filepath(settings_manager)
+
+    if args.command == "archive":
+        backup_folder = config.get_backup_folder(settings_manager, type="log") if args.remove else None
+        archived, removed = archive_closed_months(log_folder, archive_path, backup_folder, remove_sources=args.remove)
+        print(f"Đã lưu trữ {len(archived)} tháng: {', '.join(archived) or '-'}; đã xóa {len(removed)} file.")
+    elif args.command == "list":
+        archive = LogArchive(archive_path)
+        for key in archive.months():
+            info = archive.month_info(key)
+            print(f"{key}  {info['employees']:5d} NV  {info['source']}  (lưu trữ {info['archived_at']})")
+        if os.path.exists(archive_path):
+            print(f"{len(archive.months())} tháng, {os.path.getsize(archive_path) / 1024:.0f} KB trong '{archive_path}'.")
+    elif args.command == "employee":
+        history = LogArchive(archive_path).employee_history(args.emp_id, args.year)
+        if args.output:
+            export_report(history, args.output)
+        else:
+            print(history.to_string(index=False) if not history.empty else "Không có dữ liệu.")
+    elif args.command == "restore":
+        archive = LogArchive(archive_path)
+        info = archive.month_info(args.month)
+        if info is None:
+            parser.error(f"Tháng {args.month} không có trong kho lưu trữ.")
+        output = args.output or os.path.join(log_folder, info["source"])
+        if os.path.exists(output) and not args.force:
+            parser.error(f"'{output}' đã tồn tại (dùng --force để ghi đè).")
+        count = restore_month(archive_path, args.month, output)
+        print(f"Đã khôi phục {args.month} ({count} nhân viên) vào '{output}'.")
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
@@ -3,35 +3,29 @@ import sys
 import os
 import logging
 import queue
-from datetime import datetime
 from tkinter import messagebox
 
 import config
+import app_logging
 from settings_manager import SettingsManager
 from employee_manager import EmployeeManager
 from ot_log_manager import OTLogManager
 from attendance_manager import AttendanceManager
+from work_scheduler import WorkScheduler
 from hid_handler import HidHandler
 from simulator_hid_handler import SimulatorHidHandler
+from spill_queue import SpillQueue
+from swipe_dedup import SwipeDeduplicator
+from swipe_event_store import SwipeEventStore
 from ui_manager import UIManager
 
 USE_SIMULATOR = False # Set to False to use real HID handler
 
 # --- Logging Setup ---
-log_format = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
-log_level = logging.DEBUG # Change to logging.DEBUG for more details
-# Create a logs directory if it doesn't exist
+log_level = logging.DEBUG # Root level; per-module levels come from config.DEFAULT_LOG_LEVELS and the "log_levels" setting
 log_dir = "app_logs"
-os.makedirs(log_dir, exist_ok=True)
-log_filename = os.path.join(log_dir, f"ot_manager_{datetime.now().strftime('%Y%m%d')}.log")
-
-# Basic console logging
-logging.basicConfig(level=log_level, format=log_format)
-
-# File logging
-file_handler = logging.FileHandler(log_filename, encoding='utf-8')
-file_handler.setFormatter(logging.Formatter(log_format))
-logging.getLogger().addHandler(file_handler) # Add handler to root logger
+# Records go through a queue; formatting and the console/file writes happen on a background thread
+app_logging.setup_logging(log_dir, "ot_manager", log_level)
 
 logger = logging.getLogger(__name__)
 
@@ -39,15 +33,25 @@ logger = logging.getLogger(__name__)
 class Application:
     def __init__(self):
         logger.info("Initializing OT Manager Application...")
-        # self.hid_queue = queue.Queue()
 
         # Initialize Managers
         self.settings_manager = SettingsManager() # Load settings first
         logger.info("Settings Manager initialized.")
+        app_logging.configure_levels(self.settings_manager.get_setting("log_levels"))
+        # Bounded swipe queue shared by the readers and the hidden entry; spills to disk when full
+        self.hid_queue = SpillQueue(
+            config.get_swipe_spill_filepath(self.settings_manager),
+            maxsize=config.SWIPE_QUEUE_MEMORY_SLOTS
+        )
+        self.swipe_input = SwipeDeduplicator(self.hid_queue) # What the readers write to: drops double reads
+        self.event_store = SwipeEventStore(config.get_swipe_store_folder(self.settings_manager))
         self.employee_manager = EmployeeManager(self.settings_manager)
         logger.info("Employee Manager initialized.")
         self.ot_log_manager = OTLogManager(self.settings_manager)
         logger.info("OT Log Manager initialized.")
+        self.work_scheduler = WorkScheduler(self.settings_manager)
+        self.work_scheduler.load() # Per-employee shifts; the general shift applies if there is no schedule file
+        logger.info("Work Scheduler initialized.")
 
         # Initialize UI Manager
         self.ui_manager = UIManager(
@@ -55,7 +59,9 @@ class Application:
             settings_manager=self.settings_manager,
             employee_manager=self.employee_manager,
             ot_log_manager=self.ot_log_manager,
-            #hid_queue=self.hid_queue
+            hid_queue=self.hid_queue,
+            work_scheduler=self.work_scheduler,
+            swipe_input=self.swipe_input
         )
         logger.info("UI Manager initialized.")
 
@@ -64,7 +70,9 @@ class Application:
             settings_manager=self.settings_manager,
             employee_manager=self.employee_manager,
             ot_log_manager=self.ot_log_manager,
-            ui_update_callback=self.ui_manager.update_display
+            ui_update_callback=self.ui_manager.update_display,
+            event_store=self.event_store,
+            work_scheduler=self.work_scheduler
         )
         self.ui_manager.attendance_manager = self.attendance_manager
         logger.info("Attendance Manager initialized.")
@@ -73,7 +81,7 @@ class Application:
         '''
         self.hid_handler = None
         if USE_SIMULATOR:
-            self.hid_handler = SimulatorHidHandler(self.hid_queue)
+            self.hid_handler = SimulatorHidHandler(self.swipe_input)
             logger.info(">>> Using HID Simulator <<<")
             self.ui_manager.after(100, lambda: self.ui_manager.update_hid_status("SIMULATOR MODE ACTIVE"))
         else:
@@ -87,7 +95,7 @@ class Application:
                     logger.info(f"Attempting to use VID=0x{vid:04X}, PID=0x{pid:04X} from settings.")
 
                     # --- Pass VID/PID to HidHandler ---
-                    self.hid_handler = HidHandler(self.hid_queue, vid, pid)
+                    self.hid_handler = HidHandler(self.swipe_input, vid, pid)
 
                     # logger.info("HID Handler (pywinusb) initialized.") # Already logged in HidHandler init
                     self.ui_manager.update_hid_status("Tìm kiếm thiết bị...")
@@ -111,6 +119,13 @@ class Application:
         if messagebox.askokcancel("Thoát", "Bạn có chắc chắn muốn thoát OT Manager?"):
 
             logger.warning("Forcing Exit")
+            self.employee_manager.stop_watching()
+            self.ui_manager.month_rollover.shutdown() # May still be writing next month's log
+            self.ot_log_manager.close_shared()
+            self.hid_queue.close() # Flushes and releases the spill file
+            self.event_store.close()
+            logger.info(f"Swipe queue stats at shutdown: {self.hid_queue.stats()}")
+            logger.info(f"Swipe dedup stats at shutdown: {self.swipe_input.stats()}")
             sys.exit(0)
             '''
             try:
@@ -155,6 +170,7 @@ class Application:
              self.ui_manager.update_hid_status("Lỗi - Không thể đọc thẻ")
             '''
 
+        self.employee_manager.start_watching() # Picks up edits HR makes to the database file in Excel
         self.ui_manager.run() # Starts the Tkinter main loop
 
 
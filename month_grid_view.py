@@ -0,0 +1,197 @@
+# month_grid_view.py
+import os
+import logging
+from collections import OrderedDict
+
+import customtkinter as ctk
+import numpy as np
+import pandas as pd
+
+import config
+from history_query import find_month_logs
+from report_engine import get_day_columns, numeric_cells
+from virtual_table import VirtualTable
+
+logger = logging.getLogger(__name__)
+
+TOTAL_ROW_COLORS = ("#e8f0fa", "#2f3b4a") # (light, dark) background of 'Tổng thời gian' rows
+OVER_THRESHOLD_COLORS = ("#f5b971", "#8a5a1e") # Days with OT above the threshold
+
+
+class MonthLogCache:
+    """Small LRU of read-only month logs, reloaded when the file's mtime/size changes."""
+
+    def __init__(self, maxsize=config.MONTH_VIEW_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict() # filepath -> ((mtime_ns, size), df)
+
+    def get(self, filepath):
+        stat = os.stat(filepath)
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(filepath)
+        if entry is not None and entry[0] == key:
+            self._entries.move_to_end(filepath)
+            return entry[1]
+        logger.info(f"Loading month log for viewing: {filepath}")
+        df = pd.read_excel(filepath, dtype={'ID': str})
+        df['ID'] = df['ID'].astype(str)
+        self._entries[filepath] = (key, df)
+        self._entries.move_to_end(filepath)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return df
+
+
+class MonthGridWindow(ctk.CTkToplevel):
+    """
+    Read-only month grid (employees x 'Ngày N', three sub-rows each) over the OT log.
+    The month being written is shown straight from OTLogManager.df_log, so Excel never
+    has to open the file; only rows written since the last poll are redrawn. Other
+    months come from MonthLogCache.
+    """
+    def __init__(self, master, ot_log_manager, settings_manager, threshold_hours=config.REPORT_OT_THRESHOLD_HOURS):
+        super().__init__(master)
+        self.ot_log_manager = ot_log_manager
+        self.settings_manager = settings_manager
+        self.threshold_hours = threshold_hours
+        self.cache = MonthLogCache()
+
+        self._months = {} # label -> filepath
+        self._path = None
+        self._live = False
+        self._df = None
+        self._row_type = np.empty(0, dtype=int)
+        self._day_columns = set()
+        self._seen_version = -1
+        self._poll_job = None
+
+        self.title("Xem Log OT Tháng")
+        self.geometry("1100x600")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        top = ctk.CTkFrame(self, fg_color="transparent")
+        top.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
+        top.grid_columnconfigure(2, weight=1)
+        ctk.CTkLabel(top, text="Tháng:").grid(row=0, column=0, padx=(0, 5))
+        self.month_menu = ctk.CTkOptionMenu(top, values=["--"], command=self._on_month_selected, width=170)
+        self.month_menu.grid(row=0, column=1, padx=5)
+        self.summary_label = ctk.CTkLabel(top, text="", anchor="w")
+        self.summary_label.grid(row=0, column=2, padx=10, sticky="ew")
+
+        column_widths = {"STT": 50, "Họ tên": 180, "ID": 90}
+        column_widths.update({f"Ngày {day}": 72 for day in range(1, 32)})
+        self.table = VirtualTable(self, column_widths=column_widths, cell_style=self._cell_style, sortable=False)
+        self.table.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="nsew")
+
+        self._refresh_month_list()
+        self._show_month(self._label_for(self.ot_log_manager.current_log_filepath))
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self._poll_job = self.after(config.MONTH_VIEW_REFRESH_MS, self._poll)
+
+    # --- Month selection ---
+    def _label_for(self, filepath):
+        for label, path in self._months.items():
+            if path == filepath:
+                return label
+        return None
+
+    def _refresh_month_list(self):
+        current = self.ot_log_manager.current_log_filepath
+        months = {}
+        for year, month, filepath in reversed(find_month_logs(config.get_log_folder(self.settings_manager))):
+            months[f"{month:02d}/{year}"] = filepath
+        if current and current not in months.values():
+            months[os.path.splitext(os.path.basename(current))[0]] = current
+        self._months = {(f"{label} (đang ghi)" if path == current else label): path for label, path in months.items()}
+        self.month_menu.configure(values=list(self._months) or ["--"])
+
+    def _on_month_selected(self, label):
+        self._show_month(label)
+
+    def _show_month(self, label):
+        filepath = self._months.get(label)
+        if filepath is None:
+            return
+        self.month_menu.set(label)
+        self._path = filepath
+        self._live = filepath == self.ot_log_manager.current_log_filepath
+        if self._live:
+            df = self.ot_log_manager.df_log
+            self._seen_version = self.ot_log_manager.change_version
+        else:
+            try:
+                df = self.cache.get(filepath)
+            except Exception as e:
+                logger.error(f"Cannot load month log '{filepath}' for viewing: {e}")
+                self.summary_label.configure(text=f"Không thể đọc file: {e}")
+                return
+        self._set_frame(df, keep_position=False)
+
+    def _set_frame(self, df, keep_position):
+        self._df = df
+        if df is None or df.empty:
+            self._row_type = np.empty(0, dtype=int)
+            columns = config.LOG_BASE_COLUMNS
+        else:
+            ids = df['ID'].astype(str)
+            self._row_type = ids.groupby(ids.to_numpy(), sort=False).cumcount().to_numpy()
+            columns = config.LOG_BASE_COLUMNS + get_day_columns(df)
+        self._day_columns = set(columns[len(config.LOG_BASE_COLUMNS):])
+        self.table.set_data(df, columns=columns, keep_position=keep_position)
+        employees = int((self._row_type == 0).sum())
+        state = "đang ghi, tự cập nhật" if self._live else "chỉ xem"
+        self.summary_label.configure(text=f"{employees} nhân viên | Tô màu: OT > {self.threshold_hours:g}h/ngày | {state}")
+
+    # --- Styling ---
+    def _cell_style(self, positions, columns, values):
+        mode = 1 if ctk.get_appearance_mode() == "Dark" else 0
+        fills = np.full(values.shape, None, dtype=object)
+        total_rows = self._row_type[positions] == config.LOG_ROW_TYPES.index("Tổng thời gian")
+        fills[total_rows, :] = TOTAL_ROW_COLORS[mode]
+        day_idx = [i for i, column in enumerate(columns) if column in self._day_columns]
+        if day_idx and total_rows.any():
+            over = total_rows[:, None] & (numeric_cells(values[:, day_idx]) > self.threshold_hours)
+            block = fills[:, day_idx]
+            block[over] = OVER_THRESHOLD_COLORS[mode]
+            fills[:, day_idx] = block
+        return fills
+
+    # --- Live updates ---
+    def _poll(self):
+        self._poll_job = None
+        try:
+            if self._live:
+                self._poll_live()
+        except Exception as e:
+            logger.error(f"Month grid refresh failed: {e}", exc_info=True)
+        if self.winfo_exists():
+            self._poll_job = self.after(config.MONTH_VIEW_REFRESH_MS, self._poll)
+
+    def _poll_live(self):
+        manager = self.ot_log_manager
+        if manager.current_log_filepath != self._path:
+            # The engine moved on to another month: list it and follow it
+            self._refresh_month_list()
+            self._show_month(self._label_for(manager.current_log_filepath))
+            return
+        if manager.df_log is not self._df:
+            # Rows were added (new employee) or the log was reloaded
+            self._seen_version = manager.change_version
+            self._set_frame(manager.df_log, keep_position=True)
+            return
+        if manager.change_version == self._seen_version:
+            return
+        changed = manager.changed_rows_since(self._seen_version)
+        self._seen_version = manager.change_version
+        if changed is None:
+            self.table.refresh()
+        elif changed:
+            positions = self._df.index.get_indexer(list(changed))
+            self.table.refresh_positions(positions[positions >= 0])
+
+    def _on_close(self):
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
+        self.destroy()
@@ -0,0 +1,73 @@
+# month_rollover.py
+import calendar
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def first_day_of_next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def is_last_day_of_month(day):
+    return day.day == calendar.monthrange(day.year, day.month)[1]
+
+
+class MonthRollover:
+    """
+    Gets next month's log ready before it is needed. From MONTH_ROLLOVER_PREPARE_HOUR
+    on the last day of a month, a worker thread creates (or reads) next month's file
+    with the rows of every known employee; the result is kept in memory by the log
+    manager. At midnight tick() switches the active log to it, so neither the switch
+    nor the first swipe of the month reads or creates a file.
+    Call tick() periodically from the thread that processes swipes.
+    """
+    def __init__(self, employee_manager, ot_log_manager):
+        self.employee_manager = employee_manager
+        self.ot_log_manager = ot_log_manager
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="month-rollover")
+        self._future = None
+        self._prepared_month = None # First day of the month already prepared (or being prepared)
+
+    def is_running(self):
+        return self._future is not None and not self._future.done()
+
+    def tick(self, now=None):
+        """Starts preparing, keeps the finished log and switches months. Returns a status message or None."""
+        now = now or datetime.now()
+        message = None
+        if self._future is not None and self._future.done():
+            future, self._future = self._future, None
+            try:
+                filepath, df_log = future.result()
+                self.ot_log_manager.keep_standby_log(filepath, df_log)
+                message = f"Đã chuẩn bị sẵn log OT tháng {self._prepared_month.strftime('%m/%Y')}"
+            except Exception as e:
+                logger.error(f"Error preparing next month's OT log: {e}", exc_info=True)
+                self._prepared_month = None # Try again on the next tick
+
+        next_month = first_day_of_next_month(now.date())
+        if (is_last_day_of_month(now.date()) and now.hour >= config.MONTH_ROLLOVER_PREPARE_HOUR
+                and self._prepared_month != next_month and not self.is_running()):
+            self.start(next_month)
+
+        current_filepath = self.ot_log_manager._get_log_filepath(now)
+        if (current_filepath != self.ot_log_manager.current_log_filepath
+                and self.ot_log_manager.has_standby_log(current_filepath)):
+            self.ot_log_manager._load_log_file(current_filepath) # Taken from memory, no file read
+            message = f"Đã chuyển sang log OT tháng {now.strftime('%m/%Y')}"
+        return message
+
+    def start(self, month_start):
+        """Prepares the log of month_start's month on the worker thread."""
+        employees = list(self.employee_manager.directory.by_id.values()) # Snapshot on this thread
+        logger.info(f"Preparing OT log of {month_start.strftime('%m/%Y')} in background ({len(employees)} employee(s)).")
+        self._prepared_month = month_start
+        self._future = self._executor.submit(self.ot_log_manager.prepare_month_log, month_start, employees)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
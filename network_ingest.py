@@ -0,0 +1,349 @@
+# network_ingest.py
+import asyncio
+import json
+import argparse
+import logging
+import queue
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config
+from event_sinks import build_sink
+
+logger = logging.getLogger(__name__)
+
+# --- Wire protocol ---
+# TCP: one JSON object per line, e.g.
+#   {"seq": 17, "station": "GATE-03", "card_id": "1002003001", "ts": "2025-05-02T07:51:12.120"}
+# The server answers every line with {"seq": 17, "ok": true} once the swipe has been processed,
+# or {"seq": 17, "ok": false, "error": "..."}.
+# UDP: the same JSON object as a single datagram. UDP has no flow control, so datagrams are
+# dropped (and answered with ok=false, error="busy") when the central queue is full.
+
+DEFAULT_PORT = 9630
+DEFAULT_MAX_INFLIGHT_PER_CONNECTION = 32
+DEFAULT_CENTRAL_QUEUE_SIZE = 1000
+MAX_LINE_BYTES = 4096
+
+
+def parse_swipe_message(raw):
+    """Parses one swipe message. Returns (seq, station_id, card_id, captured_at) or raises ValueError."""
+    try:
+        msg = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}")
+    if not isinstance(msg, dict):
+        raise ValueError("message must be a JSON object")
+    seq = msg.get("seq")
+    card_id = str(msg.get("card_id") or "").strip()
+    if not card_id:
+        raise ValueError("missing card_id")
+    station_id = str(msg.get("station") or "unknown")
+    ts = msg.get("ts")
+    if ts is None:
+        captured_at = datetime.now()
+    elif isinstance(ts, (int, float)):
+        captured_at = datetime.fromtimestamp(ts)
+    else:
+        try:
+            captured_at = datetime.fromisoformat(str(ts))
+        except ValueError:
+            raise ValueError(f"invalid ts '{ts}'")
+        if captured_at.tzinfo is not None:
+            captured_at = captured_at.astimezone().replace(tzinfo=None) # Engine works in local naive time
+    return seq, station_id, card_id, captured_at
+
+
+class IngestionStats:
+    def __init__(self):
+        self.connections = 0
+        self.received = 0
+        self.processed = 0
+        self.rejected = 0
+        self.dropped_udp = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.server._on_datagram(data, addr, self.transport)
+
+
+class IngestionServer:
+    """
+    Accepts swipe messages from remote stations over TCP/UDP and feeds them into one
+    central AttendanceManager.
+
+    All swipes go through a single bounded queue and are processed one at a time on a
+    dedicated worker thread (the managers are not thread safe and save to Excel
+    synchronously). Each TCP connection may have at most max_inflight unprocessed swipes;
+    beyond that the server stops reading from the socket, so a fast station is slowed
+    down by TCP flow control instead of growing memory.
+    """
+    def __init__(self, attendance_manager, host="0.0.0.0", port=DEFAULT_PORT, udp_port=None,
+                 max_inflight=DEFAULT_MAX_INFLIGHT_PER_CONNECTION, queue_size=DEFAULT_CENTRAL_QUEUE_SIZE,
+                 local_queue=None):
+        self.attendance_manager = attendance_manager
+        self.host = host
+        self.port = port
+        self.udp_port = udp_port
+        self.max_inflight = max_inflight
+        self.queue_size = queue_size
+        self.local_queue = local_queue # Optional queue.Queue fed by a local card reader
+        self.stats = IngestionStats()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="attendance")
+        self._queue = None
+        self._tcp_server = None
+        self._udp_transport = None
+        self._tasks = []
+        self._stopping = None
+
+    # --- Processing ---
+    def _process(self, station_id, card_id, captured_at):
+        """Runs on the worker thread."""
+        logger.info(f"Swipe from station {station_id}: card {card_id} captured at {captured_at}")
+        self.attendance_manager.process_swipe(card_id, swipe_time=captured_at, source=station_id)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            station_id, card_id, captured_at, done = await self._queue.get()
+            error = None
+            try:
+                await loop.run_in_executor(self._executor, self._process, station_id, card_id, captured_at)
+                self.stats.processed += 1
+            except Exception as e:
+                logger.error(f"Error processing swipe {card_id} from {station_id}: {e}", exc_info=True)
+                error = str(e)
+            finally:
+                self._queue.task_done()
+            if done is not None and not done.done():
+                done.set_result(error)
+
+    async def _drain_local_queue(self):
+        """Bridges a thread-fed local reader queue (HidHandler etc.) into the central queue."""
+        while True:
+            try:
+                event = await asyncio.to_thread(self.local_queue.get, True, 0.5)
+            except queue.Empty:
+                continue
+            self.stats.received += 1
+            await self._queue.put((event.source or "local", event.card_id, event.captured_at, None))
+
+    # --- TCP ---
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        self.stats.connections += 1
+        logger.info(f"Station connected from {peer}")
+        inflight = asyncio.Semaphore(self.max_inflight)
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def reply(payload):
+            async with write_lock:
+                writer.write((json.dumps(payload) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        async def wait_and_ack(seq, done):
+            try:
+                error = await done
+                await reply({"seq": seq, "ok": error is None, **({"error": error} if error else {})})
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+            finally:
+                inflight.release()
+
+        try:
+            while True:
+                await inflight.acquire() # Backpressure: stop reading while too many swipes are in flight
+                try:
+                    line = await reader.readline()
+                except ValueError: # Past the stream limit: readline drops the buffer, the framing is lost
+                    inflight.release()
+                    self.stats.received += 1
+                    self.stats.rejected += 1
+                    logger.warning(f"Connection from {peer} sent an oversized line. Closing.")
+                    await reply({"seq": None, "ok": False, "error": "message too long"})
+                    break
+                if not line:
+                    inflight.release()
+                    break
+                if len(line) > MAX_LINE_BYTES:
+                    inflight.release()
+                    self.stats.received += 1
+                    self.stats.rejected += 1
+                    await reply({"seq": None, "ok": False, "error": "message too long"})
+                    continue
+                self.stats.received += 1
+                try:
+                    seq, station_id, card_id, captured_at = parse_swipe_message(line)
+                except ValueError as e:
+                    self.stats.rejected += 1
+                    inflight.release()
+                    logger.warning(f"Rejected message from {peer}: {e}")
+                    await reply({"seq": None, "ok": False, "error": str(e)})
+                    continue
+                done = asyncio.get_running_loop().create_future()
+                await self._queue.put((station_id, card_id, captured_at, done))
+                task = asyncio.create_task(wait_and_ack(seq, done))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Connection from {peer} lost: {e}")
+        finally:
+            for task in pending:
+                task.cancel()
+            self.stats.connections -= 1
+            writer.close()
+            logger.info(f"Station disconnected: {peer}")
+
+    # --- UDP ---
+    def _on_datagram(self, data, addr, transport):
+        self.stats.received += 1
+        try:
+            seq, station_id, card_id, captured_at = parse_swipe_message(data)
+        except ValueError as e:
+            self.stats.rejected += 1
+            transport.sendto(json.dumps({"seq": None, "ok": False, "error": str(e)}).encode("utf-8"), addr)
+            return
+        try:
+            self._queue.put_nowait((station_id, card_id, captured_at, None))
+        except asyncio.QueueFull:
+            self.stats.dropped_udp += 1
+            logger.warning(f"Central queue full. Dropped UDP swipe {card_id} from {station_id}.")
+            transport.sendto(json.dumps({"seq": seq, "ok": False, "error": "busy"}).encode("utf-8"), addr)
+            return
+        transport.sendto(json.dumps({"seq": seq, "ok": True}).encode("utf-8"), addr)
+
+    # --- Lifecycle ---
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._worker()))
+        if self.local_queue is not None:
+            self._tasks.append(asyncio.create_task(self._drain_local_queue()))
+        self._tcp_server = await asyncio.start_server(self._handle_connection, self.host, self.port, limit=MAX_LINE_BYTES * 2)
+        self.port = self._tcp_server.sockets[0].getsockname()[1] # Resolve port 0 for tests
+        logger.info(f"Ingestion server listening on TCP {self.host}:{self.port}")
+        if self.udp_port is not None:
+            loop = asyncio.get_running_loop()
+            self._udp_transport, _ = await loop.create_datagram_endpoint(
+                lambda: _UdpProtocol(self), local_addr=(self.host, self.udp_port))
+            self.udp_port = self._udp_transport.get_extra_info("sockname")[1]
+            logger.info(f"Ingestion server listening on UDP {self.host}:{self.udp_port}")
+
+    async def serve_forever(self):
+        await self.start()
+        last_report = time.monotonic()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            if time.monotonic() - last_report >= 60:
+                logger.info(f"Ingestion stats: {self.stats.as_dict()} queue={self._queue.qsize()}")
+                last_report = time.monotonic()
+        await self.close()
+
+    async def run_on_engine(self, func):
+        """Runs func on the thread that processes swipes, so it never races a swipe."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func)
+
+    def request_stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def close(self):
+        if self._tcp_server:
+            self._tcp_server.close()
+            await self._tcp_server.wait_closed()
+        if self._udp_transport:
+            self._udp_transport.close()
+        # Let queued swipes finish before stopping the worker
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=30)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._queue.qsize()} swipe(s) still queued at shutdown.")
+        for task in self._tasks:
+            task.cancel()
+        self._executor.shutdown(wait=True)
+        logger.info(f"Ingestion server stopped. Stats: {self.stats.as_dict()}")
+
+
+def parse_args(argv=None):
+    from headless_service import READER_CHOICES
+    parser = argparse.ArgumentParser(description="Central swipe ingestion server for remote stations.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--udp-port", type=int, default=None, help="Also accept swipes over UDP on this port")
+    parser.add_argument("--max-inflight", type=int, default=DEFAULT_MAX_INFLIGHT_PER_CONNECTION,
+                        help="Unprocessed swipes allowed per TCP connection before reading pauses")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_CENTRAL_QUEUE_SIZE)
+    parser.add_argument("--reader", choices=READER_CHOICES, default="none",
+                        help="Also read a local card reader on this machine (default: none)")
+    parser.add_argument("--sink", action="append", default=[], help="Event sink (see headless_service.py)")
+    parser.add_argument("--settings", default=config.SETTINGS_FILENAME)
+    parser.add_argument("--log-dir", default="app_logs")
+    parser.add_argument("--debug", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from headless_service import HeadlessApplication, setup_logging
+    args = parse_args(argv)
+    setup_logging(args.log_dir, logging.DEBUG if args.debug else logging.INFO)
+
+    app = HeadlessApplication(build_sink(args.sink), reader=args.reader, settings_file=args.settings)
+    server = IngestionServer(
+        app.attendance_manager, host=args.host, port=args.port, udp_port=args.udp_port,
+        max_inflight=args.max_inflight, queue_size=args.queue_size,
+        local_queue=app.swipe_queue if app.reader else None,
+    )
+
+    async def runner():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, server.request_stop)
+            except NotImplementedError: # Windows event loops
+                pass
+        app.start()
+
+        async def upkeep():
+            # Shared sync, month rollover, database edits - the headless loop's upkeep
+            while True:
+                try:
+                    await server.run_on_engine(app.upkeep)
+                except RuntimeError: # Engine thread shut down by server.close()
+                    return
+                await asyncio.sleep(0.5)
+
+        upkeep_task = asyncio.create_task(upkeep())
+        try:
+            await server.serve_forever()
+        finally:
+            upkeep_task.cancel()
+            app.shutdown()
+
+    try:
+        asyncio.run(runner())
+    except KeyboardInterrupt:
+        logger.info("Interrupted.")
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,13 @@ import os
 import shutil
 from datetime import datetime, timedelta
 import calendar # <-- Add this import if missing
+from contextlib import contextmanager
+from collections import deque
 import config
 import logging
+from shared_journal import SharedLogSync, journal_folder, read_offsets, employee_row_index
+from file_watcher import file_signature
+from excel_stream import write_excel
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +19,22 @@ class OTLogManager:
         self.settings_manager = settings_manager
         self.current_log_filepath = None # Initialize
         self.df_log = None
+        self._row_index = {} # emp_id -> index label of the employee's 'Giờ Vào' row in df_log
+        self._dirty = False # df_log has changes not yet written to disk
+        self._defer_saves = False # Batch mode: write_log_entry does not save after each entry
+        # Change tracking for live views: every cell write bumps change_version and
+        # records the row; loads/bulk edits move _full_change_version (redraw everything)
+        self.change_version = 0
+        self._full_change_version = 0
+        self._recent_changes = deque(maxlen=config.LOG_CHANGE_HISTORY_SIZE)
+        # Month logs kept ready in memory (next month prepared by MonthRollover, the month
+        # just left): filepath -> (df_log, file signature when kept)
+        self._standby_logs = {}
+        # Shared folder mode: several stations on one log folder write through journals
+        self.shared = None
+        if config.is_shared_log_mode(settings_manager):
+            self.shared = SharedLogSync(self, config.get_station_id(settings_manager))
+            logger.info(f"Shared log folder mode, station '{self.shared.station_id}'.")
         # Determine and load the initial log file path correctly for the current date
         initial_log_path = self._get_log_filepath(datetime.now()) # Calculate path first
         self._load_log_file(initial_log_path) # Load using the specific path
@@ -31,9 +52,48 @@ class OTLogManager:
             logger.debug(f"Log file already loaded: {filepath}")
             return self.df_log # Already loaded
 
+        df_log = self._take_standby_log(filepath)
+        if df_log is not None:
+            logger.info(f"Switching to OT log kept in memory: {filepath}")
+            self.swap_in_log(filepath, df_log)
+            return self.df_log
+
         logger.info(f"Attempting to load OT log file: {filepath}")
-        self.current_log_filepath = filepath # Set the current path being managed
+        df_log, created = self._read_log_file(filepath)
+        self.swap_in_log(filepath, df_log, created)
+        return self.df_log
+
+    def keep_standby_log(self, filepath, df_log):
+        """
+        Keeps a month log in memory so a later switch to it reads nothing. It is only
+        used while the file on disk is unchanged (same mtime and size).
+        """
+        self._standby_logs.pop(filepath, None)
+        self._standby_logs[filepath] = (df_log, file_signature(filepath))
+        while len(self._standby_logs) > config.LOG_STANDBY_MONTHS:
+            dropped = next(iter(self._standby_logs))
+            del self._standby_logs[dropped]
+            logger.debug(f"Dropped standby OT log {dropped}")
+
+    def has_standby_log(self, filepath):
+        return filepath in self._standby_logs
+
+    def _take_standby_log(self, filepath):
+        entry = self._standby_logs.pop(filepath, None)
+        if entry is None:
+            return None
+        df_log, signature = entry
+        if signature != file_signature(filepath):
+            logger.info(f"Standby OT log '{filepath}' changed on disk; reading it again.")
+            return None
+        return df_log
 
+    def _read_log_file(self, filepath):
+        """
+        Reads (or creates the empty structure of) a month log without touching the
+        loaded log, so it can run on a background thread.
+        Returns (df, created) - created is True if the file did not exist yet - or (None, False).
+        """
         # --- Determine target_date from filepath for creating/checking columns ---
         target_date = None
         try:
@@ -41,45 +101,75 @@ class OTLogManager:
             target_date = datetime.strptime(filename_part, config.LOG_FILENAME_DATE_FORMAT)
         except ValueError:
              logger.error(f"Could not parse date from log filename '{filepath}'. Cannot create/verify structure accurately.")
-             # Set df_log to None or empty to indicate failure?
-             self.df_log = None
-             return None # Indicate failure to load
+             return None, False # Indicate failure to load
 
+        created = False
         try:
+            # Shared mode: offsets of the journal entries already merged, read before the
+            # workbook - a merge in between then only makes some entries apply twice
+            journal_offsets = read_offsets(journal_folder(filepath)) if self.shared is not None else None
             if not os.path.exists(filepath):
                 logger.warning(f"Log file '{filepath}' not found. Creating new log sheet.")
-                self.df_log = self._create_new_log_sheet(target_date)
-                self.save_log() # Save the newly created structure
+                df_log = self._create_new_log_sheet(target_date)
+                created = True
             else:
                 logger.info(f"Loading existing log file: {filepath}")
                 # Specify dtype for ID to avoid issues
-                self.df_log = pd.read_excel(filepath, dtype={'ID': str})
+                df_log = pd.read_excel(filepath, dtype={'ID': str})
                 # Ensure base columns exist
                 for col in config.LOG_BASE_COLUMNS:
-                     if col not in self.df_log.columns:
+                     if col not in df_log.columns:
                          logger.warning(f"Column '{col}' missing in log file '{filepath}'. Adding.")
-                         self.df_log[col] = None
-                self.df_log['ID'] = self.df_log['ID'].astype(str)
+                         df_log[col] = None
+                df_log['ID'] = df_log['ID'].astype(str)
 
             # Ensure all day columns exist for the month (using parsed target_date)
-            if target_date and self.df_log is not None:
+            if target_date and df_log is not None:
                 _, num_days = calendar.monthrange(target_date.year, target_date.month)
                 for day in range(1, num_days + 1):
                     col_name = f"Ngày {day}"
-                    if col_name not in self.df_log.columns:
-                        self.df_log[col_name] = None # Add missing day columns
+                    if col_name not in df_log.columns:
+                        df_log[col_name] = None # Add missing day columns
+                # Day cells hold both 'HH:MM:SS' strings and OT hours; a column read back
+                # empty is float64, which newer pandas refuses to store a string into
+                day_columns = [f"Ngày {day}" for day in range(1, num_days + 1)]
+                df_log[day_columns] = df_log[day_columns].astype(object)
+            if journal_offsets is not None:
+                df_log.attrs['journal_offsets'] = journal_offsets
 
             logger.info(f"Successfully loaded/created OT log file: {filepath}")
-            return self.df_log
+            return df_log, created
 
         except Exception as e:
             logger.error(f"Error loading/creating OT log file '{filepath}': {e}", exc_info=True)
-            # Return an empty DataFrame or handle error appropriately
-            self.df_log = None # Indicate failure
-            # Optionally create an empty structure on error?
-            # if target_date:
-            #    self.df_log = self._create_new_log_sheet(target_date)
-            return None
+            return None, False
+
+    def swap_in_log(self, filepath, df_log, created=False):
+        """
+        Makes a log read by _read_log_file (e.g. on a background thread) the loaded
+        log, saving unsaved entries of the previous one first. Call from the thread
+        that processes swipes.
+        """
+        if self._dirty and self.df_log is not None:
+            self.save_log() # Never drop unsaved entries of the month being switched away from
+        if self.df_log is not None and not self._dirty and self.current_log_filepath not in (None, filepath):
+            # e.g. the month just left at midnight: an overnight shift's out may still go there
+            self.keep_standby_log(self.current_log_filepath, self.df_log)
+        if self.shared is not None and df_log is not None:
+            # Add this month's entries the workbook does not hold yet
+            df_log, _, _ = self.shared.on_log_loaded(filepath, df_log)
+        self.current_log_filepath = filepath # Set the current path being managed
+        self.df_log = df_log
+        self._row_index = employee_row_index(df_log) if df_log is not None else {}
+        self._dirty = False
+        self.mark_changed()
+        if self.shared is not None and df_log is not None:
+            try:
+                self.shared.merge_pending(os.path.dirname(filepath)) # e.g. the month just left
+            except Exception as e:
+                logger.error(f"Error merging pending station journals: {e}", exc_info=True)
+        if created and df_log is not None:
+            self.save_log() # Save the newly created structure
 
     def _create_new_log_sheet(self, target_date):
         year, month = target_date.year, target_date.month
@@ -95,41 +185,45 @@ class OTLogManager:
         if self.df_log is None or self.current_log_filepath is None:
             logger.error("No log data or filepath to save.")
             return
+        if self.shared is not None:
+            # Entries are already on disk in this station's journal; the workbook is
+            # only rewritten by a merge, under the lease
+            self._dirty = False
+            try:
+                self.shared.merge_if_due(self.current_log_filepath)
+            except Exception as e:
+                logger.error(f"Error merging station journals into '{self.current_log_filepath}': {e}", exc_info=True)
+            return
         try:
             # Ensure directory exists
             log_folder = os.path.dirname(self.current_log_filepath)
             os.makedirs(log_folder, exist_ok=True)
 
-            # --- Add float_format parameter ---
-            self.df_log.to_excel(
-                self.current_log_filepath,
-                index=False,
-                float_format="%.2f"  # Format floats to 2 decimal places when writing
-            )
-            # --- End modification ---
+            write_excel(self.df_log, self.current_log_filepath, decimals=2) # OT hours with 2 decimal places
 
+            self._dirty = False
             logger.info(f"OT log saved to '{self.current_log_filepath}'")
         except Exception as e:
             logger.error(f"Error saving OT log '{self.current_log_filepath}': {e}", exc_info=True)
             # Notify UI
 
     def _ensure_employee_rows_exist(self, employee_info):
-        emp_id = str(employee_info['ID'])
+        emp_id = employee_info.emp_id
         if self.df_log is None:
             logger.error("Log DataFrame not loaded.")
             return -1 # Indicate error
 
         # Check if employee ID exists in the log
-        existing_rows = self.df_log[self.df_log['ID'] == emp_id]
+        base_row_index = self._row_index.get(emp_id)
 
-        if existing_rows.empty:
+        if base_row_index is None:
             # Add 3 new rows for the employee
             next_stt = self.df_log['STT'].max() + 1 if 'STT' in self.df_log.columns and not self.df_log.empty else 1
             new_rows_data = []
             for row_type in config.LOG_ROW_TYPES:
                  new_row = {
                      'STT': next_stt,
-                     'Họ tên': employee_info['Họ tên'],
+                     'Họ tên': employee_info.name,
                      'ID': emp_id,
                      # Initialize day columns potentially?
                  }
@@ -141,29 +235,23 @@ class OTLogManager:
             # Important: Define columns explicitly to match self.df_log
             new_rows_df = pd.DataFrame(new_rows_data, columns=self.df_log.columns)
 
-            # Concatenate
+            # Concatenate; the new rows are the last ones (ignore_index numbers them in order)
+            base_row_index = len(self.df_log)
             self.df_log = pd.concat([self.df_log, new_rows_df], ignore_index=True)
+            self._row_index[emp_id] = base_row_index
             logger.info(f"Added log entry structure for employee ID: {emp_id}")
-            # Find the index of the first new row (Giờ Vào)
-            # Re-query after concat might be safer
-            existing_rows = self.df_log[self.df_log['ID'] == emp_id]
-            if not existing_rows.empty:
-                 return existing_rows.index[0] # Return index of the 'Giờ Vào' row
-            else:
-                 logger.error(f"Failed to find rows immediately after adding for employee ID: {emp_id}")
-                 return -1 # Error
-        else:
-            # Return the index of the first row ('Giờ Vào') for this employee
-            return existing_rows.index[0]
+        # Return the index of the first row ('Giờ Vào') for this employee
+        return base_row_index
 
-    def write_log_entry(self, employee_info, entry_datetime, entry_type, value):
-        target_date = entry_datetime.date()
-        required_log_filepath = self._get_log_filepath(entry_datetime) # Get the path needed
+    def write_log_entry(self, employee_info, entry_datetime, entry_type, value, work_date=None):
+        """work_date: the day column to write (default: the date of entry_datetime). An overnight shift's out goes in its start day."""
+        target_date = work_date or entry_datetime.date()
+        required_log_filepath = self._get_log_filepath(target_date) # Get the path needed
 
         # Check if the required log file is correctly loaded
         if required_log_filepath != self.current_log_filepath or self.df_log is None:
             logger.info(f"Log file needs loading/reloading for date {target_date}. Required: {required_log_filepath}")
-            if self.df_log is not None: # Save current log if it exists and is different
+            if self.df_log is not None and self._dirty: # Save current log if it has unsaved changes
                  self.save_log()
             # Load the correct file using the specific path
             if self._load_log_file(required_log_filepath) is None:
@@ -175,7 +263,7 @@ class OTLogManager:
              logger.error("Cannot write log entry, log data frame is None after load attempt.")
              return False
 
-        emp_id = str(employee_info['ID'])
+        emp_id = employee_info.emp_id
         day_column = f"Ngày {target_date.day}"
 
         # Ensure the day column exists (should be handled by _load_log_for_date, but double-check)
@@ -196,15 +284,108 @@ class OTLogManager:
             return False
 
         try:
+            if self.shared is not None:
+                self.shared.record(employee_info, entry_type, target_date.day, value) # Journal first: it is the durable copy
             self.df_log.loc[target_row_index, day_column] = value
+            self._dirty = True
+            self._note_row_changed(target_row_index)
             logger.info(f"Logged '{entry_type}' for Emp ID {emp_id} on {target_date.day}: {value} in {self.current_log_filepath}")
-            self.save_log() # Save after each write
+            if not self._defer_saves:
+                self.save_log() # Save after each write
             return True
         except Exception as e:
             logger.error(f"Failed to write log entry at row {target_row_index}, col '{day_column}': {e}", exc_info=True)
             return False
 
 
+    def _note_row_changed(self, row_index):
+        self.change_version += 1
+        self._recent_changes.append((self.change_version, row_index))
+
+    def mark_changed(self):
+        """Records a change that is not a single cell write (reload, bulk edit): views redraw fully."""
+        self.change_version += 1
+        self._full_change_version = self.change_version
+        self._recent_changes.clear()
+
+    def changed_rows_since(self, version):
+        """
+        Index labels of the df_log rows written after `version`, or None when the
+        caller must redraw everything (log reloaded, bulk edit, or too many changes).
+        """
+        if version < self._full_change_version:
+            return None
+        if self._recent_changes and self._recent_changes[0][0] > version + 1:
+            return None # Older changes fell out of the history
+        return {row for changed_at, row in self._recent_changes if changed_at > version}
+
+    # --- Shared folder mode ---
+    def pull_shared(self):
+        """Applies the entries other stations journaled since the last pull to the loaded log."""
+        if self.shared is None or self.df_log is None:
+            return
+        df_log, changed, rows_added = self.shared.pull(self.df_log, self._row_index) # Keeps _row_index current
+        if rows_added:
+            self.df_log = df_log
+            self.mark_changed()
+        else:
+            for row_index in changed:
+                self._note_row_changed(row_index)
+
+    def sync_shared(self):
+        """Periodic shared-mode upkeep (GUI/headless poll): pull other stations' entries, merge when due."""
+        if self.shared is None:
+            return
+        self.pull_shared()
+        if self.current_log_filepath is not None:
+            self.shared.merge_if_due(self.current_log_filepath)
+
+    def close_shared(self):
+        """On exit: tries a last merge so the workbook is current, and closes the journal."""
+        if self.shared is None:
+            return
+        try:
+            if self.current_log_filepath is not None:
+                self.shared.merge_if_due(self.current_log_filepath, force=True)
+        finally:
+            self.shared.close()
+
+    def get_day_times(self, emp_id, target_date):
+        """(clock in, clock out) datetimes recorded in the log for one employee and day, None when empty."""
+        required_log_filepath = self._get_log_filepath(target_date)
+        if required_log_filepath != self.current_log_filepath or self.df_log is None:
+            if self._load_log_file(required_log_filepath) is None:
+                return None, None
+        base_row_index = self._row_index.get(str(emp_id))
+        day_column = f"Ngày {target_date.day}"
+        if base_row_index is None or day_column not in self.df_log.columns:
+            return None, None
+        times = []
+        for entry_type in ("Giờ Vào", "Giờ Ra"):
+            value = self.df_log.at[base_row_index + config.LOG_ROW_TYPES.index(entry_type), day_column]
+            try:
+                times.append(datetime.combine(target_date, datetime.strptime(str(value), '%H:%M:%S').time()))
+            except ValueError:
+                times.append(None)
+        if times[0] is not None and times[1] is not None and times[1] < times[0]:
+            times[1] += timedelta(days=1) # Out of an overnight shift, logged in its start day's column
+        return tuple(times)
+
+    @contextmanager
+    def deferred_saves(self):
+        """
+        Batch mode: entries written inside the block are kept in memory and each
+        affected month is saved once - when the log switches to another month, and
+        at the end of the block - instead of after every entry.
+        """
+        self._defer_saves = True
+        try:
+            yield self
+        finally:
+            self._defer_saves = False
+            if self._dirty:
+                self.save_log()
+
     def get_monthly_ot_minutes(self, emp_id, target_date):
         """
         Calculates total OT minutes for a given employee in the specified month.
@@ -223,15 +404,14 @@ class OTLogManager:
             return 0
 
         emp_id_str = str(emp_id)
-        emp_rows = self.df_log[self.df_log['ID'] == emp_id_str]
+        base_index = self._row_index.get(emp_id_str)
 
-        if emp_rows.empty:
+        if base_index is None:
             # logger.debug(f"Employee {emp_id_str} not found in log {os.path.basename(required_log_filepath)} for OT calculation.")
             return 0 # Employee not in this month's log yet
 
         # Find the 'Tổng thời gian' row for this employee
         try:
-            base_index = emp_rows.index[0]
             total_time_row_index = base_index + config.LOG_ROW_TYPES.index('Tổng thời gian')
             # Check if index exists before accessing .loc
             if total_time_row_index not in self.df_log.index:
@@ -266,6 +446,36 @@ class OTLogManager:
         logger.debug(f"Calculated total OT minutes for Emp ID {emp_id_str} in {target_date.strftime('%m/%Y')}: {total_minutes}")
         return total_minutes
 
+    def prepare_month_log(self, target_date, employees):
+        """
+        Reads or creates the log of target_date's month and adds the three rows of every
+        employee (EmployeeRecords) it does not list yet, writing the file if anything was
+        added - except in shared mode, where only merges write the workbook and the rows
+        stay in memory. Never touches the loaded log, so it can run on a background
+        thread. Returns (filepath, df_log).
+        """
+        filepath = self._get_log_filepath(target_date)
+        df_log, created = self._read_log_file(filepath)
+        if df_log is None:
+            raise IOError(f"Không thể đọc/tạo log OT '{filepath}'")
+        known_ids = set(df_log['ID'].astype(str))
+        missing = [employee for employee in employees if employee.emp_id and employee.emp_id not in known_ids]
+        if missing:
+            stt_values = pd.to_numeric(df_log['STT'], errors='coerce')
+            next_stt = int(stt_values.max()) + 1 if stt_values.notna().any() else 1
+            rows = [{'STT': next_stt + i, 'Họ tên': employee.name, 'ID': employee.emp_id}
+                    for i, employee in enumerate(missing) for _ in config.LOG_ROW_TYPES]
+            attrs = dict(df_log.attrs) # Shared mode journal offsets; concat does not keep them
+            df_log = pd.concat([df_log, pd.DataFrame(rows, columns=df_log.columns)], ignore_index=True)
+            df_log.attrs.update(attrs)
+            day_columns = [col for col in df_log.columns if col not in config.LOG_BASE_COLUMNS]
+            df_log[day_columns] = df_log[day_columns].astype(object)
+        if (created or missing) and self.shared is None:
+            os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+            write_excel(df_log, filepath, decimals=2)
+        logger.info(f"Prepared OT log '{filepath}': {len(missing)} employee(s) added{' (new file)' if created else ''}.")
+        return filepath, df_log
+
     def create_next_month_log(self):
         today = datetime.now()
         first_day_of_current_month = today.replace(day=1)
@@ -284,7 +494,7 @@ class OTLogManager:
                 df_next = self._create_new_log_sheet(first_day_of_next_month)
                 # Ensure directory exists
                 os.makedirs(os.path.dirname(next_month_filepath), exist_ok=True)
-                df_next.to_excel(next_month_filepath, index=False)
+                write_excel(df_next, next_month_filepath)
                 logger.info(f"Created log file for next month: {next_month_filepath}")
                 return True, f"Đã tạo file log tháng {first_day_of_next_month.strftime('%m/%Y')}."
             except Exception as e:
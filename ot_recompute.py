@@ -0,0 +1,142 @@
+# ot_recompute.py
+import os
+import argparse
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import config
+from report_engine import (split_log_rows, time_cells_to_seconds, numeric_cells, export_report,
+                           shift_second_arrays, out_seconds_after_in, log_month_of)
+from employee_records import EmployeeRecord
+
+logger = logging.getLogger(__name__)
+
+DIFF_COLUMNS = ["ID", "Họ tên", "Ngày", "Giờ Vào", "Giờ Ra", "OT cũ (giờ)", "OT mới (giờ)", "Chênh lệch"]
+
+
+def recompute_ot_hours(in_secs, out_secs, start_secs, end_secs, monthly_limit_minutes=config.MONTHLY_OT_LIMIT_MINUTES):
+    """
+    Recomputes daily OT hours (employees x days) from clock-in/out seconds with the
+    same rules as AttendanceManager._calculate_and_log_ot: work counts from
+    max(clock-in, shift start), OT is work beyond the standard shift rounded to whole
+    minutes, and days are capped in order so the month never exceeds the limit.
+    start_secs/end_secs are the per-cell shift arrays of report_engine.shift_second_arrays.
+    Days without both an in and an out time, and scheduled days off, are NaN (left untouched).
+    """
+    out_secs = out_seconds_after_in(in_secs, out_secs) # Overnight shifts: the out is on the next day
+    standard_secs = end_secs - start_secs
+
+    complete = ~np.isnan(in_secs) & ~np.isnan(out_secs) & ~np.isnan(start_secs)
+    work_secs = np.clip(out_secs - np.maximum(in_secs, start_secs), 0, None)
+    with np.errstate(invalid='ignore'):
+        ot_minutes = np.round(np.clip(work_secs - standard_secs, 0, None) / 60.0)
+    ot_minutes = np.where(complete, ot_minutes, 0.0)
+
+    # Monthly cap: what can be logged up to day k is min(OT up to day k, limit)
+    capped_cumulative = np.minimum(np.cumsum(ot_minutes, axis=1), monthly_limit_minutes)
+    allowed_minutes = np.diff(capped_cumulative, axis=1, prepend=0.0)
+    return np.where(complete, np.round(allowed_minutes / 60.0, 2), np.nan)
+
+
+def _total_row_index(df_log, emp_ids):
+    """df_log index labels of the 'Tổng thời gian' row of each employee in emp_ids."""
+    ids = df_log['ID'].astype(str)
+    row_type = ids.groupby(ids.to_numpy(), sort=False).cumcount().to_numpy()
+    total_rows = ids[row_type == config.LOG_ROW_TYPES.index("Tổng thời gian")]
+    return pd.Series(total_rows.index, index=total_rows.to_numpy()).reindex(emp_ids).to_numpy()
+
+
+def build_recompute_diff(df_log, shift_start, shift_end, monthly_limit_minutes=config.MONTHLY_OT_LIMIT_MINUTES,
+                         work_scheduler=None, log_month=None):
+    """
+    Returns a DataFrame (DIFF_COLUMNS) with one row per employee-day whose stored
+    'Tổng thời gian' differs from the value recomputed with the employee's shift of
+    that day: the schedule's when work_scheduler and log_month (year, month) are
+    given, else the general shift_start/shift_end.
+    """
+    base_df, vao, ra, tong, day_columns = split_log_rows(df_log)
+    if base_df.empty or not day_columns:
+        return pd.DataFrame(columns=DIFF_COLUMNS)
+
+    start_secs, end_secs = shift_second_arrays(base_df, day_columns, shift_start, shift_end, work_scheduler, log_month)
+    new_hours = recompute_ot_hours(time_cells_to_seconds(vao), time_cells_to_seconds(ra),
+                                   start_secs, end_secs, monthly_limit_minutes)
+    old_hours = numeric_cells(tong)
+    changed = ~np.isnan(new_hours) & (np.isnan(old_hours) | (np.abs(np.nan_to_num(old_hours) - new_hours) >= 0.005))
+    emp_pos, day_pos = np.nonzero(changed)
+
+    diff = pd.DataFrame({
+        "ID": base_df['ID'].astype(str).to_numpy()[emp_pos],
+        "Họ tên": base_df['Họ tên'].to_numpy()[emp_pos],
+        "Ngày": np.asarray(day_columns, dtype=object)[day_pos],
+        "Giờ Vào": vao[emp_pos, day_pos],
+        "Giờ Ra": ra[emp_pos, day_pos],
+        "OT cũ (giờ)": old_hours[emp_pos, day_pos],
+        "OT mới (giờ)": new_hours[emp_pos, day_pos],
+    })
+    diff["Chênh lệch"] = (diff["OT mới (giờ)"] - diff["OT cũ (giờ)"].fillna(0)).round(2)
+    return diff
+
+
+def apply_recompute_diff(ot_log_manager, diff):
+    """Writes the 'OT mới' values of a diff into the loaded month log and saves it once. Returns cells updated."""
+    df_log = ot_log_manager.df_log
+    if diff.empty or df_log is None:
+        return 0
+    targets = diff.assign(row=_total_row_index(df_log, diff["ID"].to_numpy()))
+    missing = targets["row"].isna()
+    if missing.any():
+        logger.warning(f"{int(missing.sum())} recomputed cell(s) no longer match an employee in the log. Skipping them.")
+        targets = targets[~missing]
+    if ot_log_manager.shared is not None:
+        # Shared folder: the journal carries the edit to the workbook and the other stations.
+        # Written first, so a journal error leaves the in-memory log untouched
+        for emp_id, name, day_column, value in zip(targets["ID"], targets["Họ tên"], targets["Ngày"], targets["OT mới (giờ)"]):
+            ot_log_manager.shared.record(EmployeeRecord(None, name, emp_id, None), "Tổng thời gian", int(day_column.split()[-1]), float(value))
+    for day_column, group in targets.groupby("Ngày", sort=False):
+        df_log.loc[group["row"].to_numpy(), day_column] = group["OT mới (giờ)"].to_numpy()
+    ot_log_manager.mark_changed()
+    ot_log_manager.save_log()
+    logger.info(f"Recomputed OT applied to {len(targets)} cell(s) in '{ot_log_manager.current_log_filepath}'")
+    return len(targets)
+
+
+def main(argv=None):
+    from settings_manager import SettingsManager
+    from ot_log_manager import OTLogManager
+    from work_scheduler import WorkScheduler
+    parser = argparse.ArgumentParser(description="Recompute 'Tổng thời gian' (OT hours) of a month log from its in/out times with the current shift settings.")
+    parser.add_argument("log_file", nargs="?", default=None, help="Month log file (default: current month)")
+    parser.add_argument("-o", "--output", default=None, help="Export the diff preview to .xlsx/.csv")
+    parser.add_argument("--apply", action="store_true", help="Write the recomputed values (the log is backed up first)")
+    parser.add_argument("--settings", default=config.SETTINGS_FILENAME)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    settings_manager = SettingsManager(args.settings)
+    ot_log_manager = OTLogManager(settings_manager)
+    if args.log_file and ot_log_manager._load_log_file(os.path.abspath(args.log_file)) is None:
+        parser.error(f"Cannot load log file '{args.log_file}'")
+    shift_start, shift_end = settings_manager.get_shift_times()
+    work_scheduler = WorkScheduler(settings_manager)
+    work_scheduler.load()
+
+    started = datetime.now()
+    diff = build_recompute_diff(ot_log_manager.df_log, shift_start, shift_end, work_scheduler=work_scheduler,
+                                log_month=log_month_of(ot_log_manager.current_log_filepath))
+    logger.info(f"Recompute done in {(datetime.now() - started).total_seconds():.3f}s: {len(diff)} cell(s) differ.")
+    if args.output:
+        export_report(diff, args.output)
+    elif not diff.empty:
+        print(diff.to_string(index=False, max_rows=60))
+    if args.apply and not diff.empty:
+        ot_log_manager.backup_current_log()
+        apply_recompute_diff(ot_log_manager, diff)
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# pending_registrations.py
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING_CARDS = 500
+
+class PendingRegistrations:
+    """
+    Unknown cards waiting to be registered, with the capture times of every swipe
+    they made in the meantime. Swipes are parked here instead of blocking the gate
+    with a dialog; once the card is registered the parked swipes are replayed.
+    Thread safe: cards are parked from the swipe path and registered from the UI.
+    """
+    def __init__(self, max_cards=MAX_PENDING_CARDS):
+        self.max_cards = max_cards
+        self._cards = OrderedDict() # {card_id: [captured_at, ...]} in order of first swipe
+        self._lock = threading.Lock()
+        self.version = 0 # Bumped on every change so views can cheaply poll for updates
+
+    def park(self, card_id, captured_at):
+        with self._lock:
+            if card_id not in self._cards and len(self._cards) >= self.max_cards:
+                dropped_card, dropped_times = self._cards.popitem(last=False)
+                logger.warning(f"Pending registration list full. Dropped oldest card {dropped_card} ({len(dropped_times)} swipe(s)).")
+            self._cards.setdefault(card_id, []).append(captured_at)
+            self.version += 1
+            return len(self._cards[card_id])
+
+    def pop(self, card_id):
+        """Removes the card and returns its parked capture times (oldest first)."""
+        with self._lock:
+            captured_times = self._cards.pop(card_id, [])
+            if captured_times:
+                self.version += 1
+            return sorted(captured_times)
+
+    def __contains__(self, card_id):
+        with self._lock:
+            return card_id in self._cards
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cards)
+
+    def snapshot(self):
+        """Returns [(card_id, first_captured_at, swipe_count), ...] in order of first swipe."""
+        with self._lock:
+            return [(card_id, times[0], len(times)) for card_id, times in self._cards.items()]
@@ -0,0 +1,207 @@
+# report_engine.py
+import os
+import re
+import argparse
+import logging
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+
+import config
+from excel_stream import write_excel
+
+logger = logging.getLogger(__name__)
+
+_DAY_COLUMN_RE = re.compile(r"^Ngày (\d+)$")
+_LOG_MONTH_RE = re.compile(re.escape(config.LOG_FILENAME_PREFIX) + r"(\d{2})_(\d{4})\.xlsx$")
+DAY_SECONDS = 86400
+
+
+def get_day_columns(df_log):
+    """Returns the 'Ngày N' columns of a month log, ordered by day number."""
+    days = []
+    for col in df_log.columns:
+        match = _DAY_COLUMN_RE.match(str(col))
+        if match:
+            days.append((int(match.group(1)), col))
+    return [col for _, col in sorted(days)]
+
+
+def split_log_rows(df_log):
+    """
+    Splits a month log (3 rows per employee) into aligned per-employee blocks.
+    Returns (base_df, vao, ra, tong, day_columns) where base_df has the LOG_BASE_COLUMNS
+    of each employee and vao/ra/tong are 2-D object arrays (employees x days).
+    Row types are identified by their order within each employee's rows, the same
+    way OTLogManager writes them.
+    """
+    if df_log is None or df_log.empty:
+        day_columns = get_day_columns(df_log) if df_log is not None else []
+        empty = np.empty((0, len(day_columns)), dtype=object)
+        return pd.DataFrame(columns=config.LOG_BASE_COLUMNS), empty, empty, empty, day_columns
+
+    day_columns = get_day_columns(df_log)
+    ids = df_log['ID'].astype(str).to_numpy()
+    row_type = df_log.groupby(ids, sort=False).cumcount().to_numpy()
+    values = df_log[day_columns].to_numpy(dtype=object)
+
+    vao_rows = np.flatnonzero(row_type == 0)
+    ra_rows = np.flatnonzero(row_type == 1)
+    tong_rows = np.flatnonzero(row_type == 2)
+    emp_ids = ids[vao_rows]
+    # Align the Giờ Ra / Tổng thời gian rows to the Giờ Vào order (IDs are unique per row type)
+    ra_pos = pd.Index(ids[ra_rows]).get_indexer(emp_ids)
+    tong_pos = pd.Index(ids[tong_rows]).get_indexer(emp_ids)
+    complete = (ra_pos >= 0) & (tong_pos >= 0)
+    if not complete.all():
+        logger.warning(f"{int((~complete).sum())} employee(s) in the log do not have all 3 rows. Skipping them.")
+        vao_rows, ra_pos, tong_pos = vao_rows[complete], ra_pos[complete], tong_pos[complete]
+
+    base_df = df_log.iloc[vao_rows][config.LOG_BASE_COLUMNS].reset_index(drop=True)
+    return base_df, values[vao_rows], values[ra_rows[ra_pos]], values[tong_rows[tong_pos]], day_columns
+
+
+def time_cells_to_seconds(values):
+    """
+    Converts an array of 'HH:MM:SS' cells (strings or datetime.time, None/NaN for empty)
+    to seconds since midnight as float, NaN where empty or unparseable.
+    Fixed-width strings are parsed with numpy character arithmetic; the rare odd
+    cell (e.g. '7:05' typed by hand) falls back to pandas.
+    """
+    shape = values.shape
+    flat = pd.Series(values.ravel(), dtype=object)
+    present = flat.notna().to_numpy()
+    result = np.full(flat.shape[0], np.nan)
+    if not present.any():
+        return result.reshape(shape)
+
+    text = flat[present].astype(str).to_numpy().astype('U8')
+    chars = text.view('U1').reshape(-1, 8)
+    codes = chars.view(np.uint32).astype(np.int64) - 48 # ord('0') == 48
+    digit_cols = [0, 1, 3, 4, 6, 7]
+    valid = ((chars[:, 2] == ':') & (chars[:, 5] == ':')
+             & ((codes[:, digit_cols] >= 0) & (codes[:, digit_cols] <= 9)).all(axis=1))
+    seconds = ((codes[:, 0] * 10 + codes[:, 1]) * 3600
+               + (codes[:, 3] * 10 + codes[:, 4]) * 60
+               + codes[:, 6] * 10 + codes[:, 7]).astype(float)
+    seconds[~valid] = np.nan
+
+    if not valid.all():
+        odd = flat[present].iloc[np.flatnonzero(~valid)].astype(str)
+        parsed = pd.to_timedelta(odd.where(odd.str.count(":") == 2, odd + ":00"), errors='coerce')
+        seconds[~valid] = parsed.dt.total_seconds().to_numpy()
+
+    result[present] = seconds
+    return result.reshape(shape)
+
+
+def log_month_of(filepath):
+    """(year, month) of an OT_Log_Thang_MM_YYYY.xlsx path, or None."""
+    match = _LOG_MONTH_RE.search(os.path.basename(filepath or ""))
+    return (int(match.group(2)), int(match.group(1))) if match else None
+
+
+def _seconds_of(t):
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def shift_second_arrays(base_df, day_columns, shift_start, shift_end, work_scheduler=None, log_month=None):
+    """
+    (start, end) float arrays (employees x days) of the shift each log cell belongs to,
+    in seconds from that day's midnight; end is past DAY_SECONDS for an overnight shift
+    and both are NaN on a scheduled day off. Cells the schedule does not cover, or every
+    cell without a scheduler/log month, get the general shift_start/shift_end.
+    """
+    start_secs, end_secs = _seconds_of(shift_start), _seconds_of(shift_end)
+    if end_secs <= start_secs:
+        end_secs += DAY_SECONDS
+    shape = (len(base_df), len(day_columns))
+    starts, ends = np.full(shape, float(start_secs)), np.full(shape, float(end_secs))
+    if work_scheduler is None or work_scheduler.index is None or log_month is None:
+        return starts, ends
+
+    year, month = log_month
+    dates = []
+    for day_column in day_columns:
+        try:
+            dates.append(date(year, month, int(_DAY_COLUMN_RE.match(str(day_column)).group(1))))
+        except (AttributeError, ValueError):
+            dates.append(None) # Not in the schedule: general shift
+    scheduled_starts, scheduled_ends, scheduled = work_scheduler.shift_offset_grid(base_df['ID'].astype(str).tolist(), dates)
+    return np.where(scheduled, scheduled_starts, starts), np.where(scheduled, scheduled_ends, ends)
+
+
+def out_seconds_after_in(in_secs, out_secs):
+    """Out times on the clock-in day's scale: an overnight out (earlier than the in, same column) moves to the next day."""
+    return np.where(out_secs < in_secs, out_secs + DAY_SECONDS, out_secs)
+
+
+def numeric_cells(values):
+    """Converts an object array to float, NaN for empty/non-numeric cells."""
+    return pd.to_numeric(pd.Series(values.ravel(), dtype=object), errors='coerce').to_numpy(dtype=float).reshape(values.shape)
+
+
+def build_monthly_report(df_log, shift_start, shift_end, ot_threshold_hours=config.REPORT_OT_THRESHOLD_HOURS,
+                         monthly_limit_hours=config.MONTHLY_OT_LIMIT_HOURS, work_scheduler=None, log_month=None):
+    """
+    Computes per-employee totals for one month log in a single vectorized pass.
+    Late/early counts use each employee's shift of the day (see shift_second_arrays);
+    shift_start/shift_end are the general shift, datetime.time values.
+    Returns one row per employee: base columns, days present, total OT hours, days over
+    the threshold, remaining headroom against the monthly limit, late and early counts.
+    """
+    base_df, vao, ra, tong, day_columns = split_log_rows(df_log)
+    in_secs = time_cells_to_seconds(vao)
+    out_secs = out_seconds_after_in(in_secs, time_cells_to_seconds(ra))
+    ot_hours = numeric_cells(tong)
+    start_secs, end_secs = shift_second_arrays(base_df, day_columns, shift_start, shift_end, work_scheduler, log_month)
+
+    total_ot = np.nansum(ot_hours, axis=1) if ot_hours.size else np.zeros(len(base_df))
+    report = base_df.copy()
+    report["Số ngày có mặt"] = (~np.isnan(in_secs)).sum(axis=1)
+    report["Tổng giờ OT"] = np.round(total_ot, 2)
+    report[f"Số ngày OT > {ot_threshold_hours:g}h"] = (ot_hours > ot_threshold_hours).sum(axis=1) # NaN compares False
+    report["Giờ OT còn lại"] = np.round(np.clip(monthly_limit_hours - total_ot, 0, None), 2)
+    report["Số lần đi muộn"] = (in_secs > start_secs).sum(axis=1) # NaN (day off / no swipe) compares False
+    report["Số lần về sớm"] = (out_secs < end_secs).sum(axis=1)
+    return report
+
+
+def export_report(report_df, filepath):
+    """Writes a report to .csv (UTF-8 with BOM so Excel shows Vietnamese correctly) or .xlsx."""
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    if filepath.lower().endswith(".csv"):
+        report_df.to_csv(filepath, index=False, encoding="utf-8-sig", float_format="%.2f")
+    else:
+        write_excel(report_df, filepath, decimals=2)
+    logger.info(f"Report with {len(report_df)} employee(s) exported to '{filepath}'")
+
+
+def main(argv=None):
+    from settings_manager import SettingsManager
+    parser = argparse.ArgumentParser(description="Monthly OT report for all employees of one OT_Log_Thang_MM_YYYY.xlsx file.")
+    parser.add_argument("log_file", help="Month log file to report on")
+    parser.add_argument("-o", "--output", required=True, help="Output .xlsx or .csv")
+    parser.add_argument("--threshold", type=float, default=config.REPORT_OT_THRESHOLD_HOURS,
+                        help=f"Daily OT hours counted as 'over threshold' (default: {config.REPORT_OT_THRESHOLD_HOURS})")
+    parser.add_argument("--settings", default=config.SETTINGS_FILENAME)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    from work_scheduler import WorkScheduler
+    settings_manager = SettingsManager(args.settings)
+    shift_start, shift_end = settings_manager.get_shift_times()
+    work_scheduler = WorkScheduler(settings_manager)
+    work_scheduler.load()
+    df_log = pd.read_excel(args.log_file, dtype={'ID': str})
+    started = datetime.now()
+    report = build_monthly_report(df_log, shift_start, shift_end, args.threshold,
+                                  work_scheduler=work_scheduler, log_month=log_month_of(args.log_file))
+    logger.info(f"Report computed in {(datetime.now() - started).total_seconds():.3f}s")
+    export_report(report, args.output)
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
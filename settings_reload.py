@@ -0,0 +1,109 @@
+# settings_reload.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config
+from work_scheduler import WorkScheduler
+
+logger = logging.getLogger(__name__)
+
+# What a settings change requires
+IMPACT_DATABASE = "database" # Employee database must be re-read from another folder
+IMPACT_LOG = "log" # Current month log must be re-read from another folder
+IMPACT_SCHEDULE = "schedule" # Work schedule workbook must be re-read (also on a database folder change)
+IMPACT_DEVICE = "device" # HID reader VID/PID: takes effect on restart
+IMPACT_RULES = "rules" # Shift/delay/window: read live on every swipe, nothing to reload
+
+SETTING_IMPACTS = {
+    "database_folder": IMPACT_DATABASE,
+    "log_folder": IMPACT_LOG,
+    "schedule_filename": IMPACT_SCHEDULE,
+    "zkteco_vid": IMPACT_DEVICE,
+    "zkteco_pid": IMPACT_DEVICE,
+    "shift_start": IMPACT_RULES,
+    "shift_end": IMPACT_RULES,
+    "swipe_delay_minutes": IMPACT_RULES,
+    "allowed_swipe_window_minutes": IMPACT_RULES,
+    "shifts": IMPACT_RULES,
+    "schedule_code_map": IMPACT_RULES,
+}
+
+
+def classify_settings_change(old_settings, new_settings):
+    """Returns the set of IMPACT_* values caused by changing old_settings into new_settings."""
+    impacts = set()
+    for key in set(old_settings) | set(new_settings):
+        if old_settings.get(key) != new_settings.get(key):
+            impacts.add(SETTING_IMPACTS.get(key, IMPACT_RULES))
+    return impacts
+
+
+class BackgroundReloader:
+    """
+    Re-reads the employee database, the work schedule and/or the current month log
+    for new folder settings on a worker thread. The live managers keep serving swipes meanwhile;
+    apply() swaps the new data in on the caller's thread, each manager in one step.
+    """
+    def __init__(self, settings_manager, employee_manager, ot_log_manager, work_scheduler=None):
+        self.settings_manager = settings_manager
+        self.employee_manager = employee_manager
+        self.ot_log_manager = ot_log_manager
+        self.work_scheduler = work_scheduler
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="settings-reload")
+        self._future = None
+
+    def is_running(self):
+        return self._future is not None and not self._future.done()
+
+    def start(self, impacts):
+        """Starts reading what the impacts require. Returns False if there is nothing to reload."""
+        jobs = {}
+        if IMPACT_DATABASE in impacts:
+            jobs[IMPACT_DATABASE] = config.get_db_filepath(self.settings_manager)
+        if self.work_scheduler is not None and (IMPACT_DATABASE in impacts or IMPACT_SCHEDULE in impacts):
+            jobs[IMPACT_SCHEDULE] = config.get_schedule_filepath(self.settings_manager)
+        if IMPACT_LOG in impacts:
+            jobs[IMPACT_LOG] = config.get_log_filepath(self.settings_manager, datetime.now())
+        if not jobs:
+            return False
+        logger.info(f"Reloading in background after settings change: {jobs}")
+        self._future = self._executor.submit(self._read, jobs)
+        return True
+
+    def _read(self, jobs):
+        """Runs on the worker thread; only reads files, never touches the live managers."""
+        result = {}
+        if IMPACT_DATABASE in jobs:
+            filepath = jobs[IMPACT_DATABASE]
+            result[IMPACT_DATABASE] = (filepath,) + self.employee_manager.read_database_snapshot(filepath)
+        if IMPACT_SCHEDULE in jobs:
+            filepath = jobs[IMPACT_SCHEDULE]
+            result[IMPACT_SCHEDULE] = (filepath, WorkScheduler.read_index(filepath))
+        if IMPACT_LOG in jobs:
+            filepath = jobs[IMPACT_LOG]
+            result[IMPACT_LOG] = (filepath,) + self.ot_log_manager._read_log_file(filepath)
+        return result
+
+    def poll(self):
+        """None while running; otherwise the finished result (raises the worker's exception)."""
+        if self.is_running() or self._future is None:
+            return None
+        future, self._future = self._future, None
+        return future.result()
+
+    def apply(self, result):
+        """Swaps the data read by the worker into the live managers. Call from the swipe-processing thread."""
+        if IMPACT_DATABASE in result:
+            filepath, df, search_index, directory = result[IMPACT_DATABASE]
+            self.employee_manager.swap_database(filepath, df, search_index, directory)
+        if IMPACT_SCHEDULE in result:
+            self.work_scheduler.swap_index(result[IMPACT_SCHEDULE][1])
+        if IMPACT_LOG in result:
+            filepath, df_log, created = result[IMPACT_LOG]
+            if df_log is None:
+                raise IOError(f"Không thể đọc log OT '{filepath}'")
+            self.ot_log_manager.swap_in_log(filepath, df_log, created)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
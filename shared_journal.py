@@ -0,0 +1,424 @@
+# shared_journal.py
+import os
+import json
+import time
+import uuid
+import logging
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+import config
+from employee_records import EmployeeRecord
+from excel_stream import write_excel
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".jsonl"
+OFFSETS_FILENAME = "offsets.json" # Journal bytes already merged into the workbook
+LEASE_FILENAME = "merge.lease"
+
+
+def journal_folder(log_filepath):
+    """<log folder>/.journal/<log file name without extension>/ - one folder per month workbook."""
+    folder, filename = os.path.split(log_filepath)
+    return os.path.join(folder, config.SHARED_JOURNAL_FOLDER_NAME, os.path.splitext(filename)[0])
+
+
+def _write_json_atomic(filepath, data):
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def read_offsets(folder):
+    try:
+        with open(os.path.join(folder, OFFSETS_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def read_new_entries(folder, offsets):
+    """
+    Reads the complete lines appended to every station journal in folder since
+    offsets ({journal file name: byte offset}). A line still being written (no
+    trailing newline yet) is left for the next read.
+    Returns (entries sorted by write time, new offsets).
+    """
+    entries, new_offsets = [], dict(offsets)
+    try:
+        names = [name for name in os.listdir(folder) if name.endswith(JOURNAL_SUFFIX)]
+    except FileNotFoundError:
+        return entries, new_offsets
+    for name in names:
+        start = offsets.get(name, 0)
+        with open(os.path.join(folder, name), "rb") as f:
+            f.seek(start)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            continue
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping corrupt journal line in '{name}': {line[:80]!r}")
+        new_offsets[name] = start + end
+    entries.sort(key=lambda e: (e["at"], e["station"], e["seq"]))
+    return entries, new_offsets
+
+
+def employee_row_index(df_log):
+    """{emp_id: index label of the employee's first ('Giờ Vào') row} of a month log frame."""
+    return pd.Series(df_log.index, index=df_log['ID'].astype(str)).groupby(level=0).first().to_dict()
+
+
+def apply_entries(df_log, entries, first_rows=None):
+    """
+    Writes journal entries into a month log frame. Entries are absolute cell values,
+    so applying one twice is harmless. Employees missing from the log get their three
+    rows appended. first_rows is the frame's employee_row_index when the caller keeps
+    one; it is updated with the appended employees. Returns (df_log, changed row labels, rows_added).
+    """
+    if not entries:
+        return df_log, set(), False
+    if first_rows is None:
+        first_rows = employee_row_index(df_log)
+    new_employees = {}
+    for entry in entries:
+        if entry["id"] not in first_rows and entry["id"] not in new_employees:
+            new_employees[entry["id"]] = entry["name"]
+    rows_added = bool(new_employees)
+    if rows_added:
+        stt = pd.to_numeric(df_log['STT'], errors='coerce').max() if not df_log.empty else 0
+        next_stt = int(stt) + 1 if pd.notna(stt) else 1
+        blocks = [{'STT': next_stt + i, 'Họ tên': name, 'ID': emp_id}
+                  for i, (emp_id, name) in enumerate(new_employees.items()) for _ in config.LOG_ROW_TYPES]
+        first_new_row = len(df_log)
+        df_log = pd.concat([df_log, pd.DataFrame(blocks, columns=df_log.columns)], ignore_index=True)
+        for i, emp_id in enumerate(new_employees):
+            first_rows[emp_id] = first_new_row + i * len(config.LOG_ROW_TYPES)
+
+    changed = set()
+    for entry in entries:
+        day_column = f"Ngày {entry['day']}"
+        if day_column not in df_log.columns:
+            logger.warning(f"Journal entry for missing column '{day_column}' skipped.")
+            continue
+        row = first_rows[entry["id"]] + config.LOG_ROW_TYPES.index(entry["type"])
+        df_log.at[row, day_column] = entry["value"]
+        changed.add(row)
+    return df_log, changed, rows_added
+
+
+class MergeLease:
+    """
+    Exclusive, expiring lock on a journal folder: a file created with O_EXCL holding
+    the owner, a per-acquisition token and its expiry. A lease past its expiry (owner
+    crashed) may be broken by renaming it away. The owner re-reads its token before
+    committing, so it never writes after losing the lease.
+    """
+    def __init__(self, folder, holder, ttl=config.SHARED_LEASE_SECONDS):
+        self.path = os.path.join(folder, LEASE_FILENAME)
+        self.holder = holder
+        self.ttl = ttl
+        self.token = None
+        self.acquired_at = None
+
+    def acquire(self):
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._break_if_expired():
+                    return False
+                continue
+            self.token = uuid.uuid4().hex
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"holder": self.holder, "token": self.token, "expires": time.time() + self.ttl}, f)
+            self.acquired_at = time.monotonic()
+            return True
+        return False
+
+    def _break_if_expired(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                expires = json.load(f).get("expires", 0)
+        except FileNotFoundError:
+            return True # Released meanwhile
+        except ValueError:
+            # Owner is still writing it, or crashed mid-write: judge by file age
+            try:
+                expires = os.path.getmtime(self.path) + self.ttl
+            except FileNotFoundError:
+                return True
+        if time.time() < expires:
+            return False
+        try:
+            stale_path = f"{self.path}.stale.{self.holder}.{os.getpid()}"
+            os.rename(self.path, stale_path)
+            os.remove(stale_path)
+            logger.warning(f"Broke expired merge lease '{self.path}'.")
+        except FileNotFoundError:
+            pass # Someone else broke it first
+        return True
+
+    def _owns_file(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("token") == self.token
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def still_valid(self):
+        """False once the lease may have expired or been taken over."""
+        return (self.acquired_at is not None and time.monotonic() - self.acquired_at < self.ttl
+                and self._owns_file())
+
+    def release(self):
+        if self.acquired_at is None:
+            return
+        self.acquired_at = None
+        if self._owns_file():
+            os.remove(self.path)
+
+
+def merge_month(log_filepath, holder, read_log):
+    """
+    Merges every station journal of one month into its workbook under the lease.
+    read_log(filepath) -> (df, created) reads the workbook (OTLogManager._read_log_file).
+    The workbook is replaced atomically, then the merged offsets are committed; a crash
+    in between only re-applies entries, which is harmless.
+    Returns the number of entries merged, or None if another station holds the lease.
+    """
+    folder = journal_folder(log_filepath)
+    if not os.path.isdir(folder):
+        return 0
+    lease = MergeLease(folder, holder)
+    if not lease.acquire():
+        return None
+    try:
+        offsets = read_offsets(folder)
+        entries, new_offsets = read_new_entries(folder, offsets)
+        if not entries:
+            return 0
+        df_log, _ = read_log(log_filepath)
+        if df_log is None:
+            raise IOError(f"Không thể đọc log OT '{log_filepath}'")
+        df_log, _, _ = apply_entries(df_log, entries)
+        if not lease.still_valid():
+            logger.error(f"Merge of '{log_filepath}' took longer than the lease; aborted without writing.")
+            return None
+        tmp_path = os.path.join(os.path.dirname(log_filepath), f".~merge_{holder}_{os.path.basename(log_filepath)}")
+        write_excel(df_log, tmp_path, decimals=2)
+        os.replace(tmp_path, log_filepath)
+        _write_json_atomic(os.path.join(folder, OFFSETS_FILENAME), new_offsets)
+        logger.info(f"Merged {len(entries)} journal entr(ies) into '{log_filepath}'.")
+        return len(entries)
+    finally:
+        lease.release()
+
+
+def months_with_pending_entries(log_folder):
+    """Workbook paths whose journals hold entries not merged yet."""
+    root = os.path.join(log_folder, config.SHARED_JOURNAL_FOLDER_NAME)
+    pending = []
+    if not os.path.isdir(root):
+        return pending
+    for month in sorted(os.listdir(root)):
+        folder = os.path.join(root, month)
+        if not os.path.isdir(folder):
+            continue
+        offsets = read_offsets(folder)
+        for name in os.listdir(folder):
+            if name.endswith(JOURNAL_SUFFIX) and os.path.getsize(os.path.join(folder, name)) > offsets.get(name, 0):
+                pending.append(os.path.join(log_folder, month + ".xlsx"))
+                break
+    return pending
+
+
+class SharedLogSync:
+    """
+    Multi-station mode for OTLogManager. Instead of rewriting the whole workbook,
+    each cell write is appended to this station's journal; entries from the other
+    stations are pulled into the in-memory log, and whichever station gets the lease
+    merges all journals into the workbook.
+    """
+    def __init__(self, ot_log_manager, station_id):
+        self.ot_log_manager = ot_log_manager
+        self.station_id = station_id
+        self.journal_name = station_id + JOURNAL_SUFFIX
+        self._folder = None
+        self._journal = None
+        self._seq = 0
+        self._pull_offsets = {} # Journal bytes already in the in-memory log
+        self._last_merge = 0.0
+        self._log_filepath = None
+        # Called with (log filepath, entries) for every batch of entries read from the
+        # journals, so in-memory attendance (AttendanceManager) sees other stations' swipes
+        self.entries_listener = None
+
+    def on_log_loaded(self, log_filepath, df_log):
+        """
+        Called when a month log was read from the workbook: switches the journal to that
+        month and applies the entries not merged into the workbook yet (own included,
+        e.g. after a restart). Returns (df_log, changed rows, rows_added).
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self._folder = journal_folder(log_filepath)
+        self._log_filepath = log_filepath
+        offsets = df_log.attrs.pop('journal_offsets', None) # Snapshot taken by OTLogManager._read_log_file
+        if offsets is None:
+            offsets = read_offsets(self._folder)
+        entries, self._pull_offsets = read_new_entries(self._folder, offsets)
+        self._notify(entries)
+        return apply_entries(df_log, entries)
+
+    def record(self, employee_info, entry_type, day, value):
+        """Appends one cell write to this station's journal (flushed to disk before returning)."""
+        if self._journal is None:
+            os.makedirs(self._folder, exist_ok=True)
+            self._journal = open(os.path.join(self._folder, self.journal_name), "ab")
+        self._seq += 1
+        entry = {"at": datetime.now().isoformat(timespec="microseconds"), "station": self.station_id, "seq": self._seq,
+                 "id": employee_info.emp_id, "name": employee_info.name, "type": entry_type, "day": day,
+                 "value": value.item() if hasattr(value, "item") else value}
+        self._journal.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        # Own entries are already in memory; the pull skips them
+        self._pull_offsets[self.journal_name] = self._journal.tell()
+
+    def pull(self, df_log, first_rows=None):
+        """
+        Applies entries the other stations appended since the last pull (first_rows: see
+        apply_entries). Returns (df_log, changed rows, rows_added).
+        """
+        if self._folder is None:
+            return df_log, set(), False
+        entries, self._pull_offsets = read_new_entries(self._folder, self._pull_offsets)
+        self._notify(entries)
+        return apply_entries(df_log, entries, first_rows)
+
+    def _notify(self, entries):
+        if entries and self.entries_listener is not None:
+            self.entries_listener(self._log_filepath, entries)
+
+    def merge_if_due(self, log_filepath, force=False):
+        """Merges the month's journals into the workbook at most every SHARED_MERGE_INTERVAL_SECONDS."""
+        now = time.monotonic()
+        if not force and now - self._last_merge < config.SHARED_MERGE_INTERVAL_SECONDS:
+            return None
+        self._last_merge = now
+        return merge_month(log_filepath, self.station_id, self.ot_log_manager._read_log_file)
+
+    def merge_pending(self, log_folder):
+        """Merges every month whose journals still hold entries (e.g. the month just left)."""
+        for log_filepath in months_with_pending_entries(log_folder):
+            merge_month(log_filepath, self.station_id, self.ot_log_manager._read_log_file)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+# --- Multi-process simulation ---
+def _simulate_station(settings_file, station_id, employee_count, station_count, days, merge_interval, result_queue):
+    from settings_manager import SettingsManager
+    from ot_log_manager import OTLogManager
+    logging.basicConfig(level=logging.WARNING, format=f'%(asctime)s - {station_id} - %(levelname)s - %(message)s')
+    config.SHARED_MERGE_INTERVAL_SECONDS = merge_interval
+    settings_manager = SettingsManager(settings_file)
+    settings_manager.settings["station_id"] = station_id # In memory only: the file is shared
+    manager = OTLogManager(settings_manager)
+    station_index = int(station_id.rsplit("_", 1)[1])
+    now = datetime.now()
+    written = 0
+    for day in days:
+        entry_time = now.replace(day=day)
+        for emp in range(station_index, employee_count, station_count): # Each station owns a slice of employees
+            info = EmployeeRecord(emp + 1, f"Nhân viên {emp}", f"E{emp:04d}", None)
+            if manager.write_log_entry(info, entry_time, "Giờ Vào", f"08:{emp % 60:02d}:00"):
+                written += 1
+        manager.sync_shared()
+    manager.shared.merge_if_due(manager.current_log_filepath, force=True)
+    manager.shared.close()
+    result_queue.put((station_id, written))
+
+
+def simulate(folder, stations, employees, days, merge_interval=1.0):
+    """
+    Runs `stations` processes writing to one log folder at the same time, then checks
+    that the merged workbook holds every cell written (no lost updates).
+    """
+    import multiprocessing
+    import calendar
+    os.makedirs(folder, exist_ok=True)
+    settings_file = os.path.join(folder, "settings_sim.json")
+    with open(settings_file, "w", encoding="utf-8") as f:
+        json.dump({"database_folder": folder, "log_folder": folder, "backup_folder": os.path.join(folder, "backup"),
+                   "swipe_store_folder": os.path.join(folder, "swipe_events"), "shared_log_mode": True}, f)
+    from settings_manager import SettingsManager
+    SettingsManager(settings_file) # Completes the file with defaults before the stations read it
+    day_list = list(range(1, min(days, calendar.monthrange(datetime.now().year, datetime.now().month)[1]) + 1))
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    started = time.perf_counter()
+    processes = [ctx.Process(target=_simulate_station,
+                             args=(settings_file, f"sim_{i}", employees, stations, day_list, merge_interval, results))
+                 for i in range(stations)]
+    for p in processes:
+        p.start()
+    written = dict(results.get() for _ in processes)
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    from ot_log_manager import OTLogManager
+    manager = OTLogManager(SettingsManager(settings_file))
+    merge_month(manager.current_log_filepath, "verify", manager._read_log_file)
+    df_log, _ = manager._read_log_file(manager.current_log_filepath) # The workbook alone, as Excel sees it
+    in_rows = df_log.groupby('ID', sort=False).head(1)
+    found = int(in_rows[[f"Ngày {d}" for d in day_list]].notna().to_numpy().sum())
+    expected = sum(written.values())
+    print(f"{stations} station(s), {expected} cell write(s) in {elapsed:.1f}s; workbook holds {found}, lost {expected - found}.")
+    return expected - found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared log folder tools: merge station journals, multi-process simulation.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    merge_parser = sub.add_parser("merge", help="Merge all pending station journals into the month workbooks")
+    merge_parser.add_argument("--settings", default=config.SETTINGS_FILENAME)
+    sim_parser = sub.add_parser("simulate", help="Run several station processes against one folder and check for lost updates")
+    sim_parser.add_argument("folder", help="Scratch folder (created); use an empty one")
+    sim_parser.add_argument("--stations", type=int, default=4)
+    sim_parser.add_argument("--employees", type=int, default=200)
+    sim_parser.add_argument("--days", type=int, default=5)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    if args.command == "simulate":
+        return 1 if simulate(args.folder, args.stations, args.employees, args.days) else 0
+
+    from settings_manager import SettingsManager
+    from ot_log_manager import OTLogManager
+    settings_manager = SettingsManager(args.settings)
+    manager = OTLogManager(settings_manager)
+    for log_filepath in months_with_pending_entries(config.get_log_folder(settings_manager)):
+        merged = merge_month(log_filepath, config.get_station_id(settings_manager), manager._read_log_file)
+        print(f"{os.path.basename(log_filepath)}: {'lease busy' if merged is None else f'{merged} entr(ies) merged'}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
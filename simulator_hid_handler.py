@@ -5,6 +5,8 @@ import random
 import queue # Although not used directly here, good practice if extending
 import logging
 
+from swipe_event import make_swipe_event
+
 logger = logging.getLogger(__name__)
 
 # --- List of Card IDs to Simulate ---
@@ -42,8 +44,8 @@ class SimulatorHidHandler:
                 # Choose a random card ID from the list
                 card_id_to_send = random.choice(SIMULATED_CARD_IDS)
 
-                # Put the simulated card ID into the queue
-                self.output_queue.put(card_id_to_send)
+                # Put the simulated swipe into the queue
+                self.output_queue.put(make_swipe_event(card_id_to_send, source="simulator"))
                 logger.info(f"[SIMULATOR] Sent Card ID: {card_id_to_send}")
 
             except Exception as e:
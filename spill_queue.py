@@ -0,0 +1,201 @@
+# spill_queue.py
+import os
+import queue
+import threading
+import time
+import logging
+from collections import deque
+
+from swipe_event import swipe_event_to_json, swipe_event_from_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_SLOTS = 256
+
+class SpillQueue:
+    """
+    Bounded FIFO for swipes between the reader threads and the attendance engine.
+
+    Up to maxsize items are held in memory. When the ring is full, further items are
+    appended to an overflow file on disk (one JSON line each, flushed immediately) and
+    drained back into memory in order as the consumer catches up. Once the overflow has
+    started, new items keep going to disk until it has been fully drained, so FIFO order
+    is preserved. The read position of the overflow file is persisted next to it, so
+    swipes still on disk when the process dies are recovered on the next start.
+
+    put() never blocks and never drops; get()/get_nowait() mirror queue.Queue.
+    overflow_callback(event, depth) is called with "overflow" when spilling starts and
+    "drained" when the overflow file is empty again (from the calling thread).
+    """
+    def __init__(self, spill_filepath, maxsize=DEFAULT_MEMORY_SLOTS, encode=swipe_event_to_json,
+                 decode=swipe_event_from_json, overflow_callback=None):
+        self.spill_filepath = spill_filepath
+        self.pos_filepath = spill_filepath + ".pos"
+        self.maxsize = max(1, maxsize)
+        self.encode = encode
+        self.decode = decode
+        self.overflow_callback = overflow_callback
+
+        self._memory = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._spill_writer = None
+        self._spill_count = 0 # Items in the overflow file not yet drained
+        self._read_offset = 0
+
+        # Counters surfaced to the UI/logs
+        self.spilled_total = 0
+        self.overflow_events = 0
+        self.max_depth = 0
+
+        os.makedirs(os.path.dirname(spill_filepath) or '.', exist_ok=True)
+        self._recover()
+
+    # --- Overflow file helpers (called with the lock held) ---
+    def _recover(self):
+        if not os.path.exists(self.spill_filepath):
+            return
+        try:
+            with open(self.pos_filepath, 'r', encoding='utf-8') as f:
+                self._read_offset = int(f.read().strip() or 0)
+        except (IOError, ValueError):
+            self._read_offset = 0
+        with open(self.spill_filepath, 'rb') as f:
+            f.seek(self._read_offset)
+            self._spill_count = sum(1 for line in f if line.strip())
+        if self._spill_count:
+            logger.warning(f"Recovered {self._spill_count} queued swipe(s) from overflow file '{self.spill_filepath}'.")
+        else:
+            self._reset_spill_file()
+
+    def _append_to_spill(self, item):
+        if self._spill_writer is None:
+            self._spill_writer = open(self.spill_filepath, 'a', encoding='utf-8')
+        self._spill_writer.write(self.encode(item) + "\n")
+        self._spill_writer.flush()
+        self._spill_count += 1
+        self.spilled_total += 1
+
+    def _refill_from_spill(self):
+        """Moves the oldest spilled items back into memory."""
+        room = self.maxsize - len(self._memory)
+        if room <= 0 or self._spill_count == 0:
+            return
+        if self._spill_writer is not None:
+            self._spill_writer.flush()
+        loaded = 0
+        with open(self.spill_filepath, 'r', encoding='utf-8') as f:
+            f.seek(self._read_offset)
+            while loaded < room:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    try:
+                        self._memory.append(self.decode(line))
+                    except (ValueError, KeyError) as e:
+                        logger.error(f"Skipping corrupt overflow entry '{line.strip()}': {e}")
+                    loaded += 1
+                    self._spill_count -= 1
+            self._read_offset = f.tell()
+        if self._spill_count <= 0:
+            self._spill_count = 0
+            self._reset_spill_file()
+            logger.info("Swipe overflow drained.")
+            self._notify("drained")
+        else:
+            with open(self.pos_filepath, 'w', encoding='utf-8') as f:
+                f.write(str(self._read_offset))
+
+    def _reset_spill_file(self):
+        if self._spill_writer is not None:
+            self._spill_writer.close()
+            self._spill_writer = None
+        for path in (self.spill_filepath, self.pos_filepath):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._read_offset = 0
+
+    def _notify(self, event):
+        if self.overflow_callback:
+            try:
+                self.overflow_callback(event, len(self._memory) + self._spill_count)
+            except Exception as e:
+                logger.error(f"Overflow callback failed: {e}")
+
+    # --- queue.Queue-like interface ---
+    def put(self, item, block=True, timeout=None):
+        with self._not_empty:
+            if self._spill_count == 0 and len(self._memory) < self.maxsize:
+                self._memory.append(item)
+            else:
+                if self._spill_count == 0:
+                    self.overflow_events += 1
+                    logger.warning(f"Swipe queue full ({self.maxsize} in memory). Spilling to '{self.spill_filepath}'.")
+                    self._append_to_spill(item)
+                    self._notify("overflow")
+                else:
+                    self._append_to_spill(item)
+            depth = len(self._memory) + self._spill_count
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self._not_empty.notify()
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        with self._not_empty:
+            if not self._memory and self._spill_count:
+                self._refill_from_spill()
+            if not block:
+                if not self._memory:
+                    raise queue.Empty
+            elif timeout is None:
+                while not self._memory:
+                    self._not_empty.wait()
+                    if not self._memory and self._spill_count:
+                        self._refill_from_spill()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self._memory:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._not_empty.wait(remaining)
+                    if not self._memory and self._spill_count:
+                        self._refill_from_spill()
+            item = self._memory.popleft()
+            # Refill early (below half full) so disk reads happen in batches
+            if self._spill_count and len(self._memory) < self.maxsize // 2:
+                self._refill_from_spill()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        with self._lock:
+            return len(self._memory) + self._spill_count
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": len(self._memory) + self._spill_count,
+                "in_memory": len(self._memory),
+                "on_disk": self._spill_count,
+                "spilled_total": self.spilled_total,
+                "overflow_events": self.overflow_events,
+                "max_depth": self.max_depth,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._spill_writer is not None:
+                self._spill_writer.close()
+                self._spill_writer = None
@@ -0,0 +1,129 @@
+# station_client.py
+import socket
+import json
+import argparse
+import logging
+import queue
+import time
+from datetime import datetime
+
+from network_ingest import DEFAULT_PORT
+from swipe_dedup import SwipeDeduplicator
+
+logger = logging.getLogger(__name__)
+
+class StationClient:
+    """
+    Lightweight client for a remote swipe station. Sends swipes to the central
+    ingestion server (network_ingest.py) and waits for each acknowledgement.
+    Reconnects automatically; a swipe is only considered delivered once acked.
+    """
+    def __init__(self, host, port=DEFAULT_PORT, station_id=None, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.station_id = station_id or socket.gethostname()
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._seq = 0
+
+    def connect(self):
+        self.close()
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("r", encoding="utf-8")
+        logger.info(f"Station {self.station_id} connected to {self.host}:{self.port}")
+
+    def close(self):
+        if self._sock:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    def send_swipe(self, card_id, captured_at=None):
+        """Sends one swipe and returns the server's ack dict. Raises OSError on connection problems."""
+        if self._sock is None:
+            self.connect()
+        self._seq += 1
+        message = {
+            "seq": self._seq,
+            "station": self.station_id,
+            "card_id": str(card_id),
+            "ts": (captured_at or datetime.now()).isoformat(timespec="milliseconds"),
+        }
+        try:
+            self._sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+            line = self._reader.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise ConnectionError("Server closed the connection")
+        return json.loads(line)
+
+    def forward_queue(self, card_queue, stop_event=None, retry_delay=5.0):
+        """
+        Forwards card IDs from a local reader queue (HidHandler, simulator, stdin reader)
+        to the server, keeping the reader's capture time across reconnects.
+        """
+        while stop_event is None or not stop_event.is_set():
+            try:
+                event = card_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            card_id = event.card_id
+            while True:
+                try:
+                    ack = self.send_swipe(card_id, event.captured_at)
+                    if not ack.get("ok"):
+                        logger.warning(f"Server rejected swipe {card_id}: {ack.get('error')}")
+                    break
+                except (OSError, ValueError) as e:
+                    logger.error(f"Could not deliver swipe {card_id}: {e}. Retrying in {retry_delay}s.")
+                    time.sleep(retry_delay)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remote swipe station: forwards local card reads to the central server.")
+    parser.add_argument("--host", required=True)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--station", default=None, help="Station ID (default: hostname)")
+    parser.add_argument("--reader", choices=("hid", "simulator", "stdin"), default="stdin")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    card_queue = queue.Queue()
+    swipe_input = SwipeDeduplicator(card_queue) # Double reads are dropped before they are sent
+    if args.reader == "simulator":
+        from simulator_hid_handler import SimulatorHidHandler
+        reader = SimulatorHidHandler(swipe_input)
+    elif args.reader == "stdin":
+        from stdin_card_reader import StdinCardReader
+        reader = StdinCardReader(swipe_input)
+    else:
+        import config
+        from hid_handler import HidHandler
+        from settings_manager import SettingsManager
+        settings_manager = SettingsManager()
+        vid = settings_manager.get_setting("zkteco_vid", config.DEFAULT_ZKTeco_VID)
+        pid = settings_manager.get_setting("zkteco_pid", config.DEFAULT_ZKTeco_PID)
+        reader = HidHandler(swipe_input, vid, pid)
+
+    client = StationClient(args.host, args.port, args.station)
+    reader.start()
+    try:
+        client.forward_queue(card_queue)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.stop()
+        client.close()
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# stdin_card_reader.py
+import sys
+import threading
+import logging
+
+from swipe_event import make_swipe_event
+
+logger = logging.getLogger(__name__)
+
+class StdinCardReader:
+    """
+    Reads card IDs line by line from a text stream (stdin by default).
+    Used in headless mode on machines where the CR20E is attached as a plain
+    keyboard wedge (e.g. a Linux box with the reader on the console TTY).
+    Mimics the HidHandler interface.
+    """
+    def __init__(self, output_queue, stream=None):
+        self.output_queue = output_queue
+        self.stream = stream if stream is not None else sys.stdin
+        self.running = False
+        self.thread = None
+        logger.info("Initialized StdinCardReader")
+
+    def _run(self):
+        logger.info("Stdin reader thread started.")
+        while self.running:
+            try:
+                line = self.stream.readline()
+            except Exception as e:
+                logger.error(f"Error reading card input: {e}")
+                break
+            if not line: # EOF
+                logger.info("Card input stream closed.")
+                break
+            card_id = line.strip()
+            if card_id:
+                logger.info(f"Card ID read from input: {card_id}")
+                self.output_queue.put(make_swipe_event(card_id, source="stdin"))
+        self.running = False
+        logger.info("Stdin reader thread finished.")
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+            logger.info("StdinCardReader started.")
+        else:
+            logger.warning("StdinCardReader already running.")
+
+    def stop(self):
+        # readline() cannot be interrupted; the daemon thread ends with the process.
+        if self.running:
+            logger.info("Stopping StdinCardReader...")
+            self.running = False
+        else:
+            logger.info("StdinCardReader already stopped.")
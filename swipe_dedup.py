@@ -0,0 +1,65 @@
+# swipe_dedup.py
+import threading
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class SwipeDeduplicator:
+    """
+    Drops repeated reads of one card between the reader threads and the swipe queue.
+    With several readers on one PC (HidHandler opens every matching interface) one
+    card can be read by two readers, or one reader can report it twice. A read whose
+    capture time is within window_ms of the last read of the same card is suppressed
+    here, so it never reaches the attendance engine.
+
+    Readers call put() exactly as they would on the queue. Recent cards are kept in
+    an LRU (card_id -> last capture time); entries older than the window are dropped
+    on each put, so it only ever holds the cards read in the last few hundred ms.
+    """
+    def __init__(self, output_queue, window_ms=config.SWIPE_DEDUP_WINDOW_MS, max_cards=config.SWIPE_DEDUP_MAX_CARDS):
+        self.output_queue = output_queue
+        self.window = timedelta(milliseconds=window_ms)
+        self.max_cards = max(1, max_cards)
+        self._last_read = OrderedDict() # card_id -> captured_at, least recently read first
+        self._lock = threading.Lock() # put() is called from every reader thread
+
+        # Counters surfaced to the logs
+        self.passed = 0
+        self.suppressed = 0
+
+    def is_duplicate(self, event):
+        """True if the same card was read within the window; records the read either way."""
+        with self._lock:
+            cutoff = event.captured_at - self.window
+            while self._last_read:
+                oldest_card, oldest_at = next(iter(self._last_read.items()))
+                if oldest_at >= cutoff:
+                    break
+                del self._last_read[oldest_card]
+
+            last = self._last_read.get(event.card_id)
+            # A card held on the reader keeps extending the window from its latest read
+            self._last_read[event.card_id] = event.captured_at if last is None else max(last, event.captured_at)
+            self._last_read.move_to_end(event.card_id)
+            if len(self._last_read) > self.max_cards:
+                self._last_read.popitem(last=False)
+            if last is not None and abs(event.captured_at - last) <= self.window:
+                self.suppressed += 1
+                return True
+            self.passed += 1
+            return False
+
+    def put(self, event):
+        if self.is_duplicate(event):
+            logger.info(f"Duplicate read of card {event.card_id} from {event.source} suppressed ({self.suppressed} so far).")
+            return
+        self.output_queue.put(event)
+
+    def stats(self):
+        with self._lock:
+            return {"passed": self.passed, "suppressed": self.suppressed, "tracked_cards": len(self._last_read)}
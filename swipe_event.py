@@ -0,0 +1,28 @@
+# swipe_event.py
+import json
+from collections import namedtuple
+from datetime import datetime
+
+# A card read as produced by a reader. captured_at is taken at the source
+# (when the ENTER from the reader arrives), not when the swipe is processed,
+# so queued or delayed swipes keep their real in/out time.
+SwipeEvent = namedtuple("SwipeEvent", ["card_id", "captured_at", "source"])
+
+
+def make_swipe_event(card_id, source=None, captured_at=None):
+    """Creates a SwipeEvent stamped with the current time unless captured_at is given."""
+    return SwipeEvent(str(card_id).strip(), captured_at if captured_at is not None else datetime.now(), source)
+
+
+def swipe_event_to_json(event):
+    """Serializes a SwipeEvent to one JSON line (used for the on-disk overflow file)."""
+    return json.dumps({
+        "card_id": event.card_id,
+        "captured_at": event.captured_at.isoformat(),
+        "source": event.source,
+    }, ensure_ascii=False)
+
+
+def swipe_event_from_json(line):
+    data = json.loads(line)
+    return SwipeEvent(data["card_id"], datetime.fromisoformat(data["captured_at"]), data.get("source"))
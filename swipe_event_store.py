@@ -0,0 +1,213 @@
+# swipe_event_store.py
+import os
+import re
+import argparse
+import logging
+import threading
+from datetime import datetime, date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Decision codes recorded for every swipe that reaches AttendanceManager.process_swipe
+DECISION_CLOCK_IN = 1
+DECISION_CLOCK_OUT = 2
+DECISION_TOO_SOON = 3
+DECISION_UNKNOWN_CARD = 4
+DECISION_TOO_EARLY = 5
+DECISION_AFTER_SHIFT_END = 6
+DECISION_OUT_BEFORE_IN = 7
+DECISION_ALREADY_COMPLETE = 8
+DECISION_LOG_WRITE_FAILED = 9
+DECISION_DAY_OFF = 10
+
+DECISION_NAMES = {
+    DECISION_CLOCK_IN: "Vào",
+    DECISION_CLOCK_OUT: "Ra",
+    DECISION_TOO_SOON: "Quẹt quá nhanh",
+    DECISION_UNKNOWN_CARD: "Thẻ chưa đăng ký",
+    DECISION_TOO_EARLY: "Chưa đến giờ vào ca",
+    DECISION_AFTER_SHIFT_END: "Đã qua giờ làm",
+    DECISION_OUT_BEFORE_IN: "Lỗi thời gian quẹt ra",
+    DECISION_ALREADY_COMPLETE: "Đã chấm công đủ",
+    DECISION_LOG_WRITE_FAILED: "Lỗi ghi log",
+    DECISION_DAY_OFF: "Ngày nghỉ theo lịch",
+}
+
+# One fixed-width little-endian record per swipe (64 bytes). Changing this layout
+# requires a new file suffix so old files are not misread.
+RECORD_DTYPE = np.dtype([
+    ("captured_ms", "<i8"), # Capture time, ms since epoch (local time, naive)
+    ("card", "S32"),
+    ("station", "S23"),
+    ("decision", "u1"),
+])
+FILE_PREFIX = "swipes_"
+FILE_SUFFIX = ".v1.bin"
+_FILE_RE = re.compile(re.escape(FILE_PREFIX) + r"(\d{8})" + re.escape(FILE_SUFFIX) + "$")
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_ms(dt):
+    return int((dt - _EPOCH).total_seconds() * 1000)
+
+
+def _fit_utf8(text, size):
+    """UTF-8 bytes of text cut to at most size bytes on a character boundary."""
+    return text.encode("utf-8")[:size].decode("utf-8", "ignore").encode("utf-8")
+
+
+class SwipeEventStore:
+    """
+    Append-only store of every raw swipe and the decision taken on it, one binary
+    file of fixed-width records per capture day. Appends are a single write of one
+    record; reads memory-map the day files so scans over months never parse text.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_day = None
+
+    def day_filepath(self, day):
+        return os.path.join(self.folder, f"{FILE_PREFIX}{day.strftime('%Y%m%d')}{FILE_SUFFIX}")
+
+    # --- Writing ---
+    def append(self, card_id, station, captured_at, decision):
+        card = str(card_id).encode("utf-8")
+        if len(card) > RECORD_DTYPE["card"].itemsize:
+            # Cutting it could make two different cards look the same in the audit trail
+            logger.error(f"Card ID '{card_id}' is longer than {RECORD_DTYPE['card'].itemsize} bytes; swipe event not stored.")
+            return False
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record["captured_ms"] = _to_ms(captured_at)
+        record["card"] = card
+        record["station"] = _fit_utf8(str(station or ""), RECORD_DTYPE["station"].itemsize)
+        record["decision"] = decision
+        day = captured_at.date()
+        with self._lock:
+            try:
+                if self._writer_day != day:
+                    self._close_writer()
+                    self._writer = open(self.day_filepath(day), "ab")
+                    self._writer_day = day
+                self._writer.write(record.tobytes())
+                self._writer.flush()
+            except OSError as e:
+                logger.error(f"Could not append swipe event for card {card_id}: {e}")
+                self._close_writer()
+                return False
+        return True
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        self._writer_day = None
+
+    def close(self):
+        with self._lock:
+            self._close_writer()
+
+    # --- Reading ---
+    def available_days(self):
+        days = []
+        for name in os.listdir(self.folder):
+            match = _FILE_RE.match(name)
+            if match:
+                days.append(datetime.strptime(match.group(1), "%Y%m%d").date())
+        return sorted(days)
+
+    def read_day(self, day):
+        """Memory-mapped records of one day (read-only), empty array if there are none."""
+        filepath = self.day_filepath(day)
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        count = size // RECORD_DTYPE.itemsize # Ignore a torn last record after a crash
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(filepath, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+    def iter_range(self, start_day, end_day):
+        """Yields (day, records) for each day in [start_day, end_day] that has events."""
+        for day in self.available_days():
+            if start_day <= day <= end_day:
+                records = self.read_day(day)
+                if len(records):
+                    yield day, records
+
+    def decision_counts(self, start_day, end_day):
+        """Per-day counts of each decision code: DataFrame indexed by day, one column per decision."""
+        rows = {}
+        for day, records in self.iter_range(start_day, end_day):
+            rows[day] = np.bincount(records["decision"], minlength=max(DECISION_NAMES) + 1)
+        counts = pd.DataFrame.from_dict(rows, orient="index", columns=range(max(DECISION_NAMES) + 1))
+        return counts[list(DECISION_NAMES)].rename(columns=DECISION_NAMES)
+
+    def load_range(self, start_day, end_day, card_id=None, decisions=None):
+        """
+        Records in the range as one array, optionally filtered by card and/or decision
+        codes. Filtering runs on the memory maps; only matching records are copied.
+        """
+        card_key = str(card_id).encode("utf-8") if card_id is not None else None
+        parts = []
+        for _, records in self.iter_range(start_day, end_day):
+            mask = np.ones(len(records), dtype=bool)
+            if card_key is not None:
+                mask &= records["card"] == card_key
+            if decisions is not None:
+                mask &= np.isin(records["decision"], list(decisions))
+            parts.append(records[mask])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+
+
+def records_to_dataframe(records):
+    """Decodes records into a readable DataFrame (for export/inspection)."""
+    return pd.DataFrame({
+        "Thời gian": _EPOCH + pd.to_timedelta(records["captured_ms"], unit="ms"),
+        "CARD ID": np.char.decode(records["card"], "utf-8", "replace"),
+        "Trạm": np.char.decode(records["station"], "utf-8", "replace"),
+        "Kết quả": pd.Series(records["decision"]).map(DECISION_NAMES).fillna("?").to_numpy(),
+    })
+
+
+def main(argv=None):
+    from settings_manager import SettingsManager
+    from report_engine import export_report
+    parser = argparse.ArgumentParser(description="Inspect the raw swipe event store.")
+    parser.add_argument("command", choices=["summary", "events"], help="summary: decisions per day, events: list swipes")
+    parser.add_argument("--from", dest="start", default=None, help="First day YYYY-MM-DD (default: 30 days ago)")
+    parser.add_argument("--to", dest="end", default=None, help="Last day YYYY-MM-DD (default: today)")
+    parser.add_argument("--card", default=None, help="Only this CARD ID (events)")
+    parser.add_argument("--rejected", action="store_true", help="Only rejected swipes (events)")
+    parser.add_argument("-o", "--output", default=None, help="Export to .xlsx/.csv instead of printing")
+    parser.add_argument("--settings", default=config.SETTINGS_FILENAME)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    end_day = date.fromisoformat(args.end) if args.end else date.today()
+    start_day = date.fromisoformat(args.start) if args.start else end_day - timedelta(days=30)
+    store = SwipeEventStore(config.get_swipe_store_folder(SettingsManager(args.settings)))
+
+    if args.command == "summary":
+        result = store.decision_counts(start_day, end_day)
+        result = result.rename_axis("Ngày").reset_index()
+    else:
+        decisions = [code for code in DECISION_NAMES if code not in (DECISION_CLOCK_IN, DECISION_CLOCK_OUT)] if args.rejected else None
+        result = records_to_dataframe(store.load_range(start_day, end_day, args.card, decisions))
+    if args.output:
+        export_report(result, args.output)
+    else:
+        print(result.to_string(index=False) if not result.empty else "Không có dữ liệu.")
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,39 @@
 # ui_manager.py
 import customtkinter as ctk
-from tkinter import messagebox, filedialog, simpledialog
+from tkinter import messagebox, filedialog
 from datetime import datetime
 import config
 import logging
 from collections import deque
+from swipe_event import make_swipe_event
+from report_engine import build_monthly_report, export_report, log_month_of
+from excel_stream import write_excel
+from ot_recompute import build_recompute_diff, apply_recompute_diff
+from virtual_table import VirtualTable
+from month_grid_view import MonthGridWindow
+from month_rollover import MonthRollover
+from settings_reload import BackgroundReloader, classify_settings_change, IMPACT_DATABASE, IMPACT_LOG, IMPACT_SCHEDULE, IMPACT_DEVICE, IMPACT_RULES
 import os
 import queue
 
 logger = logging.getLogger(__name__)
 
 class UIManager(ctk.CTk):
-    def __init__(self, attendance_manager, settings_manager, employee_manager, ot_log_manager):
+    def __init__(self, attendance_manager, settings_manager, employee_manager, ot_log_manager, hid_queue=None, work_scheduler=None, swipe_input=None):
         super().__init__()
 
         self.attendance_manager = attendance_manager
         self.settings_manager = settings_manager
         self.employee_manager = employee_manager
         self.ot_log_manager = ot_log_manager
-        #self.hid_queue = hid_queue
+        self.work_scheduler = work_scheduler
+        self.hid_queue = hid_queue # SpillQueue of SwipeEvents, or None to process input directly
+        # Where the hidden entry puts its events: the SwipeDeduplicator in front of hid_queue, like the readers
+        self.swipe_input = swipe_input if swipe_input is not None else hid_queue
+        self._queue_overflow_shown = 0
 
         self.title(config.APP_TITLE)
-        self.geometry("800x700") # Increased height further for VID/PID
+        self.geometry("1080x700") # Wider for the pending registration panel
         ctk.set_appearance_mode("System")
         ctk.set_default_color_theme("blue")
 
@@ -36,19 +48,37 @@ class UIManager(ctk.CTk):
         # Variable to control settings edit mode
         self.settings_editing_enabled = ctk.BooleanVar(value=False)
 
+        self.month_grid_window = None
+        self.settings_reloader = BackgroundReloader(settings_manager, employee_manager, ot_log_manager, work_scheduler)
+        self.month_rollover = MonthRollover(employee_manager, ot_log_manager) # Next month's log ready before midnight
+
+        # Employee search state (debounced type-ahead)
+        self._employee_search_job = None
+
+        # Pending registration panel state
+        self.selected_pending_card = None
+        self._pending_version_shown = -1
+
         # Build UI
         self._create_widgets()
         self._load_settings_to_ui()
         self._update_settings_widgets_state()
 
         # Start polling the HID queue
-        #self.after(100, self._check_hid_queue)
+        if self.hid_queue is not None:
+            self.after(100, self._check_hid_queue)
         # Start clock update
         self._update_clock()
+        self._refresh_pending_panel()
+        self._check_database_changes()
+        self._check_month_rollover()
+        if self.ot_log_manager.shared is not None:
+            self.after(config.SHARED_SYNC_MS, self._sync_shared_log)
         self.after(250,self._refocus_hidden_entry)
 
     def _create_widgets(self):
         self.grid_columnconfigure(0, weight=1)
+        self.grid_columnconfigure(1, weight=0) # Pending registration side panel
         self.grid_rowconfigure(1, weight=1) # Allow log area to expand
 
         # --- Top Frame: Last Swipe Info ---
@@ -86,6 +116,8 @@ class UIManager(ctk.CTk):
         tab_view.add("Cài đặt Ca & Folder")
         tab_view.add("Cài đặt Thiết bị") # New Tab for VID/PID
         tab_view.add("Thao tác Log")
+        tab_view.add("Nhân viên")
+        tab_view.add("Danh sách NV")
 
         # --- Settings Tab 1: Shift & Folders ---
         settings_tab_folders = tab_view.tab("Cài đặt Ca & Folder")
@@ -152,11 +184,40 @@ class UIManager(ctk.CTk):
 
         self.save_settings_button = ctk.CTkButton(edit_save_frame, text="Lưu Tất Cả Cài Đặt", command=self._save_settings)
         self.save_settings_button.grid(row=0, column=2, padx=5, pady=5, sticky="e")
+        # Shown while a folder change is being reloaded in the background
+        self.settings_reload_progress = ctk.CTkProgressBar(edit_save_frame, mode="indeterminate", width=160)
+        self.settings_reload_progress.grid(row=0, column=1, padx=5, pady=5)
+        self.settings_reload_progress.grid_remove()
 
         # --- Settings Tab 3: Log Actions ---
         log_actions_tab = tab_view.tab("Thao tác Log")
         log_actions_tab.grid_columnconfigure(0, weight=1)
         ctk.CTkButton(log_actions_tab, text="Tạo File Log Tháng Tiếp Theo", command=self._create_next_month_log).grid(row=0, column=0, padx=10, pady=10)
+        ctk.CTkButton(log_actions_tab, text="Xuất Báo cáo OT Tháng", command=self._export_monthly_report).grid(row=1, column=0, padx=10, pady=10)
+        ctk.CTkButton(log_actions_tab, text="Tính lại OT Tháng theo Ca hiện tại...", command=self._recompute_month_ot).grid(row=2, column=0, padx=10, pady=10)
+        ctk.CTkButton(log_actions_tab, text="Xem Log Tháng...", command=self._open_month_grid).grid(row=3, column=0, padx=10, pady=10)
+
+        # --- Tab 4: Employees ---
+        employees_tab = tab_view.tab("Nhân viên")
+        employees_tab.grid_columnconfigure(0, weight=1)
+        ctk.CTkButton(employees_tab, text="Nhập Nhân viên hàng loạt (CSV/Excel)...", command=self._bulk_import_employees).grid(row=0, column=0, padx=10, pady=10)
+        ctk.CTkLabel(employees_tab, text="File cần có các cột: Họ tên, ID, CARD ID", text_color="gray", font=ctk.CTkFont(size=10)).grid(row=1, column=0, padx=10, pady=(0, 10))
+
+        self.employee_search_entry = ctk.CTkEntry(employees_tab, placeholder_text="Tìm nhân viên (tên không dấu, ID hoặc CARD ID)...")
+        self.employee_search_entry.grid(row=2, column=0, padx=10, pady=(5, 5), sticky="ew")
+        self.employee_search_entry.bind("<KeyRelease>", self._on_employee_search_key)
+        self.employee_search_results = ctk.CTkTextbox(employees_tab, height=120, font=ctk.CTkFont(family="Courier New", size=12), wrap="none")
+        self.employee_search_results.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="nsew")
+        self.employee_search_results.configure(state="disabled")
+        employees_tab.grid_rowconfigure(3, weight=1)
+
+        # --- Tab 5: Employee list (virtualized, click a header to sort) ---
+        employee_list_tab = tab_view.tab("Danh sách NV")
+        employee_list_tab.grid_columnconfigure(0, weight=1)
+        employee_list_tab.grid_rowconfigure(0, weight=1)
+        self.employee_table = VirtualTable(employee_list_tab, column_widths={"STT": 60, "Họ tên": 260, "ID": 140, "CARD ID": 160})
+        self.employee_table.grid(row=0, column=0, sticky="nsew")
+        self._refresh_employee_table()
 
 
         # --- Bottom Status Bar ---
@@ -168,6 +229,39 @@ class UIManager(ctk.CTk):
         self.grid_rowconfigure(5,weight=0)
         self.hidden_swipe_entry.bind("<Return>",self._on_swipe_input)
 
+        self._create_pending_panel()
+
+    def _create_pending_panel(self):
+        """Side panel listing unknown cards waiting for registration, with an inline form."""
+        pending_frame = ctk.CTkFrame(self, width=260)
+        pending_frame.grid(row=0, column=1, rowspan=4, padx=(0, 10), pady=10, sticky="nsew")
+        pending_frame.grid_rowconfigure(1, weight=1)
+        pending_frame.grid_columnconfigure(0, weight=1)
+
+        ctk.CTkLabel(pending_frame, text="Thẻ chờ đăng ký", font=ctk.CTkFont(weight="bold")).grid(row=0, column=0, padx=10, pady=(10, 5), sticky="w")
+        self.pending_list_frame = ctk.CTkScrollableFrame(pending_frame, width=240)
+        self.pending_list_frame.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
+        self.pending_list_frame.grid_columnconfigure(0, weight=1)
+
+        form = ctk.CTkFrame(pending_frame, fg_color="transparent")
+        form.grid(row=2, column=0, padx=5, pady=5, sticky="ew")
+        form.grid_columnconfigure(1, weight=1)
+        self.pending_card_label = ctk.CTkLabel(form, text="Chọn một thẻ để đăng ký", anchor="w")
+        self.pending_card_label.grid(row=0, column=0, columnspan=2, padx=5, pady=2, sticky="ew")
+        ctk.CTkLabel(form, text="ID NV:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+        self.pending_id_entry = ctk.CTkEntry(form)
+        self.pending_id_entry.grid(row=1, column=1, padx=5, pady=2, sticky="ew")
+        ctk.CTkLabel(form, text="Họ tên:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
+        self.pending_name_entry = ctk.CTkEntry(form)
+        self.pending_name_entry.grid(row=2, column=1, padx=5, pady=2, sticky="ew")
+        self.pending_name_entry.bind("<Return>", lambda e: self._register_pending_card())
+        self.pending_register_button = ctk.CTkButton(form, text="Đăng ký", command=self._register_pending_card, width=90)
+        self.pending_register_button.grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        self.pending_discard_button = ctk.CTkButton(form, text="Bỏ qua thẻ", command=self._discard_pending_card, width=90, fg_color="gray")
+        self.pending_discard_button.grid(row=3, column=1, padx=5, pady=5, sticky="e")
+        self.pending_form_message = ctk.CTkLabel(form, text="", text_color="orange", anchor="w", wraplength=230, justify="left")
+        self.pending_form_message.grid(row=4, column=0, columnspan=2, padx=5, pady=(0, 5), sticky="ew")
+
     def _update_clock(self):
         """Updates the clock in the status bar every second."""
         now = datetime.now().strftime("%H:%M:%S")
@@ -195,29 +289,118 @@ class UIManager(ctk.CTk):
             logger.error(f"Error setting focus to hidden entry: {e}")
 
     def _on_swipe_input(self, event = None):
+        captured_at = datetime.now() # Stamp at the source, before any processing
         card_id = self.hidden_swipe_entry.get().strip()
-        logger.info("Swipe input receiveed: '{card_id}'")
+        logger.info(f"Swipe input received: '{card_id}'")
         self.hidden_swipe_entry.delete(0,ctk.END)
         if card_id:
-            employee = self.employee_manager.find_employee_by_card_id(card_id)
-            if not employee:
-                name, emp_id = self.ask_new_employee_info(card_id)
-                if name and emp_id:
-                    success, msg = self.employee_manager.add_employee(name,emp_id,card_id)
-                    if success:
-                        messagebox.showinfo("Thành công", f"Đã thêm nhân viên:\nTên: {name}\nID:{emp_id}\nCARD_ID:{card_id}")
-                        self.attendance_manager.process_swipe(card_id)
-                    else:
-                        messagebox.showerror("Lỗi",f"Không thể thêm nhân viên: {msg}")
-                        self.update_display(status=f"Lỗi thêm NV({card_id})",card_id=card_id)
-                else:
-                    self.update_display(status=f"Đã hủy đăng ký thẻ ({card_id})",card_id = card_id)
+            if self.hid_queue is not None:
+                # Same deduplicated, bounded path as the reader threads; processed by _check_hid_queue
+                self.swipe_input.put(make_swipe_event(card_id, source="keyboard", captured_at=captured_at))
             else:
-                self.attendance_manager.process_swipe(card_id)
+                # Unknown cards are parked by the attendance manager and show up in the side panel
+                self.attendance_manager.process_swipe(card_id, swipe_time=captured_at, source="keyboard")
         else:
             logger.warning("Empty input receive on Enter press.")
         self.after(50,self._refocus_hidden_entry)
 
+    def _refresh_pending_panel(self):
+        """Rebuilds the pending card list when it changed. Polled like the clock."""
+        pending = self.attendance_manager.pending_registrations if self.attendance_manager else None
+        if pending is not None and pending.version != self._pending_version_shown:
+            self._pending_version_shown = pending.version
+            for widget in self.pending_list_frame.winfo_children():
+                widget.destroy()
+            for row, (card_id, first_seen, count) in enumerate(pending.snapshot()):
+                text = f"{card_id}  ({first_seen.strftime('%H:%M:%S')}, {count} lần)"
+                ctk.CTkButton(
+                    self.pending_list_frame, text=text, anchor="w",
+                    fg_color="transparent" if card_id != self.selected_pending_card else None,
+                    text_color=("gray10", "gray90"),
+                    command=lambda c=card_id: self._select_pending_card(c)
+                ).grid(row=row, column=0, padx=2, pady=1, sticky="ew")
+            if self.selected_pending_card and self.selected_pending_card not in pending:
+                self._clear_pending_form()
+        self.after(500, self._refresh_pending_panel)
+
+    def _check_database_changes(self):
+        """Applies edits made to the employee database file outside the app (read by its watcher thread)."""
+        try:
+            counts = self.employee_manager.apply_external_changes()
+            if counts is not None:
+                added, changed, removed = counts
+                self._add_log_message(f"CSDL nhân viên được sửa bên ngoài: +{added} NV mới, {changed} NV thay đổi, -{removed} NV bị xóa")
+                self._refresh_employee_table()
+                if self.employee_search_entry.get().strip():
+                    self._run_employee_search()
+        except Exception as e:
+            logger.error(f"Error applying external database changes: {e}", exc_info=True)
+        self.after(1000, self._check_database_changes)
+
+    def _check_month_rollover(self):
+        """Prepares next month's log on the last day of the month and switches to it at midnight."""
+        try:
+            message = self.month_rollover.tick()
+            if message:
+                self._add_log_message(message)
+        except Exception as e:
+            logger.error(f"Error during month log rollover: {e}", exc_info=True)
+        # A swipe arriving before the next check takes the prepared log from memory too
+        self.after(1000 if self.month_rollover.is_running() else config.MONTH_ROLLOVER_CHECK_MS, self._check_month_rollover)
+
+    def _sync_shared_log(self):
+        """Shared folder mode: pulls the other stations' entries and merges the journals when due."""
+        try:
+            self.ot_log_manager.sync_shared()
+        except Exception as e:
+            logger.error(f"Error syncing shared log folder: {e}", exc_info=True)
+        self.after(config.SHARED_SYNC_MS, self._sync_shared_log)
+
+    def _select_pending_card(self, card_id):
+        self.selected_pending_card = card_id
+        self.pending_card_label.configure(text=f"CARD ID: {card_id}")
+        self.pending_form_message.configure(text="")
+        self._pending_version_shown = -1 # Redraw to highlight selection
+        self.pending_id_entry.focus_set()
+
+    def _clear_pending_form(self):
+        self.selected_pending_card = None
+        self.pending_card_label.configure(text="Chọn một thẻ để đăng ký")
+        self.pending_id_entry.delete(0, ctk.END)
+        self.pending_name_entry.delete(0, ctk.END)
+        self._pending_version_shown = -1
+
+    def _register_pending_card(self):
+        card_id = self.selected_pending_card
+        if not card_id:
+            self.pending_form_message.configure(text="Chưa chọn thẻ.")
+            return
+        emp_id = self.pending_id_entry.get().strip()
+        name = self.pending_name_entry.get().strip()
+        if not emp_id or not name:
+            self.pending_form_message.configure(text="ID Nhân viên và Họ tên không được để trống.")
+            return
+        success, msg = self.employee_manager.add_employee(name, emp_id, card_id)
+        if not success:
+            self.pending_form_message.configure(text=f"Không thể thêm nhân viên: {msg}")
+            return
+        self.update_display(status=f"Đã thêm nhân viên mới: {name}", card_id=card_id, name=name, emp_id=emp_id)
+        self._refresh_employee_table()
+        self._clear_pending_form()
+        self.pending_form_message.configure(text="")
+        # Replay the parked swipe(s) with their original capture time
+        self.attendance_manager.replay_pending(card_id)
+        self.after(50, self._refocus_hidden_entry)
+
+    def _discard_pending_card(self):
+        card_id = self.selected_pending_card
+        if not card_id:
+            return
+        dropped = self.attendance_manager.discard_pending(card_id)
+        self.update_display(status=f"Đã hủy đăng ký thẻ ({card_id}, {dropped} lần quẹt)", card_id=card_id)
+        self._clear_pending_form()
+        self.after(50, self._refocus_hidden_entry)
+
     def _load_settings_to_ui(self):
         # Clear existing content
         self.shift_start_entry.delete(0, ctk.END)
@@ -307,7 +490,12 @@ class UIManager(ctk.CTk):
              messagebox.showerror("Lỗi Giá Trị", f"Cài đặt Thiết bị:\nLỗi định dạng VID hoặc PID.\n{e}\nHãy nhập số thập phân (e.g., 6997) hoặc hexa (e.g., 0x1b55).")
              return
 
+        if self.settings_reloader.is_running():
+            messagebox.showwarning("Đang tải dữ liệu", "Đang tải lại dữ liệu theo cài đặt trước. Vui lòng đợi rồi lưu lại.")
+            return
+
         # --- All Validations Passed - Save Settings ---
+        previous_settings = dict(self.settings_manager.settings)
         self.settings_manager.set_setting("shift_start", self.shift_start_entry.get())
         self.settings_manager.set_setting("shift_end", self.shift_end_entry.get())
         self.settings_manager.set_setting("swipe_delay_minutes", int(self.swipe_delay_entry.get()))
@@ -319,31 +507,53 @@ class UIManager(ctk.CTk):
 
         self.settings_manager.save_settings()
 
-        # Reload dependent components (DB/Log paths might have changed)
-        try:
-            logger.info("Reloading employee database after setting save...")
-            self.employee_manager._load_database()
-            logger.info("Reloading current OT log file after setting save...")
-            current_log_path = self.ot_log_manager._get_log_filepath(datetime.now())
-
-            self.ot_log_manager._load_log_file(current_log_path)
-
-            logger.info(f"Successfully reloaded log file: {current_log_path}")
-        except Exception as ae:
-             logger.error(f"AttributeError reloading data after settings change: {ae}",exc_info = True)
-             messagebox.showwarning("Lỗi Tải Dữ liệu", f"Đã lưu cài đặt, nhưng có lỗi khi tải lại dữ liệu:\n{ae}\n\nVui lòng khởi động lại ứng dụng nếu gặp sự cố.")
-        except Exception as e:
-            logger.error(f"Error reloading data after setting change: {e}",exc_info=True)
-            messagebox.showwarning("Lỗi tải dữ liệu", f"Đã lưu cài đặt, nhưng có lỗi khi tải tại dữ liệu:\n{e}\n\nVui lòng khởi động lại ứng dụng nếu gặp sự cố.")
+        # Only folder changes need data reloaded; shift/delay values are read on every swipe
+        impacts = classify_settings_change(previous_settings, self.settings_manager.settings)
+        logger.info(f"Settings change impact: {sorted(impacts) or 'none'}")
+        if IMPACT_RULES in impacts and self.work_scheduler is not None:
+            self.work_scheduler.reload_shifts() # Shift times are cached per schedule code
+        message = "Đã lưu cài đặt."
+        if self.settings_reloader.start(impacts):
+            self.settings_reload_progress.grid()
+            self.settings_reload_progress.start()
+            self.after(100, self._check_settings_reload)
+            message += "\n\nĐang tải dữ liệu từ thư mục mới (chấm công vẫn hoạt động bình thường)."
+        if IMPACT_DEVICE in impacts:
+            message += "\n\nLƯU Ý: Đã thay đổi VID/PID, cần khởi động lại ứng dụng để thay đổi có hiệu lực."
 
         # --- User Feedback ---
-        messagebox.showinfo("Thành công", "Đã lưu cài đặt.\n\nLƯU Ý: Nếu bạn đã thay đổi VID/PID, cần khởi động lại ứng dụng để thay đổi có hiệu lực.")
+        messagebox.showinfo("Thành công", message)
 
         # Disable editing mode after successful save
         self.settings_editing_enabled.set(False)
         self._update_settings_widgets_state()
 
 
+    def _check_settings_reload(self):
+        """Polls the background reload and swaps the new data in on the GUI thread."""
+        try:
+            result = self.settings_reloader.poll()
+            if result is None:
+                self.after(100, self._check_settings_reload)
+                return
+            self.settings_reloader.apply(result)
+            reloaded = []
+            if IMPACT_DATABASE in result:
+                reloaded.append(f"CSDL nhân viên ({len(self.employee_manager.df)} NV)")
+                self._refresh_employee_table()
+            if IMPACT_SCHEDULE in result:
+                schedule_index = result[IMPACT_SCHEDULE][1]
+                reloaded.append(f"lịch làm việc ({len(schedule_index)} NV)" if schedule_index is not None else "lịch làm việc (không có file - dùng ca chung)")
+            if IMPACT_LOG in result:
+                reloaded.append(f"log OT {os.path.basename(self.ot_log_manager.current_log_filepath)}")
+            self._add_log_message(f"Đã tải lại: {', '.join(reloaded)}")
+        except Exception as e:
+            logger.error(f"Error reloading data after setting change: {e}", exc_info=True)
+            messagebox.showwarning("Lỗi tải dữ liệu", f"Đã lưu cài đặt, nhưng có lỗi khi tải lại dữ liệu:\n{e}\n\nVui lòng khởi động lại ứng dụng nếu gặp sự cố.")
+        self.settings_reload_progress.stop()
+        self.settings_reload_progress.grid_remove()
+        self._update_settings_widgets_state()
+
     def _create_next_month_log(self):
         success, message = self.ot_log_manager.create_next_month_log()
         if success:
@@ -351,6 +561,148 @@ class UIManager(ctk.CTk):
         else:
             messagebox.showerror("Lỗi", message)
 
+    def _export_monthly_report(self):
+        df_log = self.ot_log_manager.df_log
+        if df_log is None or df_log.empty:
+            messagebox.showwarning("Không có dữ liệu", "Log OT tháng hiện tại chưa có dữ liệu để xuất báo cáo.")
+            return
+        log_name = os.path.splitext(os.path.basename(self.ot_log_manager.current_log_filepath or "OT_Log"))[0]
+        filepath = filedialog.asksaveasfilename(
+            title="Lưu Báo cáo OT Tháng",
+            initialfile=f"Bao_cao_{log_name}.xlsx",
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")]
+        )
+        if not filepath:
+            return
+        try:
+            shift_start, shift_end = self.settings_manager.get_shift_times()
+            report = build_monthly_report(df_log, shift_start, shift_end, work_scheduler=self.work_scheduler,
+                                          log_month=log_month_of(self.ot_log_manager.current_log_filepath))
+            export_report(report, filepath)
+            messagebox.showinfo("Thành công", f"Đã xuất báo cáo {len(report)} nhân viên:\n{filepath}")
+        except Exception as e:
+            logger.error(f"Error exporting monthly report: {e}", exc_info=True)
+            messagebox.showerror("Lỗi", f"Không thể xuất báo cáo:\n{e}")
+
+    def _open_month_grid(self):
+        if self.month_grid_window is not None and self.month_grid_window.winfo_exists():
+            self.month_grid_window.focus()
+            return
+        self.month_grid_window = MonthGridWindow(self, self.ot_log_manager, self.settings_manager)
+
+    def _recompute_month_ot(self):
+        df_log = self.ot_log_manager.df_log
+        if df_log is None or df_log.empty:
+            messagebox.showwarning("Không có dữ liệu", "Log OT tháng hiện tại chưa có dữ liệu.")
+            return
+        try:
+            shift_start, shift_end = self.settings_manager.get_shift_times()
+            diff = build_recompute_diff(df_log, shift_start, shift_end, work_scheduler=self.work_scheduler,
+                                        log_month=log_month_of(self.ot_log_manager.current_log_filepath))
+        except Exception as e:
+            logger.error(f"Error recomputing monthly OT: {e}", exc_info=True)
+            messagebox.showerror("Lỗi", f"Không thể tính lại OT:\n{e}")
+            return
+        if diff.empty:
+            messagebox.showinfo("Tính lại OT", "Tổng thời gian OT trong log đã khớp với ca hiện tại. Không có thay đổi.")
+            return
+        shift_label = f"{shift_start.strftime('%H:%M')} - {shift_end.strftime('%H:%M')}"
+        if self.work_scheduler is not None and self.work_scheduler.index is not None:
+            shift_label += " (và lịch làm việc theo ca)"
+        self._show_recompute_preview(diff, shift_label)
+
+    def _show_recompute_preview(self, diff, shift_label):
+        """Shows the cells that would change and lets the user apply them."""
+        preview_rows = 500
+        window = ctk.CTkToplevel(self)
+        window.title("Xem trước: Tính lại OT")
+        window.geometry("760x520")
+        window.grid_columnconfigure(0, weight=1)
+        window.grid_rowconfigure(1, weight=1)
+        window.transient(self)
+        window.grab_set()
+
+        employees = diff["ID"].nunique()
+        summary = (f"Ca: {shift_label} | {len(diff)} ô thay đổi, {employees} nhân viên | "
+                   f"Tổng chênh lệch: {diff['Chênh lệch'].sum():+.2f} giờ")
+        ctk.CTkLabel(window, text=summary, anchor="w").grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
+
+        textbox = ctk.CTkTextbox(window, font=ctk.CTkFont(family="Courier New", size=12), wrap="none")
+        textbox.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        textbox.insert("end", diff.head(preview_rows).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+        if len(diff) > preview_rows:
+            textbox.insert("end", f"\n... và {len(diff) - preview_rows} ô khác")
+        textbox.configure(state="disabled")
+
+        def apply_changes():
+            try:
+                self.ot_log_manager.backup_current_log()
+                updated = apply_recompute_diff(self.ot_log_manager, diff)
+            except Exception as e:
+                logger.error(f"Error applying recomputed OT: {e}", exc_info=True)
+                messagebox.showerror("Lỗi", f"Không thể ghi OT đã tính lại:\n{e}", parent=window)
+                return
+            window.destroy()
+            self._add_log_message(f"Tính lại OT theo ca {shift_label}: cập nhật {updated} ô")
+            messagebox.showinfo("Thành công", f"Đã cập nhật {updated} ô Tổng thời gian.")
+
+        button_frame = ctk.CTkFrame(window, fg_color="transparent")
+        button_frame.grid(row=2, column=0, padx=10, pady=(5, 10), sticky="e")
+        ctk.CTkButton(button_frame, text="Hủy", fg_color="gray", command=window.destroy).grid(row=0, column=0, padx=5)
+        ctk.CTkButton(button_frame, text="Áp dụng", command=apply_changes).grid(row=0, column=1, padx=5)
+
+    def _bulk_import_employees(self):
+        filepath = filedialog.askopenfilename(
+            title="Chọn file danh sách nhân viên",
+            filetypes=[("Excel/CSV files", "*.xlsx *.csv"), ("All files", "*.*")]
+        )
+        if not filepath:
+            return
+        try:
+            imported, conflicts = self.employee_manager.bulk_import(filepath)
+        except Exception as e:
+            logger.error(f"Bulk import failed: {e}", exc_info=True)
+            messagebox.showerror("Lỗi", f"Không thể nhập nhân viên:\n{e}")
+            return
+
+        message = f"Đã thêm {imported} nhân viên."
+        if not conflicts.empty:
+            conflicts_path = f"{os.path.splitext(filepath)[0]}_loi_nhap.xlsx"
+            try:
+                write_excel(conflicts, conflicts_path)
+                message += f"\n\n{len(conflicts)} dòng bị bỏ qua do trùng/thiếu thông tin.\nChi tiết: {conflicts_path}"
+            except Exception as e:
+                logger.error(f"Could not write import conflicts file: {e}")
+                message += f"\n\n{len(conflicts)} dòng bị bỏ qua do trùng/thiếu thông tin."
+        self._add_log_message(f"Nhập hàng loạt: {imported} NV mới, {len(conflicts)} dòng lỗi")
+        self._refresh_employee_table()
+        messagebox.showinfo("Nhập nhân viên", message)
+
+    def _refresh_employee_table(self):
+        """Points the employee table at the current frame (add/import replace EmployeeManager.df)."""
+        if self.employee_table.df is self.employee_manager.df:
+            return
+        self.employee_table.set_data(self.employee_manager.df, columns=config.DB_COLUMNS, keep_position=True)
+
+    def _on_employee_search_key(self, event=None):
+        # Debounce: search once typing pauses instead of on every intermediate keystroke
+        if self._employee_search_job is not None:
+            self.after_cancel(self._employee_search_job)
+        self._employee_search_job = self.after(120, self._run_employee_search)
+
+    def _run_employee_search(self):
+        self._employee_search_job = None
+        query = self.employee_search_entry.get().strip()
+        results = self.employee_manager.search_index.search(query) if query else []
+        lines = [f"{row['ID']:<12} {row['CARD ID']:<14} {row['Họ tên']}" for row in results]
+        if query and not results:
+            lines = ["Không tìm thấy nhân viên."]
+        self.employee_search_results.configure(state="normal")
+        self.employee_search_results.delete("1.0", "end")
+        self.employee_search_results.insert("end", "\n".join(lines))
+        self.employee_search_results.configure(state="disabled")
+
     def _add_log_message(self, message):
         """Adds a message to the log display area."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -390,73 +742,37 @@ class UIManager(ctk.CTk):
         self._add_log_message(log_msg)
         logger.info(f"UI Update: {log_msg}") # Also log to file/console
 
-    def ask_new_employee_info(self, card_id):
-        """
-        Pops up dialogs to get Name and ID for a new card.
-        Returns (name, emp_id) or (None, None) if cancelled.
-        """
-        self.update_display(status=f"Thẻ mới: {card_id}. Nhập thông tin NV.", card_id=card_id)
-        messagebox.showinfo("Nhân viên mới", f"Phát hiện thẻ mới chưa có trong database:\nCARD ID: {card_id}\nVui lòng nhập thông tin nhân viên.")
-
-        name = None
-        emp_id = None
-
-        while not emp_id:
-             emp_id_input = simpledialog.askstring("Nhập ID Nhân viên", f"Nhập ID cho nhân viên có CARD ID: {card_id}", parent=self)
-             if emp_id_input is None: # User cancelled
-                 messagebox.showwarning("Hủy bỏ", "Đã hủy thêm nhân viên mới.")
-                 return None, None
-             emp_id_input = emp_id_input.strip()
-             if not emp_id_input:
-                  messagebox.showwarning("Thiếu thông tin", "ID Nhân viên không được để trống.")
-                  continue # Ask again
-             # Check if ID already exists
-             if self.employee_manager.find_employee_by_id(emp_id_input):
-                  messagebox.showwarning("ID Trùng", f"ID nhân viên '{emp_id_input}' đã tồn tại. Vui lòng nhập ID khác.")
-             else:
-                  emp_id = emp_id_input # Valid ID
-
-        while not name:
-            name_input = simpledialog.askstring("Nhập Họ tên", f"Nhập Họ tên cho nhân viên có ID: {emp_id}", parent=self)
-            if name_input is None: # User cancelled
-                messagebox.showwarning("Hủy bỏ", "Đã hủy thêm nhân viên mới.")
-                return None, None # Return None even if ID was entered
-            name_input = name_input.strip()
-            if not name_input:
-                 messagebox.showwarning("Thiếu thông tin", "Họ tên không được để trống.")
-            else:
-                 name = name_input # Valid name
-
-        return name, emp_id
     def _check_hid_queue(self):
-        """Periodically check the queue for new card IDs from the HID handler."""
+        """Periodically check the queue for new swipes from the readers and the hidden entry."""
+        processed = 0
         try:
-            while True: # Process all messages currently in the queue
-                card_id = self.hid_queue.get_nowait()
-                logger.info(f"Received card ID from queue: {card_id}")
-
-                # --- Handle New Employee Registration Flow ---
-                employee = self.employee_manager.find_employee_by_card_id(card_id)
-                if not employee:
-                    name, emp_id = self.ask_new_employee_info(card_id)
-                    if name and emp_id:
-                        success, msg = self.employee_manager.add_employee(name, emp_id, card_id)
-                        if success:
-                            messagebox.showinfo("Thành công", f"Đã thêm nhân viên:\nTên: {name}\nID: {emp_id}\nCARD ID: {card_id}")
-                            # Now process the swipe for the newly added employee
-                            self.attendance_manager.process_swipe(card_id)
-                        else:
-                            messagebox.showerror("Lỗi", f"Không thể thêm nhân viên: {msg}")
-                            self.update_display(status=f"Lỗi thêm NV ({card_id})", card_id=card_id)
-                    else:
-                        self.update_display(status=f"Đã hủy đăng ký thẻ ({card_id})", card_id=card_id)
-                else:
-                    self.attendance_manager.process_swipe(card_id)
-
+            # Bounded batch per tick so a burst cannot freeze the window
+            while processed < config.SWIPES_PER_UI_TICK:
+                event = self.hid_queue.get_nowait()
+                processed += 1
+                card_id = event.card_id
+                logger.info(f"Received card ID from queue: {card_id} (captured {event.captured_at})")
+
+                # Unknown cards are parked for registration without blocking the queue
+                self.attendance_manager.process_swipe(card_id, swipe_time=event.captured_at, source=event.source)
         except queue.Empty:
             pass
+        except Exception as e:
+            logger.error(f"Error processing queued swipe: {e}", exc_info=True)
         finally:
-            self.after(100, self._check_hid_queue)
+            self._update_queue_status()
+            # Come back quickly while a backlog remains
+            self.after(10 if processed >= config.SWIPES_PER_UI_TICK else 100, self._check_hid_queue)
+
+    def _update_queue_status(self):
+        stats = self.hid_queue.stats()
+        if stats["overflow_events"] != self._queue_overflow_shown:
+            self._queue_overflow_shown = stats["overflow_events"]
+            self._add_log_message(f"Hàng đợi quẹt thẻ đầy - đang ghi tạm ra đĩa ({stats['depth']} lần quẹt chờ)")
+        if stats["depth"] > 1:
+            self.update_input_status(f"Đang xử lý hàng đợi: {stats['depth']} lần quẹt ({stats['on_disk']} trên đĩa)")
+        elif stats["depth"] == 0 and "hàng đợi" in self.status_bar.cget("text"):
+            self.update_input_status("Sẵn sàng nhận thẻ")
     def run(self):
         self.mainloop()
 
@@ -0,0 +1,265 @@
+# virtual_table.py
+import tkinter as tk
+import logging
+
+import customtkinter as ctk
+import numpy as np
+import pandas as pd
+
+from employee_search import fold_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLUMN_WIDTH = 120
+DEFAULT_ROW_HEIGHT = 22
+SORT_ARROWS = {True: " ▲", False: " ▼"}
+
+
+def format_cell(value):
+    """Display text of one cell: empty for NaN/None, whole floats without decimals."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if np.isnan(value):
+            return ""
+        return str(int(value)) if value.is_integer() else f"{value:.2f}"
+    return str(value)
+
+
+class VirtualTable(ctk.CTkFrame):
+    """
+    Read-only grid over a DataFrame that only draws the rows in view.
+
+    A fixed pool of canvas rectangles/texts (one per visible cell) is reused while
+    scrolling: moving the view changes which frame rows are read (df.iloc on the
+    visible slice) and updates the pooled items in place, so cost does not depend on
+    the number of rows. Sorting keeps the frame untouched and only stores an argsort
+    order over it. Columns scroll horizontally on the canvas as usual.
+
+    cell_style(row_positions, columns, values) may return an array (rows x columns) of
+    fill colours (or None) for the visible block; it receives frame positions.
+    on_header_click(column) replaces the default click-to-sort behaviour.
+    """
+    def __init__(self, master, column_widths=None, row_height=DEFAULT_ROW_HEIGHT, cell_style=None,
+                 sortable=True, on_header_click=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.column_widths = dict(column_widths or {})
+        self.row_height = row_height
+        self.cell_style = cell_style
+        self.sortable = sortable
+        self.on_header_click = on_header_click
+
+        self.df = None
+        self.columns = []
+        self._order = None # Frame positions in display order, None = frame order
+        self._sort_column = None
+        self._sort_ascending = True
+        self._sort_cache = {} # column -> ascending argsort, valid for the current frame
+        self._first_row = 0
+        self._visible_rows = 0
+        self._items = [] # [row][col] -> (rect_id, text_id)
+        self._x_offsets = []
+
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        colors = self._canvas_colors()
+        self.header = tk.Canvas(self, height=row_height + 4, highlightthickness=0, bg=colors["header_bg"])
+        self.header.grid(row=0, column=0, sticky="ew")
+        self.body = tk.Canvas(self, highlightthickness=0, bg=colors["bg"])
+        self.body.grid(row=1, column=0, sticky="nsew")
+        self.vscroll = ctk.CTkScrollbar(self, orientation="vertical", command=self._on_vscroll)
+        self.vscroll.grid(row=1, column=1, sticky="ns")
+        self.hscroll = ctk.CTkScrollbar(self, orientation="horizontal", command=self._on_hscroll)
+        self.hscroll.grid(row=2, column=0, sticky="ew")
+
+        self.body.bind("<Configure>", lambda e: self._rebuild_pool())
+        for widget in (self.body, self.header):
+            widget.bind("<MouseWheel>", self._on_mousewheel)
+            widget.bind("<Button-4>", lambda e: self.scroll_rows(-3))
+            widget.bind("<Button-5>", lambda e: self.scroll_rows(3))
+        self.header.bind("<Button-1>", self._on_header_press)
+
+    def _canvas_colors(self):
+        dark = ctk.get_appearance_mode() == "Dark"
+        return {
+            "bg": "#2b2b2b" if dark else "#ffffff",
+            "alt_bg": "#323232" if dark else "#f3f5f8",
+            "header_bg": "#1f538d" if dark else "#3b8ed0",
+            "fg": "#e6e6e6" if dark else "#1a1a1a",
+            "header_fg": "#ffffff",
+            "grid": "#444444" if dark else "#d9d9d9",
+        }
+
+    # --- Data ---
+    def set_data(self, df, columns=None, keep_position=False):
+        """Shows df (kept by reference, never copied). columns defaults to all columns."""
+        self.df = df
+        self.columns = list(columns) if columns is not None else (list(df.columns) if df is not None else [])
+        self._sort_cache = {}
+        if self._sort_column is not None and self._sort_column in self.columns and df is not None:
+            self._order = self._sorted_order(self._sort_column, self._sort_ascending)
+        else:
+            self._order, self._sort_column = None, None
+        if not keep_position:
+            self._first_row = 0
+        self._x_offsets = list(np.cumsum([0] + [self.column_widths.get(c, DEFAULT_COLUMN_WIDTH) for c in self.columns]))
+        self._draw_header()
+        self._rebuild_pool()
+
+    def row_count(self):
+        return 0 if self.df is None else len(self.df)
+
+    def _sorted_order(self, column, ascending):
+        if column not in self._sort_cache:
+            values = self.df[column]
+            present = values.notna().to_numpy() & (values.astype(str) != "").to_numpy()
+            numeric = pd.to_numeric(values[present], errors='coerce')
+            if numeric.notna().all():
+                key = numeric.to_numpy(dtype=float)
+            else:
+                # Text: compare without diacritics so 'Đ' sorts with 'D', not after 'Z'
+                key = values[present].map(fold_text).to_numpy(dtype=object)
+            positions = np.flatnonzero(present)
+            self._sort_cache[column] = (positions[np.argsort(key, kind="stable")], np.flatnonzero(~present))
+        ordered, empty = self._sort_cache[column]
+        # Empty cells stay last in both directions
+        return np.concatenate([ordered if ascending else ordered[::-1], empty])
+
+    def sort_by(self, column, ascending=None):
+        if self.df is None or column not in self.columns:
+            return
+        if ascending is None:
+            ascending = not self._sort_ascending if column == self._sort_column else True
+        self._sort_column, self._sort_ascending = column, ascending
+        self._order = self._sorted_order(column, ascending)
+        self._draw_header()
+        self.refresh()
+
+    def display_positions(self, first, count):
+        """Frame positions of display rows [first, first + count)."""
+        stop = min(first + count, self.row_count())
+        if self._order is None:
+            return np.arange(first, stop)
+        return self._order[first:stop]
+
+    # --- Drawing ---
+    def _draw_header(self):
+        colors = self._canvas_colors()
+        self.header.delete("all")
+        for col_idx, column in enumerate(self.columns):
+            x0, x1 = self._x_offsets[col_idx], self._x_offsets[col_idx + 1]
+            label = str(column) + (SORT_ARROWS[self._sort_ascending] if column == self._sort_column else "")
+            self.header.create_line(x1 - 1, 0, x1 - 1, self.row_height + 4, fill=colors["grid"])
+            self.header.create_text(x0 + 6, (self.row_height + 4) // 2, text=label, anchor="w",
+                                    fill=colors["header_fg"], font=("Segoe UI", 10, "bold"))
+        width = self._x_offsets[-1] if self._x_offsets else 0
+        self.header.configure(scrollregion=(0, 0, width, self.row_height + 4))
+
+    def _rebuild_pool(self):
+        """(Re)creates one rectangle/text per visible cell after a resize or new columns."""
+        colors = self._canvas_colors()
+        self.body.delete("all")
+        self._items = []
+        height = max(self.body.winfo_height(), self.row_height)
+        self._visible_rows = height // self.row_height + 1
+        for r in range(self._visible_rows):
+            y0 = r * self.row_height
+            row_items = []
+            for col_idx in range(len(self.columns)):
+                x0, x1 = self._x_offsets[col_idx], self._x_offsets[col_idx + 1]
+                rect = self.body.create_rectangle(x0, y0, x1, y0 + self.row_height, outline=colors["grid"], fill=colors["bg"])
+                text = self.body.create_text(x0 + 6, y0 + self.row_height // 2, anchor="w", text="", fill=colors["fg"])
+                row_items.append((rect, text))
+            self._items.append(row_items)
+        width = self._x_offsets[-1] if self._x_offsets else 0
+        self.body.configure(scrollregion=(0, 0, width, height))
+        self.hscroll.set(*self.body.xview())
+        self.refresh()
+
+    def refresh(self):
+        """Re-reads and redraws the visible window."""
+        total = self.row_count()
+        max_first = max(0, total - self._visible_rows + 1)
+        self._first_row = min(max(0, self._first_row), max_first)
+        positions = self.display_positions(self._first_row, self._visible_rows)
+        if len(positions) and self.columns:
+            values = self.df.iloc[positions][self.columns].to_numpy(dtype=object)
+        else:
+            values = np.empty((0, len(self.columns)), dtype=object)
+        fills = self.cell_style(positions, self.columns, values) if (self.cell_style and len(positions)) else None
+        colors = self._canvas_colors()
+
+        for r, row_items in enumerate(self._items):
+            present = r < len(positions)
+            default_bg = colors["alt_bg"] if (self._first_row + r) % 2 else colors["bg"]
+            for c, (rect, text) in enumerate(row_items):
+                if present:
+                    fill = fills[r][c] if fills is not None and fills[r][c] else default_bg
+                    self.body.itemconfigure(text, text=format_cell(values[r, c]))
+                    self.body.itemconfigure(rect, fill=fill)
+                else:
+                    self.body.itemconfigure(text, text="")
+                    self.body.itemconfigure(rect, fill=colors["bg"])
+        self._update_vscroll()
+
+    def refresh_positions(self, frame_positions):
+        """Redraws only the given frame rows, if they are in view (used for live updates)."""
+        if self.df is None or not len(frame_positions):
+            return
+        shown = self.display_positions(self._first_row, self._visible_rows)
+        wanted = np.isin(shown, np.asarray(list(frame_positions)))
+        if not wanted.any():
+            return
+        rows = np.flatnonzero(wanted)
+        positions = shown[rows]
+        values = self.df.iloc[positions][self.columns].to_numpy(dtype=object)
+        fills = self.cell_style(positions, self.columns, values) if self.cell_style else None
+        colors = self._canvas_colors()
+        for i, r in enumerate(rows):
+            default_bg = colors["alt_bg"] if (self._first_row + r) % 2 else colors["bg"]
+            for c, (rect, text) in enumerate(self._items[r]):
+                fill = fills[i][c] if fills is not None and fills[i][c] else default_bg
+                self.body.itemconfigure(text, text=format_cell(values[i, c]))
+                self.body.itemconfigure(rect, fill=fill)
+
+    # --- Scrolling ---
+    def _update_vscroll(self):
+        total = self.row_count()
+        if total == 0:
+            self.vscroll.set(0, 1)
+            return
+        self.vscroll.set(self._first_row / total, min(1.0, (self._first_row + self._visible_rows) / total))
+
+    def scroll_rows(self, delta):
+        self.scroll_to(self._first_row + delta)
+
+    def scroll_to(self, first_row):
+        if first_row != self._first_row:
+            self._first_row = first_row
+            self.refresh()
+
+    def _on_vscroll(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.row_count()))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self._visible_rows - 1 if args[2] == "pages" else 1)
+            self.scroll_rows(step)
+
+    def _on_hscroll(self, *args):
+        self.body.xview(*args)
+        self.header.xview(*args)
+        first, last = self.body.xview()
+        self.hscroll.set(first, last)
+
+    def _on_mousewheel(self, event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def _on_header_press(self, event):
+        x = self.header.canvasx(event.x)
+        col_idx = int(np.searchsorted(self._x_offsets, x, side="right")) - 1
+        if 0 <= col_idx < len(self.columns):
+            column = self.columns[col_idx]
+            if self.on_header_click:
+                self.on_header_click(column)
+            elif self.sortable:
+                self.sort_by(column)
@@ -0,0 +1,297 @@
+# work_scheduler.py
+import os
+import re
+import hashlib
+import logging
+from collections import namedtuple
+from datetime import datetime, date, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# One employee's shift on one work date. start/end are datetimes (end on the next
+# day for overnight shifts); both are None on a day off. code is the schedule cell.
+ShiftWindow = namedtuple("ShiftWindow", ["work_date", "start", "end", "name", "code"])
+
+_DAY_MONTH_HEADER = re.compile(r"^\s*(\d{1,2})\s*[-/]\s*(?:Thg|T|th)?\s*(\d{1,2})", re.IGNORECASE) # '01-Thg4', '1/4'
+_YEAR = re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)") # 'Lịch tháng 12/2025', 'schedule_2026.xlsx'
+
+
+def _cell_text(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) # '1' / '1001' read back as 1.0 / 1001.0
+    return str(value).strip()
+
+
+def _normalize_code(value):
+    return _cell_text(value).upper()
+
+
+def _header_date(value, year):
+    """Date of a schedule column header (Excel date, '01-Thg4' or '1/4'), or None for other columns."""
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    match = _DAY_MONTH_HEADER.match(str(value))
+    if match:
+        try:
+            return date(year, int(match.group(2)), int(match.group(1)))
+        except ValueError:
+            return None
+    return None
+
+
+def _is_date_cell(value):
+    return isinstance(value, (datetime, pd.Timestamp, date))
+
+
+def _schedule_year(filepath, title_rows, header):
+    """
+    Year of the first day column: from an Excel date header, else the first year written
+    in the title rows above the header or in the file name. None if the file has none.
+    """
+    for value in header:
+        if _is_date_cell(value):
+            return value.year
+    texts = [str(value) for value in title_rows.to_numpy().ravel() if not pd.isna(value)]
+    texts.append(os.path.basename(filepath))
+    for text in texts:
+        match = _YEAR.search(text)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _nearest_year(month, today):
+    """Year of `month` closest to today (a December schedule read in January is last year's)."""
+    return min((today.year - 1, today.year, today.year + 1), key=lambda y: abs((y - today.year) * 12 + month - today.month))
+
+
+class ScheduleIndex:
+    """
+    Read-only (employee, date) -> schedule code index built once from the schedule
+    workbook. Codes are stored as small integers in one array (rows = employees,
+    columns = dates); looking up a cell is two dict hits and an array read.
+    """
+    def __init__(self, emp_ids, dates, codes, code_names):
+        self._rows = {emp_id: i for i, emp_id in enumerate(emp_ids)}
+        self._cols = {day: j for j, day in enumerate(dates)}
+        self._codes = codes # int array (employees x dates), 0 = empty cell
+        self.code_names = code_names # code id -> code string, [0] = ''
+        self.dates = list(dates)
+
+    @classmethod
+    def from_file(cls, filepath, year=None):
+        """
+        Reads the schedule sheet: a header row containing SCHEDULE_EMPLOYEE_ID_COLUMN, then
+        one row per employee. year is that of the first '01-Thg4'-style day column; by
+        default it is read from the file (_schedule_year). Later columns whose month is
+        smaller than the previous one's are in the next year.
+        """
+        raw = pd.read_excel(filepath, header=None, dtype=object)
+        id_col_name = config.SCHEDULE_EMPLOYEE_ID_COLUMN
+        header_rows = np.flatnonzero((raw.astype(str).apply(lambda col: col.str.strip()) == id_col_name).any(axis=1).to_numpy())
+        if not len(header_rows):
+            raise ValueError(f"Không tìm thấy cột '{id_col_name}' trong file lịch làm việc '{filepath}'")
+        header = raw.iloc[header_rows[0]].tolist()
+        body = raw.iloc[header_rows[0] + 1:]
+
+        id_position = [str(v).strip() for v in header].index(id_col_name)
+        year = year or _schedule_year(filepath, raw.iloc[:header_rows[0]], header)
+        if year is None:
+            first_month = next((_header_date(v, 2000).month for v in header if _header_date(v, 2000) is not None), None)
+            year = _nearest_year(first_month, date.today()) if first_month else date.today().year
+            logger.warning(f"Schedule '{filepath}' gives no year; assuming {year}. Put the year in the title or file name.")
+        date_positions, dates = [], []
+        previous_month = None
+        for position, value in enumerate(header):
+            day = _header_date(value, year)
+            if day is None:
+                continue
+            if not _is_date_cell(value):
+                if previous_month is not None and day.month < previous_month: # e.g. '31-Thg12' then '01-Thg1'
+                    year += 1
+                    day = _header_date(value, year)
+                    if day is None:
+                        continue
+                previous_month = day.month
+            date_positions.append(position)
+            dates.append(day)
+        emp_ids = body.iloc[:, id_position].map(_cell_text)
+        keep = (emp_ids != "").to_numpy()
+        emp_ids = emp_ids[keep].tolist()
+
+        cells = body.iloc[keep, date_positions].map(_normalize_code).to_numpy(dtype=object)
+        code_ids, uniques = pd.factorize(cells.ravel(), sort=True)
+        code_names = [""] + [code for code in uniques if code != ""]
+        remap = np.array([code_names.index(code) for code in uniques], dtype=np.int64)
+        dtype = np.uint8 if len(code_names) < 256 else np.uint16
+        codes = remap[code_ids].reshape(cells.shape).astype(dtype) if cells.size else np.zeros(cells.shape, dtype=dtype)
+        logger.info(f"Schedule loaded from '{filepath}': {len(emp_ids)} employee(s), {len(dates)} day(s), codes {code_names[1:]}.")
+        return cls(emp_ids, dates, codes, code_names)
+
+    def code_id(self, emp_id, day):
+        row = self._rows.get(emp_id)
+        col = self._cols.get(day)
+        if row is None or col is None:
+            return 0
+        return int(self._codes[row, col])
+
+    def code_grid(self, emp_ids, dates):
+        """Code ids (employees x dates) for a list of employee IDs and dates in one gather; 0 where not covered."""
+        rows = np.array([self._rows.get(emp_id, -1) for emp_id in emp_ids], dtype=np.int64)
+        cols = np.array([self._cols.get(day, -1) for day in dates], dtype=np.int64)
+        grid = np.zeros((len(rows), len(cols)), dtype=np.int64)
+        if self._codes.size:
+            covered = (rows >= 0)[:, None] & (cols >= 0)[None, :]
+            grid[covered] = self._codes[np.ix_(np.maximum(rows, 0), np.maximum(cols, 0))][covered]
+        return grid
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class WorkScheduler:
+    """
+    Per-employee shift windows from the work schedule workbook (see README for the
+    format). Without a schedule file, or for employees/days it does not cover, the
+    general shift from the shift_start/shift_end settings applies, as before.
+    Shift times are looked up per code id from a table built once per schedule and
+    rebuilt after reload_shifts() (shift/code settings changed), so shift_on() is O(1).
+    """
+    def __init__(self, settings_manager, index=None):
+        self.settings_manager = settings_manager
+        self.index = index
+        self._code_shifts = None # code id -> (name, start offset, end offset) or None for a day off / unknown code
+
+    @classmethod
+    def read_index(cls, filepath):
+        """Reads a schedule file into a ScheduleIndex, or None if there is no file (safe on a worker thread)."""
+        if not os.path.exists(filepath):
+            logger.info(f"No work schedule at '{filepath}'; the general shift applies to everyone.")
+            return None
+        return ScheduleIndex.from_file(filepath)
+
+    def load(self):
+        try:
+            self.swap_index(self.read_index(config.get_schedule_filepath(self.settings_manager)))
+        except Exception as e:
+            logger.error(f"Error loading work schedule: {e}", exc_info=True)
+            self.swap_index(None)
+        return self.index is not None
+
+    def swap_index(self, index):
+        self.index = index
+        self._code_shifts = None
+
+    def reload_shifts(self):
+        """Call after the shifts, schedule_code_map or general shift settings changed."""
+        self._code_shifts = None
+
+    def cache_token(self):
+        """Digest of the schedule and shift/code settings, for caches of results derived from shifts; None without a schedule."""
+        if self.index is None:
+            return None
+        code_map = self.settings_manager.get_setting("schedule_code_map") or config.DEFAULT_SCHEDULE_CODE_MAP
+        digest = hashlib.sha1(self.index._codes.tobytes())
+        digest.update(repr((sorted(self.index._rows.items()), self.index.dates, self.index.code_names,
+                            sorted(self._shift_definitions().items()), sorted(code_map.items()))).encode("utf-8"))
+        return digest.hexdigest()
+
+    # --- Shift table ---
+    def _shift_definitions(self):
+        shifts = dict(config.DEFAULT_SHIFTS)
+        shifts.update(self.settings_manager.get_setting("shifts") or {})
+        start, end = self.settings_manager.get_shift_times()
+        shifts[config.GENERAL_SHIFT_NAME] = {"start": start.strftime("%H:%M"), "end": end.strftime("%H:%M")}
+        return shifts
+
+    def _code_table(self):
+        if self._code_shifts is not None:
+            return self._code_shifts
+        code_map = self.settings_manager.get_setting("schedule_code_map") or config.DEFAULT_SCHEDULE_CODE_MAP
+        shifts = self._shift_definitions()
+        offsets = {}
+        for name, times in shifts.items():
+            try:
+                start = datetime.strptime(times["start"], "%H:%M")
+                end = datetime.strptime(times["end"], "%H:%M")
+            except (KeyError, TypeError, ValueError):
+                logger.error(f"Invalid shift definition '{name}': {times}. Skipping.")
+                continue
+            start_s = start.hour * 3600 + start.minute * 60
+            end_s = end.hour * 3600 + end.minute * 60
+            if end_s <= start_s:
+                end_s += 86400 # Overnight: ends the next day
+            offsets[name] = (start_s, end_s)
+
+        table = [None]
+        for code in (self.index.code_names[1:] if self.index is not None else []):
+            if code not in code_map:
+                logger.warning(f"Schedule code '{code}' is not in the code map; the general shift applies on those days.")
+                table.append(None)
+            elif code_map[code] is None:
+                table.append((None, None, None)) # Day off
+            elif code_map[code] not in offsets:
+                logger.error(f"Schedule code '{code}' maps to unknown shift '{code_map[code]}'; the general shift applies.")
+                table.append(None)
+            else:
+                table.append((code_map[code],) + offsets[code_map[code]])
+        self._code_shifts = table
+        return table
+
+    # --- Lookups ---
+    def general_shift(self, work_date):
+        start, end = self.settings_manager.get_shift_times()
+        start_dt, end_dt = datetime.combine(work_date, start), datetime.combine(work_date, end)
+        if end_dt <= start_dt:
+            end_dt += timedelta(days=1)
+        return ShiftWindow(work_date, start_dt, end_dt, config.GENERAL_SHIFT_NAME, None)
+
+    def scheduled_shift(self, emp_id, work_date):
+        """The schedule's ShiftWindow for emp_id on work_date (start/end None on a day off), or None if not scheduled."""
+        if self.index is None:
+            return None
+        code_id = self.index.code_id(str(emp_id), work_date)
+        if code_id == 0:
+            return None
+        entry = self._code_table()[code_id]
+        if entry is None:
+            return None
+        name, start_s, end_s = entry
+        code = self.index.code_names[code_id]
+        if name is None:
+            return ShiftWindow(work_date, None, None, None, code)
+        midnight = datetime.combine(work_date, time())
+        return ShiftWindow(work_date, midnight + timedelta(seconds=start_s), midnight + timedelta(seconds=end_s), name, code)
+
+    def shift_offset_grid(self, emp_ids, dates):
+        """
+        Vectorized scheduled_shift for employees x dates: (start, end, scheduled) arrays,
+        start/end in seconds from the work date's midnight (NaN on a day off) and
+        scheduled False where the schedule does not apply.
+        """
+        if self.index is None:
+            shape = (len(emp_ids), len(dates))
+            return np.full(shape, np.nan), np.full(shape, np.nan), np.zeros(shape, dtype=bool)
+        table = self._code_table()
+        starts, ends = np.full(len(table), np.nan), np.full(len(table), np.nan)
+        known = np.zeros(len(table), dtype=bool)
+        for code_id, entry in enumerate(table):
+            if entry is not None:
+                known[code_id] = True
+                if entry[0] is not None:
+                    starts[code_id], ends[code_id] = entry[1], entry[2]
+        grid = self.index.code_grid(emp_ids, dates)
+        return starts[grid], ends[grid], known[grid]
+
+    def shift_on(self, emp_id, work_date):
+        """ShiftWindow that applies to emp_id on work_date: the scheduled one, else the general shift."""
+        return self.scheduled_shift(emp_id, work_date) or self.general_shift(work_date)